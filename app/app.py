@@ -1,4 +1,6 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 import asyncio
 import os
 import sys
@@ -10,10 +12,17 @@ from services.github_service import (
     wait_for_pages_deployment,
 )
 from models.schema import TaskRequest
-from services.attachments import parse_attachments
-from fastapi.encoders import jsonable_encoder
+from services.attachments import attachment_file, parse_attachments
+from services.uploads import UploadError, read_multipart, task_payload
+from services.profiler import profile_attachment
 from services.llm_generator import generate_files
 from services.evaluation import post_results
+from services.llm_providers import provider_stats
+from services import jobs, metrics
+from services.routing import routing_stats
+from services.breakers import breaker_states
+from services.budget import budget_stats
+from services.blob_store import blob_stats
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -33,11 +42,23 @@ if env_path.exists():
     load_dotenv(env_path)
 
 
-async def do_round1(data_dict: dict) -> None:
+def profile_parsed(parsed: list) -> list:
+    """CSV/JSON profile (or None) of each parsed attachment.
+
+    Profiling reads whole files, so the workers run this in a thread.
+    """
+    return [
+        profile_attachment(p.get("path"), p.get("mime"), p.get("content", "")) if p.get("encoding") == "utf-8" else None
+        for p in parsed
+    ]
+
+
+async def do_round1(data_dict: dict) -> bool:
     """Async background worker: perform GitHub operations and notify evaluator.
 
     Blocking service calls are executed via asyncio.to_thread to avoid
-    blocking the event loop.
+    blocking the event loop. Returns False when any step failed, so the job
+    registry lets a retry of the submission run again.
     """
     try:
         # Reconstruct minimal fields
@@ -78,17 +99,22 @@ async def do_round1(data_dict: dict) -> None:
         if parsed:
             # Include content for text files, preview for large files
             data_dict_with_parsed["parsed_attachments"] = []
-            for p in parsed:
+            profiles = await asyncio.to_thread(profile_parsed, parsed)
+            for p, profile in zip(parsed, profiles):
                 att_info = {
                     "path": p.get("path"),
                     "mime_type": p.get("mime", "unknown"),
-                    "encoding": p.get("encoding", "unknown")
+                    "encoding": p.get("encoding", "unknown"),
+                    "size": p.get("size"),
                 }
                 
                 # Include content for text/JSON/CSV (so LLM knows structure)
                 content = p.get("content", "")
                 mime = p.get("mime", "")
-                if mime and (mime.startswith("text/") or mime in ["application/json", "application/csv"]):
+                if profile:
+                    # CSV/JSON: a compact profile of the full file instead of a raw sample
+                    att_info["profile"] = profile
+                elif mime and (mime.startswith("text/") or mime in ["application/json", "application/csv"]):
                     # For CSV/JSON, include preview or full content
                     if len(content) < 5000:  # Small files: send full content
                         att_info["content_preview"] = content
@@ -139,7 +165,7 @@ async def do_round1(data_dict: dict) -> None:
         attach_files = []
         for a in (parsed or []):
             try:
-                attach_files.append({"path": a["path"], "content": a["content"], "encoding": a.get("encoding", "utf-8")})
+                attach_files.append(attachment_file(a))
             except Exception as e:
                 errors.append(f"attachment_normalize_error: {e}")
                 print("do_round1: attachment normalize error:", e)
@@ -273,13 +299,17 @@ async def do_round1(data_dict: dict) -> None:
                 await asyncio.to_thread(post_results, eval_url, eval_payload)
             except Exception as e:
                 print("do_round1: failed to post final evaluation payload:", e)
+        return not errors
     except Exception as e:
         # Catch any unexpected error in the background worker to ensure it doesn't crash silently
         print("do_round1: unexpected error:", e)
+        return False
 
 
-async def do_round2(data_dict: dict) -> None:
+async def do_round2(data_dict: dict) -> bool:
     """Async background worker for Round 2: modify existing repo files.
+
+    Returns False when the round failed (see do_round1).
     
     In Round 2:
     - Repo already exists (created in Round 1)
@@ -313,9 +343,15 @@ async def do_round2(data_dict: dict) -> None:
         # Prepare data for LLM (include parsed attachment metadata)
         data_dict_with_parsed = data_dict.copy()
         if parsed_attach:
+            profiles = await asyncio.to_thread(profile_parsed, parsed_attach)
             data_dict_with_parsed["parsed_attachments"] = [
-                {"path": att["path"], "mime_type": att.get("mime")} 
-                for att in parsed_attach
+                {
+                    "path": att["path"],
+                    "mime_type": att.get("mime"),
+                    "size": att.get("size"),
+                    "profile": profile,
+                }
+                for att, profile in zip(parsed_attach, profiles)
             ]
         
         print("\n[ROUND 2] ===== CALLING LLM =====")
@@ -345,10 +381,7 @@ async def do_round2(data_dict: dict) -> None:
                 break
         
         # Combine LLM-generated files with any parsed attachments
-        attach_files = [
-            {"path": att["path"], "content": att["content"]}
-            for att in parsed_attach
-        ]
+        attach_files = [attachment_file(att) for att in parsed_attach]
         combined_files = gen_files + attach_files
         
         print(f"\n[ROUND 2] Total files to push: {len(combined_files)}")
@@ -357,7 +390,7 @@ async def do_round2(data_dict: dict) -> None:
         skip_github = os.getenv("SKIP_GITHUB", "0") == "1"
         if skip_github:
             print("[ROUND 2] SKIP_GITHUB=1, skipping all GitHub operations")
-            return
+            return True
         
         # Push modified files to existing repo (Round 2)
         print(f"\n[ROUND 2] Pushing {len(combined_files)} file(s) to existing repo: {repo_name}")
@@ -421,10 +454,12 @@ async def do_round2(data_dict: dict) -> None:
                 print("[ROUND 2] ✅ Evaluation posted successfully")
             except Exception as e:
                 print(f"[ROUND 2] ❌ Failed to post evaluation: {e}")
+        return True
     except Exception as e:
         print(f"[ROUND 2] ❌ Unexpected error: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
 
 app = FastAPI()
@@ -437,23 +472,70 @@ async def root():
         "status": "online",
         "service": "AI GitHub Pages Generator",
         "endpoints": {
-            "POST /handle_task": "Main API endpoint for task requests"
+            "POST /handle_task": "Main API endpoint for task requests",
+            "POST /handle_task/upload": "Task request as multipart/form-data with attachments as binary file parts",
+            "GET /metrics": "LLM token usage per day and per task"
         },
+        "llm_providers": provider_stats(),
+        "breakers": breaker_states(),
+        "jobs": jobs.job_stats(),
         "version": "1.0.0"
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """LLM usage aggregates (tokens, latency, models) per day and per task, model routing outcomes, budget and attachment store state"""
+    return {**metrics.snapshot(), "routing": routing_stats(), "budget": budget_stats(), "blobs": blob_stats()}
+
+
 def verify_secret(provided: str | None) -> bool:
     expected = os.getenv("API_SECRET")
     if expected is None:
         return True
     return provided == expected
 
-@app.post("/handle_task")
-async def handle_task(data: TaskRequest):
+
+def _check_secret(data: TaskRequest) -> None:
     if not verify_secret(data.secret):
         raise HTTPException(status_code=403, detail="Invalid secret")
 
+@app.post(
+    "/handle_task",
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": TaskRequest.model_json_schema()}}}},
+)
+async def handle_task(request: Request):
+    # Validated straight from the raw JSON (no intermediate dict), off the event loop
+    body = await request.body()
+    try:
+        data = await asyncio.to_thread(TaskRequest.model_validate_json, body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    del body
+    _check_secret(data)
+
+    # Large attachments are spilled to temporary files; workers get handles instead of strings
+    payload = await asyncio.to_thread(task_payload, data)
+    return await _dispatch(data, payload)
+
+
+@app.post("/handle_task/upload")
+async def handle_task_upload(request: Request):
+    """Same as /handle_task, sent as multipart/form-data: the task JSON in a `task`
+    field and each attachment as a file part (raw bytes, streamed to disk)"""
+    try:
+        # The secret is checked as soon as the task part arrives, before the remaining files are read
+        data, payload = await read_multipart(request, check=_check_secret)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    print(f"[UPLOAD] {data.task}: {len(payload['attachments'])} attachment(s) received")
+    return await _dispatch(data, payload)
+
+
+async def _dispatch(data: TaskRequest, payload: dict) -> dict:
+    """ACK a validated task and hand its worker payload to the round worker."""
     # Immediate acknowledgement: copy required fields back to caller
     ack = {
         "status": "accepted",
@@ -484,14 +566,21 @@ async def handle_task(data: TaskRequest):
     print(f"\n[ROUTER] Received request for Round {round_num}")
     
     if round_num == 1:
-        print("[ROUTER] Routing to do_round1()")
-        asyncio.create_task(do_round1(jsonable_encoder(data)))
+        worker = do_round1
     elif round_num == 2:
-        print("[ROUTER] Routing to do_round2()")
-        asyncio.create_task(do_round2(jsonable_encoder(data)))
+        worker = do_round2
     else:
         print(f"[ROUTER] ⚠️ Unsupported round number: {round_num}, defaulting to Round 1")
-        asyncio.create_task(do_round1(jsonable_encoder(data)))
+        worker = do_round1
+
+    # Evaluator retries of the same submission attach to the job already running
+    # Hashing a payload with inline attachments can take a while, so it runs off the event loop
+    key = await asyncio.to_thread(jobs.job_key, payload)
+    ack, duplicate = jobs.submit(key, ack, lambda: worker(payload))
+    if duplicate:
+        print(f"[ROUTER] Duplicate submission for {data.task} round {round_num}, attached to existing job")
+    else:
+        print(f"[ROUTER] Routing to {worker.__name__}()")
 
     return ack
 
@@ -0,0 +1,73 @@
+"""
+Offline batch generation: run many tasks through the normal pipeline
+(generate -> review -> push -> notify) with every LLM call sent as part of
+a provider batch instead of a synchronous request.
+
+Usage (from app/):
+    python batch_generate.py tasks.jsonl [--concurrency 64]
+
+Each line of tasks.jsonl is a /handle_task payload. Round 1 tasks run
+before Round 2 tasks so a Round 2 entry can build on a Round 1 entry of the
+same file. Set LLM_BATCH_URL=http://localhost:9001/v1 to run against the
+stand-in batch API of grader/test_server.py.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import do_round1, do_round2
+from models.schema import TaskRequest
+from services.batch import LLM_BATCH_URL, run_batch
+from services.uploads import task_payload
+
+
+def load_tasks(path: str) -> list:
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                tasks.append(task_payload(TaskRequest.model_validate_json(line)))
+            except Exception as e:
+                print(f"[BATCH] ⚠️ Skipping line {lineno}: {e}")
+    return tasks
+
+
+async def run(tasks: list, concurrency: int) -> list:
+    # Every task blocks a worker thread while its requests wait in a batch
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    with run_batch() as collector:
+        for round_num, worker in ((1, do_round1), (2, do_round2)):
+            phase = [t for t in tasks if (t.get("round") == 2) == (round_num == 2)]
+            if phase:
+                print(f"[BATCH] Round {round_num}: {len(phase)} task(s)")
+                await asyncio.gather(*(worker(t) for t in phase))
+    return collector.batches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", help="JSONL file with one task payload per line")
+    parser.add_argument("--concurrency", type=int, default=64, help="tasks in flight at once (default 64)")
+    args = parser.parse_args()
+
+    tasks = load_tasks(args.tasks)
+    if not tasks:
+        print("[BATCH] No tasks to run")
+        return 1
+    print(f"[BATCH] {len(tasks)} task(s), batch API {LLM_BATCH_URL}")
+    start = time.time()
+    batches = asyncio.run(run(tasks, args.concurrency))
+    print(f"[BATCH] ✅ Done in {time.time() - start:.0f}s: {len(batches)} batch(es), "
+          f"{sum(b['requests'] for b in batches)} LLM request(s)")
+    for b in batches:
+        print(f"[BATCH]   {b['id']}: {b['status']}, {b['results']}/{b['requests']} result(s) in {b['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
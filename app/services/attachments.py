@@ -1,9 +1,120 @@
-import re
 import base64
-from typing import List, Dict
+import binascii
+from typing import List, Dict, Optional, Tuple, Union
+
+from services import blob_store
+from services.uploads import SpooledAttachment
+
+# Longest data URI header ("data:<mime>[;params];base64,") that is looked at
+_MAX_HEADER = 512
+# Base64 characters decoded per binascii call (a multiple of 4, so padding only ends the last chunk)
+DECODE_CHUNK = 1 << 20
+# Whitespace that shows up in wrapped base64 (a str.find per character beats a regex scan)
+_WHITESPACE = ("\n", "\r", " ", "\t")
+
+Payload = Union[str, bytes, bytearray]
+
+
+def parse_data_uri_header(url: Payload) -> Optional[Tuple[str, int]]:
+    """(mime, offset of the payload) of a base64 data URI, or None.
+
+    Only the header is read; the payload is never scanned or copied.
+    """
+    head = url[:_MAX_HEADER]
+    if not isinstance(head, str):
+        head = bytes(head).decode("ascii", "replace")
+    if head[:5].lower() != "data:":
+        return None
+    comma = head.find(",")
+    if comma < 0:
+        return None
+    params = head[5:comma].split(";")
+    mime = params[0].strip().lower()
+    if len(params) < 2 or params[-1].strip().lower() != "base64" or not mime:
+        return None
+    return mime, comma + 1
+
+
+def _has_whitespace(data: Payload, start: int = 0) -> bool:
+    if isinstance(data, str):
+        return any(data.find(c, start) >= 0 for c in _WHITESPACE)
+    return any(data.find(c.encode(), start) >= 0 for c in _WHITESPACE)
+
+
+def clean_base64(data: Payload, start: int = 0) -> str:
+    """Base64 text of data[start:] without whitespace.
+
+    Already-clean str input is returned as is when start is 0 (no copy);
+    whitespace is only stripped when some is actually present.
+    """
+    if not isinstance(data, str):
+        raw = bytes(memoryview(data)[start:])
+        try:
+            # Spilled payloads are the request's UTF-8 text, so malformed (non-ASCII) ones come back as sent
+            data = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            # Other bytes map one to one onto latin-1, so nothing is replaced or lost
+            data = raw.decode("latin-1")
+        del raw
+        start = 0
+    if not _has_whitespace(data, start):
+        return data[start:] if start else data
+    return "".join(data[start:].split())
+
+
+def decode_base64(data: Payload, start: int = 0) -> bytearray:
+    """Decode clean base64 data[start:] chunk by chunk into one preallocated buffer.
+
+    bytes-like input is sliced through a memoryview (no copies); str input
+    only ever has one DECODE_CHUNK slice alive. Raises binascii.Error on
+    malformed input (ValueError for non-ASCII str input).
+    """
+    if not isinstance(data, str):
+        data = memoryview(data)
+    n = len(data) - start
+    if n % 4:
+        raise binascii.Error(f"base64 length {n} is not a multiple of 4")
+    tail = data[len(data) - 2:] if n >= 2 else data[start:]
+    if not isinstance(tail, str):
+        tail = bytes(tail).decode("ascii", "replace")
+    size = n // 4 * 3 - (len(tail) - len(tail.rstrip("=")))
+    out = bytearray(size)
+    view = memoryview(out)
+    pos = 0
+    for i in range(start, len(data), DECODE_CHUNK):
+        piece = binascii.a2b_base64(data[i:i + DECODE_CHUNK])
+        if pos + len(piece) > size:
+            raise binascii.Error("base64 payload decodes past its expected length")
+        view[pos:pos + len(piece)] = piece
+        pos += len(piece)
+    if pos != size:
+        # Invalid characters are skipped by binascii; treat that as malformed
+        raise binascii.Error("base64 payload contains invalid characters")
+    return out
+
+
+def _is_text(mime: str) -> bool:
+    return mime.startswith("text/") or mime in ("application/json", "application/javascript")
+
+
+def _parse_upload(name: str, handle: SpooledAttachment) -> Dict:
+    """File dict for an attachment uploaded as raw bytes (no base64 involved)."""
+    mime = handle.mime or "application/octet-stream"
+    if _is_text(mime):
+        try:
+            return {"path": name, "content": handle.read().decode("utf-8"), "encoding": "utf-8", "mime": mime,
+                    "size": handle.size}
+        except UnicodeDecodeError:
+            pass
+    if blob_store.enabled():
+        # Copied from the spooled file into the store in chunks
+        handle.file.seek(0)
+        blob = blob_store.put_file(handle.file, handle.size, mime)
+        return {"path": name, "encoding": "blob", "mime": mime, "blob": blob["sha256"],
+                "size": blob["size"], "git_sha": blob["git_sha"]}
+    return {"path": name, "content": base64.b64encode(handle.read()).decode("ascii"), "encoding": "base64", "mime": mime,
+            "size": handle.size}
 
-# Matches: data:<mime>;base64,<data>
-_DATA_URI_RE = re.compile(r"^data:(?P<mime>[^;]+);base64,(?P<data>.+)$", flags=re.I)
 
 def parse_attachments(attachments: List[Dict]) -> List[Dict]:
     """Convert incoming attachments to file dicts usable for pushing.
@@ -11,8 +122,20 @@ def parse_attachments(attachments: List[Dict]) -> List[Dict]:
     Each returned dict:
       - path: filename (from attachment['name'])
       - content: decoded UTF-8 text OR base64 string (raw base64 data)
-      - encoding: "utf-8" or "base64" or "url" or "raw"
+      - encoding: "utf-8" or "blob" or "base64" or "url" or "raw"
       - mime: mime type when available
+      - size: size of the file in bytes (decoded, for data URIs)
+      - blob, git_sha: for "blob" entries (no content), the SHA-256 of the
+        decoded bytes in services.blob_store and their git blob SHA
+
+    An attachment's `url` may also be a services.uploads.SpooledAttachment:
+    a spilled data URI, or the raw bytes of a multipart upload.
+
+    Data URIs are handled without regex scans or repeated copies of the
+    payload: only the header is parsed, whitespace is stripped only when
+    present, and text is decoded chunk-wise straight into one buffer.
+    Binary payloads are decoded into the content-addressed blob store, so a
+    file that arrives in many tasks is kept once and never held in memory.
     """
     out: List[Dict] = []
     for a in attachments or []:
@@ -20,35 +143,61 @@ def parse_attachments(attachments: List[Dict]) -> List[Dict]:
         url = a.get("url", "")
         if not name or not url:
             continue
+        if isinstance(url, SpooledAttachment) and url.raw:
+            out.append(_parse_upload(name, url))
+            continue
+        if isinstance(url, SpooledAttachment):
+            # Spilled to a temporary file by the endpoint; read back as bytes (memoryview path below)
+            url = url.read()
+
+        header = parse_data_uri_header(url)
+        if header:
+            mime, start = header
+            # Base64 may arrive wrapped over several lines
+            if _has_whitespace(url, start):
+                url, start = clean_base64(url, start), 0
 
-        m = _DATA_URI_RE.match(url)
-        if m:
-            mime = m.group("mime").lower()
-            # Clean base64 data: remove whitespace, newlines that might have been added
-            b64data = m.group("data").strip()
-            b64data = ''.join(b64data.split())  # Remove ALL whitespace including newlines
-            
             # Prefer treating text/* as UTF-8 if decodable
-            if mime.startswith("text/") or mime in ("application/json", "application/javascript"):
+            if _is_text(mime):
                 try:
-                    decoded = base64.b64decode(b64data).decode("utf-8")
-                    out.append({"path": name, "content": decoded, "encoding": "utf-8", "mime": mime})
+                    raw = decode_base64(url, start)
+                    out.append({"path": name, "content": raw.decode("utf-8"), "encoding": "utf-8", "mime": mime,
+                                "size": len(raw)})
+                    del raw
                     continue
-                except Exception:
+                except ValueError:
+                    # Malformed base64 (binascii.Error, or ValueError for non-ASCII) or not UTF-8:
                     # fallback to keeping base64
-                    out.append({"path": name, "content": b64data, "encoding": "base64", "mime": mime})
+                    pass
+            if blob_store.enabled():
+                try:
+                    blob = blob_store.put(decode_base64(url, start), mime)
+                    out.append({"path": name, "encoding": "blob", "mime": mime, "blob": blob["sha256"],
+                                "size": blob["size"], "git_sha": blob["git_sha"]})
                     continue
-            else:
-                # binary (image, etc.) — keep base64 (cleaned)
-                out.append({"path": name, "content": b64data, "encoding": "base64", "mime": mime})
-                continue
+                except ValueError:
+                    pass
+            # binary (image, etc.) — keep base64 (cleaned)
+            content = clean_base64(url, start)
+            out.append({"path": name, "content": content, "encoding": "base64", "mime": mime, "size": len(content) * 3 // 4})
+            continue
+
+        if not isinstance(url, str):
+            url = bytes(url).decode("utf-8", "replace")
 
         # If it's an http(s) URL — caller may want to download
         if url.startswith("http://") or url.startswith("https://"):
-            out.append({"path": name, "content": url, "encoding": "url", "mime": None})
+            out.append({"path": name, "content": url, "encoding": "url", "mime": None, "size": None})
             continue
 
         # Unknown format — treat as raw string
-        out.append({"path": name, "content": url, "encoding": "raw", "mime": None})
+        out.append({"path": name, "content": url, "encoding": "raw", "mime": None, "size": len(url)})
 
     return out
+
+
+def attachment_file(parsed: Dict) -> Dict:
+    """File dict for push_files from a parse_attachments entry (blob entries stay references)."""
+    if parsed.get("encoding") == "blob":
+        return {"path": parsed["path"], "encoding": "blob", "blob": parsed["blob"], "git_sha": parsed["git_sha"]}
+    return {"path": parsed["path"], "content": parsed["content"], "encoding": parsed.get("encoding", "utf-8")}
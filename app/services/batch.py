@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AIPIPE_API_KEY = os.getenv("AIPIPE_API_KEY")
+# Base URL of an OpenAI-compatible files/batches API
+# (grader/test_server.py serves a local stand-in at http://localhost:9001/v1)
+LLM_BATCH_URL = os.getenv("LLM_BATCH_URL", "https://aipipe.org/openai/v1").rstrip("/")
+# Model for batch requests (defaults to AIPIPE_MODEL)
+LLM_BATCH_MODEL = os.getenv("LLM_BATCH_MODEL")
+# Seconds to keep collecting requests after the first one before submitting a batch
+LLM_BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW", "10"))
+# Maximum requests per batch submission
+LLM_BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "500"))
+# Seconds between batch status polls
+LLM_BATCH_POLL_INTERVAL = float(os.getenv("LLM_BATCH_POLL_INTERVAL", "30"))
+LLM_BATCH_COMPLETION_WINDOW = "24h"
+
+# Collector that LLM calls made in this context are queued in (None = synchronous calls)
+active_batch: ContextVar[Optional["BatchCollector"]] = ContextVar("llm_batch", default=None)
+
+_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchCollector:
+    """Collects responses-API requests from many threads into JSONL batch submissions.
+
+    request() queues a request body and returns a Future. A background
+    thread submits everything queued LLM_BATCH_WINDOW seconds after the first
+    request (or as soon as LLM_BATCH_MAX_REQUESTS are queued), polls the batch
+    until it finishes and resolves each Future with its response body.
+    Batches are processed independently, so requests made while one is in
+    flight (e.g. review passes of tasks whose generation came back) go into
+    the next one.
+    """
+
+    def __init__(
+        self,
+        base_url: str = LLM_BATCH_URL,
+        window: float = LLM_BATCH_WINDOW,
+        max_requests: int = LLM_BATCH_MAX_REQUESTS,
+        poll_interval: float = LLM_BATCH_POLL_INTERVAL,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.window = window
+        self.max_requests = max_requests
+        self.poll_interval = poll_interval
+        self.batches: List[Dict] = []
+        self._queue: List[Tuple[str, Dict, Future]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._collect, name="llm-batch", daemon=True)
+        self._thread.start()
+
+    def request(self, body: Dict) -> Future:
+        """Queue one /v1/responses request body; the Future resolves to the response body."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batch collector is closed")
+            self._queue.append((f"req-{uuid.uuid4().hex[:16]}", body, future))
+            self._cond.notify()
+        return future
+
+    def close(self) -> None:
+        """Submit whatever is still queued and stop collecting."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _collect(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.time() + self.window
+                while len(self._queue) < self.max_requests and not self._closed and time.time() < deadline:
+                    self._cond.wait(deadline - time.time())
+                items = self._queue[:self.max_requests]
+                del self._queue[:self.max_requests]
+            threading.Thread(target=self._process, args=(items,), name="llm-batch-poll", daemon=True).start()
+
+    def _http(self, method: str, path: str, raw: bool = False, **kwargs):
+        response = requests.request(
+            method,
+            f"{self.base_url}{path}",
+            headers={"Authorization": f"Bearer {AIPIPE_API_KEY}"},
+            timeout=120,
+            **kwargs,
+        )
+        response.raise_for_status()
+        return response.text if raw else response.json()
+
+    def _process(self, items: List[Tuple[str, Dict, Future]]) -> None:
+        try:
+            results = self._submit_and_wait(items)
+        except Exception as e:
+            print(f"[BATCH] ❌ Batch of {len(items)} request(s) failed: {e}")
+            self.batches.append({"id": None, "status": f"error: {e}", "requests": len(items), "results": 0, "seconds": 0})
+            for _custom_id, _body, future in items:
+                future.set_exception(e)
+            return
+        for custom_id, _body, future in items:
+            result = results.get(custom_id)
+            if result is None:
+                future.set_exception(RuntimeError(f"Batch returned no result for {custom_id}"))
+            elif result["error"]:
+                future.set_exception(RuntimeError(f"Batch request {custom_id} failed: {result['error']}"))
+            else:
+                future.set_result(result["body"])
+
+    def _submit_and_wait(self, items: List[Tuple[str, Dict, Future]]) -> Dict[str, Dict]:
+        lines = "\n".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/responses", "body": body})
+            for custom_id, body, _future in items
+        )
+        upload = self._http("post", "/files", files={"file": ("batch.jsonl", lines.encode("utf-8"), "application/jsonl")}, data={"purpose": "batch"})
+        batch = self._http("post", "/batches", json={
+            "input_file_id": upload["id"],
+            "endpoint": "/v1/responses",
+            "completion_window": LLM_BATCH_COMPLETION_WINDOW,
+        })
+        started = time.time()
+        print(f"[BATCH] Submitted {batch['id']} with {len(items)} request(s) ({len(lines) // 1024} KB)")
+
+        while batch.get("status") not in _FINAL_STATUSES:
+            time.sleep(self.poll_interval)
+            batch = self._http("get", f"/batches/{batch['id']}")
+            counts = batch.get("request_counts") or {}
+            print(f"[BATCH] {batch['id']}: {batch.get('status')} "
+                  f"({counts.get('completed', 0)}/{counts.get('total', len(items))} done, {time.time() - started:.0f}s)")
+
+        results: Dict[str, Dict] = {}
+        for key in ("output_file_id", "error_file_id"):
+            if not batch.get(key):
+                continue
+            for line in self._http("get", f"/files/{batch[key]}/content", raw=True).splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                error = entry.get("error")
+                if not error and response.get("status_code", 200) >= 400:
+                    error = response.get("body")
+                results[entry["custom_id"]] = {"body": response.get("body"), "error": error}
+
+        if batch.get("status") != "completed" and not results:
+            raise RuntimeError(f"Batch {batch['id']} {batch.get('status')}: {batch.get('errors')}")
+        self.batches.append({
+            "id": batch["id"],
+            "status": batch.get("status"),
+            "requests": len(items),
+            "results": len(results),
+            "seconds": round(time.time() - started, 1),
+        })
+        print(f"[BATCH] {batch['id']} {batch.get('status')}: {len(results)}/{len(items)} result(s) in {time.time() - started:.0f}s")
+        return results
+
+
+@contextmanager
+def run_batch(**kwargs):
+    """Send every LLM call made in this context through one BatchCollector.
+
+    Threads and asyncio tasks started inside the block inherit the context
+    (asyncio.to_thread and copy_context().run copy it), so whole generation
+    pipelines can run unchanged while their calls are batched.
+    """
+    collector = BatchCollector(**kwargs)
+    token = active_batch.set(collector)
+    try:
+        yield collector
+    finally:
+        active_batch.reset(token)
+        collector.close()
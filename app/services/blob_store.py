@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+from services.context_store import DB_PATH, transaction
+
+# Directory of the content-addressed attachment store
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", str(DB_PATH.parent / "blobs")))
+# Total size the store may reach before least recently used blobs are evicted (0 disables the store)
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Blobs used this recently are never evicted (tasks in flight still need them)
+BLOB_STORE_PIN_SECONDS = float(os.getenv("BLOB_STORE_PIN_SECONDS", "3600"))
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        git_sha TEXT NOT NULL,
+        mime TEXT,
+        created REAL NOT NULL,
+        last_used REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)",
+]
+# Bytes copied per read when storing a file object
+_COPY_CHUNK = 1 << 20
+_schema_ready = False
+_stats_lock = threading.Lock()
+_stats = {"stored": 0, "deduplicated": 0, "evicted": 0, "uploads_reused": 0}
+
+Data = Union[bytes, bytearray, memoryview]
+
+
+def _ensure_schema(conn) -> None:
+    global _schema_ready
+    if not _schema_ready:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        _schema_ready = True
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def enabled() -> bool:
+    return BLOB_STORE_MAX_BYTES > 0
+
+
+def git_blob_sha(data: Data) -> str:
+    """SHA-1 git gives a file with this content (what the contents API reports as `sha`)."""
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _path(sha256: str) -> Path:
+    return BLOB_STORE_DIR / sha256[:2] / sha256
+
+
+def _tmp_path(directory: Path, name: str) -> Path:
+    # Blobs are written under a temporary name and renamed, so readers never see a partial blob
+    return directory / f"{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _lookup(sha256: str) -> Optional[Dict]:
+    """The stored blob with this SHA-256 (marked as used), or None."""
+    with transaction() as conn:
+        _ensure_schema(conn)
+        row = conn.execute("SELECT size, git_sha FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if not row or not _path(sha256).exists():
+            return None
+        conn.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+    _count("deduplicated")
+    return {"sha256": sha256, "size": row[0], "git_sha": row[1]}
+
+
+def _register(sha256: str, size: int, git_sha: str, mime: Optional[str]) -> Dict:
+    now = time.time()
+    with transaction() as conn:
+        _ensure_schema(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO blobs (sha256, size, git_sha, mime, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (sha256, size, git_sha, mime, now, now),
+        )
+    _count("stored")
+    _evict()
+    return {"sha256": sha256, "size": size, "git_sha": git_sha}
+
+
+def put(data: Data, mime: Optional[str] = None) -> Dict:
+    """Store `data` under its SHA-256 and return {"sha256", "size", "git_sha"}.
+
+    Content already in the store is not written again; either way the blob
+    becomes the most recently used one.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    known = _lookup(sha256)
+    if known:
+        return known
+    path = _path(sha256)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path.parent, sha256)
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return _register(sha256, len(data), git_blob_sha(data), mime)
+
+
+def put_file(f: BinaryIO, size: int, mime: Optional[str] = None) -> Dict:
+    """Like put(), for the `size` bytes left in a file object.
+
+    The content is hashed while it is copied into the store in chunks, so
+    it is never held in memory as a whole.
+    """
+    BLOB_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(BLOB_STORE_DIR, "upload")
+    h = hashlib.sha256()
+    git = hashlib.sha1(b"blob %d\0" % size)
+    copied = 0
+    with open(tmp, "wb") as out:
+        while chunk := f.read(_COPY_CHUNK):
+            h.update(chunk)
+            git.update(chunk)
+            out.write(chunk)
+            copied += len(chunk)
+    if copied != size:
+        tmp.unlink(missing_ok=True)
+        raise ValueError(f"Expected {size} bytes, read {copied}")
+    sha256 = h.hexdigest()
+    known = _lookup(sha256)
+    if known:
+        tmp.unlink(missing_ok=True)
+        return known
+    path = _path(sha256)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, path)
+    return _register(sha256, size, git.hexdigest(), mime)
+
+
+def get(sha256: str) -> bytes:
+    """Content of a stored blob; raises KeyError if it is unknown or was evicted."""
+    try:
+        data = _path(sha256).read_bytes()
+    except FileNotFoundError:
+        raise KeyError(f"Blob {sha256} is not in the attachment store (evicted?)")
+    with transaction() as conn:
+        _ensure_schema(conn)
+        conn.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+    return data
+
+
+def note_reused_upload() -> None:
+    _count("uploads_reused")
+
+
+def _evict() -> None:
+    """Delete least recently used blobs until the store fits BLOB_STORE_MAX_BYTES."""
+    with transaction() as conn:
+        _ensure_schema(conn)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= BLOB_STORE_MAX_BYTES:
+            return
+        victims = []
+        for sha256, size in conn.execute(
+            "SELECT sha256, size FROM blobs WHERE last_used < ? ORDER BY last_used",
+            (time.time() - BLOB_STORE_PIN_SECONDS,),
+        ):
+            if total <= BLOB_STORE_MAX_BYTES:
+                break
+            victims.append(sha256)
+            total -= size
+        for sha256 in victims:
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+    for sha256 in victims:
+        _path(sha256).unlink(missing_ok=True)
+    if victims:
+        _count("evicted", len(victims))
+        print(f"[BLOBS] Evicted {len(victims)} least recently used blob(s), {total // 1024} KB stored")
+
+
+def blob_stats() -> Dict:
+    """Stored blobs and bytes, plus dedup, eviction and upload-reuse counters."""
+    with transaction() as conn:
+        _ensure_schema(conn)
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+    with _stats_lock:
+        return {"blobs": count, "bytes": total, "max_bytes": BLOB_STORE_MAX_BYTES, **_stats}
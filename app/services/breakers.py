@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Seconds of call history a breaker's failure rate is measured over
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "120"))
+# Calls needed in the window before a breaker may open
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "4"))
+# Share of failed (or too slow) calls in the window that opens the breaker
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+# Consecutive failed calls that open the breaker whatever the window holds (hung upstreams fail one timeout apart)
+BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("BREAKER_CONSECUTIVE_FAILURES", "3"))
+# Seconds an open breaker rejects calls before letting one probe through
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+# LLM calls slower than this many seconds count as failures
+BREAKER_LLM_SLOW_CALL = float(os.getenv("BREAKER_LLM_SLOW_CALL", "240"))
+# GitHub API calls slower than this many seconds count as failures
+BREAKER_GITHUB_SLOW_CALL = float(os.getenv("BREAKER_GITHUB_SLOW_CALL", "20"))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker in front of one dependency.
+
+    Closed: calls go through and their outcome (exception, a result the
+    `failed` predicate rejects, or latency above `slow_call`) is kept for
+    `window` seconds. Calls still running after `slow_call` seconds already
+    count as failures. The breaker opens once at least BREAKER_MIN_CALLS are
+    in the window and BREAKER_FAILURE_RATE of them failed, or after
+    BREAKER_CONSECUTIVE_FAILURES failures in a row.
+    Open: calls raise CircuitOpenError at once for BREAKER_COOLDOWN seconds.
+    Half-open: one probe call goes through (the rest are rejected); success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call: float,
+        window: float = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        cooldown: float = BREAKER_COOLDOWN,
+        consecutive: int = BREAKER_CONSECUTIVE_FAILURES,
+    ):
+        self.name = name
+        self.slow_call = slow_call
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.consecutive = consecutive
+        self.state = "closed"
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self.rejected = 0
+        self._calls: deque = deque()  # (time, failed, latency)
+        self._inflight: Dict[object, float] = {}  # token -> start time
+        self._streak = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _stuck(self, now: float) -> int:
+        """Calls still running after slow_call seconds (already failures, whatever they return)."""
+        return sum(1 for start in self._inflight.values() if now - start > self.slow_call)
+
+    def _check(self, now: float) -> None:
+        """Open a closed breaker when the window's failure rate or the failure streak says so."""
+        if self.state != "closed":
+            return
+        self._trim(now)
+        stuck = self._stuck(now)
+        calls = len(self._calls) + stuck
+        failures = sum(1 for _t, f, _l in self._calls if f) + stuck
+        if self._streak + stuck >= self.consecutive:
+            self._open(now, f"{self._streak + stuck} calls in a row failed or hung past {self.slow_call:.0f}s")
+        elif calls >= self.min_calls and failures / calls >= self.failure_rate:
+            self._open(now, f"{failures}/{calls} calls failed in the last {self.window:.0f}s")
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = "open"
+        self.opened_at = now
+        self.trips += 1
+        print(f"[BREAKER] 🔴 {self.name} open for {self.cooldown:.0f}s: {reason}")
+
+    def _reject(self, now: float) -> CircuitOpenError:
+        self.rejected += 1
+        if self.state == "open":
+            return CircuitOpenError(f"{self.name} circuit open, retry in {self.cooldown - (now - self.opened_at):.0f}s")
+        return CircuitOpenError(f"{self.name} circuit half-open, waiting for the probe call")
+
+    def _before(self, token: object) -> bool:
+        """Admit a call or raise CircuitOpenError; True when the call is the half-open probe."""
+        now = time.time()
+        with self._lock:
+            self._check(now)
+            if self.state == "open":
+                if now - self.opened_at < self.cooldown:
+                    raise self._reject(now)
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probing:
+                    raise self._reject(now)
+                self._probing = True
+                print(f"[BREAKER] 🟡 {self.name} half-open, sending a probe call")
+                return True
+            self._inflight[token] = now
+            return False
+
+    def _after(self, token: object, probe: bool, failed: bool, latency: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._inflight.pop(token, None)
+            if probe:
+                self._probing = False
+                if failed:
+                    self._open(now, f"probe failed after {latency:.1f}s")
+                else:
+                    self.state = "closed"
+                    self._calls.clear()
+                    self._streak = 0
+                    print(f"[BREAKER] 🟢 {self.name} closed, probe succeeded in {latency:.1f}s")
+                return
+            self._calls.append((now, failed, latency))
+            self._streak = self._streak + 1 if failed else 0
+            self._check(now)
+
+    def call(self, fn: Callable, *args, failed: Optional[Callable[[object], bool]] = None, **kwargs):
+        """Run fn(*args, **kwargs) through the breaker.
+
+        `failed` marks results that count as failures without raising (e.g.
+        HTTP 5xx responses the caller retries itself).
+        """
+        token = object()
+        probe = self._before(token)
+        start = time.time()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self._after(token, probe, True, time.time() - start)
+            raise
+        latency = time.time() - start
+        self._after(token, probe, latency > self.slow_call or bool(failed and failed(result)), latency)
+        return result
+
+    def available(self) -> bool:
+        """Whether a call made now would be let through."""
+        now = time.time()
+        with self._lock:
+            self._check(now)
+            if self.state == "open":
+                return now - self.opened_at >= self.cooldown
+            return not (self.state == "half_open" and self._probing)
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            calls = len(self._calls)
+            failures = sum(1 for _t, f, _l in self._calls if f)
+            latencies = [l for _t, _f, l in self._calls]
+            return {
+                "state": self.state,
+                "calls": calls,
+                "in_flight": len(self._inflight),
+                "stuck": self._stuck(now),
+                "consecutive_failures": self._streak,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "avg_latency_s": round(sum(latencies) / calls, 2) if calls else None,
+                "retry_in_s": round(max(self.cooldown - (now - self.opened_at), 0), 1) if self.state == "open" else None,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str, slow_call: float, timeout: float = 0) -> CircuitBreaker:
+    """The process-wide breaker for a dependency, created on first use.
+
+    The window is stretched to at least `timeout` (the dependency's request
+    timeout), so calls that fail by timing out still share a window.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, slow_call, window=max(BREAKER_WINDOW, timeout))
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, Dict]:
+    """State, rolling failure rate and latency of every breaker (for the health endpoint)."""
+    with _breakers_lock:
+        items = list(_breakers.items())
+    return {name: b.snapshot() for name, b in items}
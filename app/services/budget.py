@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from services import metrics
+
+load_dotenv()
+
+# Daily LLM spend limit in USD (unset: the limit AIPipe reports; 0 disables the governor)
+LLM_DAILY_BUDGET = os.getenv("LLM_DAILY_BUDGET")
+# Share of the budget kept in reserve: below it tasks run on the fallback provider
+BUDGET_RESERVE = float(os.getenv("BUDGET_RESERVE", "0.2"))
+# Provider spec ("backend:model") used when headroom is low (defaults to ROUTER_FAST_PROVIDER)
+BUDGET_FALLBACK_PROVIDER = os.getenv("BUDGET_FALLBACK_PROVIDER") or os.getenv("ROUTER_FAST_PROVIDER") or "aipipe:gpt-4o-mini"
+# Seconds a task waits for headroom before it is rejected
+BUDGET_QUEUE_TIMEOUT = float(os.getenv("BUDGET_QUEUE_TIMEOUT", "600"))
+# Optional JSON price overrides: {"model": [input, cached input, output] in USD per 1M tokens}
+LLM_PRICES = os.getenv("LLM_PRICES", "")
+
+# USD per 1M tokens: (input, cached input, output). Model names match by prefix, longest first.
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+    "o3-pro": (20.00, 20.00, 80.00),
+    "o3": (2.00, 0.50, 8.00),
+    "o4-mini": (1.10, 0.275, 4.40),
+    "gemini-2.5-flash": (0.30, 0.075, 2.50),
+    "gemini-2.5-pro": (1.25, 0.31, 10.00),
+}
+MODEL_PRICES.update({model: tuple(p) for model, p in json.loads(LLM_PRICES or "{}").items()})
+# Unknown models are priced like gpt-4o
+DEFAULT_PRICE = MODEL_PRICES["gpt-4o"]
+# Output tokens of a generation call before any have been observed for the model
+DEFAULT_OUTPUT_TOKENS = 6000
+# Review and fix passes, as a share of the generation call's cost
+REVIEW_COST_SHARE = 0.4
+
+_cond = threading.Condition()
+_day = ""
+_spent = 0.0
+_spent_by_task: Dict[str, float] = {}
+_reservations: Dict[str, float] = {}
+_output_tokens: Dict[str, float] = {}
+_decisions: Dict[str, int] = {"full": 0, "downgrade": 0, "no_review": 0, "queued": 0, "rejected": 0}
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when a task cannot be admitted within the daily LLM budget."""
+
+
+def price(model: Optional[str]) -> Tuple[float, float, float]:
+    """(input, cached input, output) USD per token for a model."""
+    name = (model or "").split("/")[-1]
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if name.startswith(prefix):
+            return tuple(p / 1e6 for p in MODEL_PRICES[prefix])
+    return tuple(p / 1e6 for p in DEFAULT_PRICE)
+
+
+def call_cost(model: Optional[str], usage: Optional[Dict]) -> float:
+    usage = usage or {}
+    p_in, p_cached, p_out = price(model)
+    cached = usage.get("cached_tokens", 0) or 0
+    return (max((usage.get("input_tokens", 0) or 0) - cached, 0) * p_in
+            + cached * p_cached + (usage.get("output_tokens", 0) or 0) * p_out)
+
+
+def _roll_day() -> None:
+    """Reset the spend at UTC midnight (called with _cond held)."""
+    global _day, _spent
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+    if today != _day:
+        _day, _spent = today, 0.0
+        _spent_by_task.clear()
+
+
+def record_spend(model: Optional[str], usage: Optional[Dict]) -> float:
+    """Add the cost of one completed provider call to today's spend."""
+    global _spent
+    cost = call_cost(model, usage)
+    task = metrics.current_task.get()
+    output = (usage or {}).get("output_tokens", 0) or 0
+    with _cond:
+        _roll_day()
+        _spent += cost
+        if task:
+            _spent_by_task[task] = _spent_by_task.get(task, 0.0) + cost
+        # Only generation-sized outputs say how much a generation call returns
+        if output >= 1000:
+            prev = _output_tokens.get(model)
+            _output_tokens[model] = output if prev is None else 0.8 * prev + 0.2 * output
+    return cost
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, review: bool = True, calls: int = 1) -> float:
+    """Expected USD cost of a task: `calls` generation calls (prompt plus the
+    model's typical output) and, with `review`, an allowance for review and
+    fix passes."""
+    p_in, _p_cached, p_out = price(model)
+    with _cond:
+        output = _output_tokens.get(model, DEFAULT_OUTPUT_TOKENS)
+    generation = prompt_tokens * p_in + output * p_out
+    return generation * (calls + (REVIEW_COST_SHARE if review else 0))
+
+
+def _limit() -> Optional[float]:
+    if LLM_DAILY_BUDGET is not None and LLM_DAILY_BUDGET.strip() != "":
+        limit = float(LLM_DAILY_BUDGET)
+        return limit if limit > 0 else None
+    remote = metrics.remote_usage()
+    return float(remote["limit"]) if remote.get("limit") else None
+
+
+def _headroom(limit: float) -> float:
+    """Budget left after today's spend and what admitted tasks are still expected to spend."""
+    _roll_day()
+    remote = metrics.remote_usage()
+    spent = _spent
+    if remote.get("cost_today") is not None and remote.get("updated") \
+            and time.strftime("%Y-%m-%d", time.gmtime(remote["updated"])) == _day:
+        spent = max(spent, remote["cost_today"])
+    reserved = sum(max(est - _spent_by_task.get(task, 0.0), 0.0) for task, est in _reservations.items())
+    return limit - spent - reserved
+
+
+def admit(task: str, prompt_tokens: int, model: Optional[str], fallback_model: Optional[str], candidates: int = 1) -> Dict:
+    """Decide how a task may run within the daily budget, waiting for headroom if needed.
+
+    "full" while the full estimate on `model` (with `candidates` speculative
+    generation calls) fits and leaves BUDGET_RESERVE of the budget;
+    "downgrade" (fallback provider, single call, with review) or "no_review"
+    (fallback provider, review skipped) as headroom runs low.
+    When even that does not fit, the task waits until running tasks finish
+    or the day rolls over, and BudgetExceededError is raised after
+    BUDGET_QUEUE_TIMEOUT seconds. The estimate is reserved until release().
+
+    Returns {"mode", "estimate", "headroom"}.
+    """
+    limit = _limit()
+    if limit is None:
+        return {"mode": "full", "estimate": None, "headroom": None}
+    options = [
+        ("full", estimate_cost(model, prompt_tokens, calls=candidates), limit * BUDGET_RESERVE),
+        ("downgrade", estimate_cost(fallback_model, prompt_tokens), 0.0),
+        ("no_review", estimate_cost(fallback_model, prompt_tokens, review=False), 0.0),
+    ]
+    deadline = time.time() + BUDGET_QUEUE_TIMEOUT
+    queued = False
+    with _cond:
+        while True:
+            headroom = _headroom(limit)
+            for mode, estimate, reserve in options:
+                if estimate <= headroom - reserve:
+                    _reservations[task] = estimate
+                    _decisions[mode] += 1
+                    if mode != "full" or queued:
+                        print(f"[BUDGET] {task}: {mode} (estimate ${estimate:.4f}, headroom ${headroom:.4f} of ${limit:.2f})")
+                    return {"mode": mode, "estimate": round(estimate, 6), "headroom": round(headroom, 6)}
+            if not queued:
+                queued = True
+                _decisions["queued"] += 1
+                print(f"[BUDGET] ⏳ {task} queued: cheapest estimate ${options[-1][1]:.4f}, headroom ${headroom:.4f}")
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                _decisions["rejected"] += 1
+                raise BudgetExceededError(f"Daily LLM budget exhausted (${headroom:.4f} left of ${limit:.2f})")
+            # Woken when a task releases its reservation; polling catches the day rollover and remote updates
+            _cond.wait(min(remaining, 30))
+
+
+def release(task: str) -> None:
+    """Drop a task's reservation once it is done; its actual spend stays counted."""
+    with _cond:
+        _reservations.pop(task, None)
+        _cond.notify_all()
+
+
+def budget_stats() -> Dict:
+    """Limit, spend, reservations and admission decisions for /metrics."""
+    limit = _limit()
+    with _cond:
+        headroom = _headroom(limit) if limit is not None else None
+        return {
+            "limit": limit,
+            "spent_today": round(_spent, 6),
+            "reserved": round(sum(max(est - _spent_by_task.get(t, 0.0), 0.0) for t, est in _reservations.items()), 6),
+            "headroom": round(headroom, 6) if headroom is not None else None,
+            "fallback_provider": BUDGET_FALLBACK_PROVIDER,
+            "expected_output_tokens": {m: int(t) for m, t in _output_tokens.items()},
+            "decisions": dict(_decisions),
+        }
@@ -0,0 +1,511 @@
+import posixpath
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+# Elements that never have children (no closing tag)
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+# Tag names we recognise in free-text checks ("canvas element with id=...")
+_KNOWN_TAGS = {
+    "a", "button", "canvas", "div", "form", "h1", "h2", "h3", "img", "input",
+    "label", "li", "nav", "ol", "p", "section", "select", "span", "svg",
+    "table", "tbody", "td", "textarea", "th", "thead", "tr", "ul", "footer",
+    "header", "main", "article", "aside", "progress", "video", "audio",
+}
+
+
+class Node:
+    """Minimal DOM element produced by parse_html()."""
+
+    __slots__ = ("tag", "attrs", "children", "parent", "text")
+
+    def __init__(self, tag: str, attrs: Optional[Dict[str, str]] = None, parent: Optional["Node"] = None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children: List["Node"] = []
+        self.parent = parent
+        self.text = ""
+
+    @property
+    def classes(self) -> List[str]:
+        return self.attrs.get("class", "").split()
+
+    def iter(self):
+        """Yield all descendants in document order."""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document")
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k.lower(): (v or "") for k, v in attrs}, self._stack[-1])
+        self._stack[-1].children.append(node)
+        if tag not in _VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {k.lower(): (v or "") for k, v in attrs}, self._stack[-1])
+        self._stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # Pop up to the matching open tag; ignore stray closing tags
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data):
+        self._stack[-1].text += data
+
+
+def parse_html(html: str) -> Node:
+    """Parse HTML into a lightweight tree (tolerant of unclosed tags)."""
+    builder = _TreeBuilder()
+    builder.feed(html or "")
+    builder.close()
+    return builder.root
+
+
+# ---------------------------------------------------------------------------
+# CSS selectors: tag, *, #id, .class, [attr], [attr=|*=|^=|$=|~=v],
+# descendant (space) and child (>) combinators, comma groups.
+# ---------------------------------------------------------------------------
+
+_TAG_RE = re.compile(r"^(\*|[a-zA-Z][\w-]*)")
+_SIMPLE_RE = re.compile(r"^([#.])([\w-]+)")
+_ATTR_RE = re.compile(
+    r"""^\[\s*([\w:-]+)\s*(?:([*^$~|]?=)\s*(?:"([^"]*)"|'([^']*)'|([^\]\s]+))\s*)?\]"""
+)
+_PSEUDO_RE = re.compile(r"^::?[\w-]+(\([^)]*\))?")
+
+
+def _split_top_level(selector: str, seps: str) -> List[str]:
+    """Split on separator characters outside brackets and quotes."""
+    parts, buf, depth, quote = [], [], 0, None
+    for ch in selector:
+        if quote:
+            buf.append(ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in "'\"":
+            quote = ch
+        elif ch in "[(":
+            depth += 1
+        elif ch in "])":
+            depth -= 1
+        elif depth == 0 and ch in seps:
+            parts.append("".join(buf))
+            parts.append(ch)
+            buf = []
+            continue
+        buf.append(ch)
+    parts.append("".join(buf))
+    return parts
+
+
+def _parse_compound(text: str) -> Dict:
+    compound = {"tag": None, "ids": [], "classes": [], "attrs": []}
+    m = _TAG_RE.match(text)
+    if m:
+        compound["tag"] = None if m.group(1) == "*" else m.group(1).lower()
+        text = text[m.end():]
+    while text:
+        m = _SIMPLE_RE.match(text)
+        if m:
+            compound["ids" if m.group(1) == "#" else "classes"].append(m.group(2))
+            text = text[m.end():]
+            continue
+        m = _ATTR_RE.match(text)
+        if m:
+            value = next((g for g in m.group(3, 4, 5) if g is not None), None)
+            compound["attrs"].append((m.group(1).lower(), m.group(2), value))
+            text = text[m.end():]
+            continue
+        m = _PSEUDO_RE.match(text)
+        if m:
+            # Pseudo-classes are not evaluated statically; ignore them
+            text = text[m.end():]
+            continue
+        raise ValueError(f"Unsupported selector syntax near {text!r}")
+    return compound
+
+
+def _parse_selector(selector: str) -> List[List[Tuple[str, Dict]]]:
+    """Parse a selector list into groups of (combinator, compound) steps."""
+    groups = []
+    for group in _split_top_level(selector, ",")[::2]:
+        steps: List[Tuple[str, Dict]] = []
+        combinator = " "
+        for token in _split_top_level(group.strip(), " >\t\n"):
+            token = token.strip()
+            if not token:
+                continue
+            if token == ">":
+                combinator = ">"
+                continue
+            steps.append((combinator, _parse_compound(token)))
+            combinator = " "
+        if steps:
+            groups.append(steps)
+    return groups
+
+
+def _matches(node: Node, compound: Dict) -> bool:
+    if compound["tag"] and node.tag != compound["tag"]:
+        return False
+    if any(node.attrs.get("id") != i for i in compound["ids"]):
+        return False
+    classes = node.classes
+    if any(c not in classes for c in compound["classes"]):
+        return False
+    for name, op, value in compound["attrs"]:
+        if name not in node.attrs:
+            return False
+        actual = node.attrs[name]
+        if op is None:
+            continue
+        if op == "=" and actual != value:
+            return False
+        if op == "*=" and value not in actual:
+            return False
+        if op == "^=" and not actual.startswith(value):
+            return False
+        if op == "$=" and not actual.endswith(value):
+            return False
+        if op == "~=" and value not in actual.split():
+            return False
+        if op == "|=" and not (actual == value or actual.startswith(value + "-")):
+            return False
+    return True
+
+
+def _matches_steps(node: Node, steps: List[Tuple[str, Dict]]) -> bool:
+    combinator, compound = steps[-1]
+    if not _matches(node, compound):
+        return False
+    if len(steps) == 1:
+        return True
+    rest = steps[:-1]
+    parent = node.parent
+    if combinator == ">":
+        return parent is not None and _matches_steps(parent, rest)
+    while parent is not None:
+        if _matches_steps(parent, rest):
+            return True
+        parent = parent.parent
+    return False
+
+
+def select(root: Node, selector: str) -> List[Node]:
+    """Return all elements under root matching a CSS selector."""
+    groups = _parse_selector(selector)
+    return [n for n in root.iter() if any(_matches_steps(n, steps) for steps in groups)]
+
+
+# ---------------------------------------------------------------------------
+# Check compilation: turn free-text checks into DOM assertions
+# ---------------------------------------------------------------------------
+
+_COUNT_RE = re.compile(r"at least (\d+)", re.I)
+_ID_RE = re.compile(r"""id\s*=\s*['"]([\w-]+)['"]|#([a-zA-Z][\w-]*)""")
+_CLASS_RE = re.compile(
+    r"""class\s*=\s*['"]([\w-]+)['"]"""
+    r"""|\bclass(?:name)?\s+['"]?(?!(?:is|of|the|names?|attribute)\b)([a-zA-Z][\w-]*)"""
+    r"""|(?<![\w.#/-])\.([a-zA-Z][\w-]*)\b"""
+)
+# "at least 3 cards": a count followed by a plural noun
+_COUNT_NOUN_RE = re.compile(r"at least \d+\s+([a-zA-Z][a-zA-Z-]*?)(ies|s)\b", re.I)
+# Plural nouns naming elements by another word than their tag
+_NOUN_TAGS = {"image": "img", "link": "a", "paragraph": "p", "row": "tr", "heading": "h1, h2, h3, h4", "list-item": "li"}
+# Plural nouns after "at least N" that are not elements
+_NON_ELEMENT_NOUNS = {
+    "character", "second", "minute", "hour", "day", "word", "time", "pixel", "px", "m", "item",
+    "element", "column", "result", "record", "value", "option", "point", "check",
+}
+_QUOTED_RE = re.compile(r"""['"]([^'"]+)['"]""")
+_EXPLICIT_SELECTOR_RE = re.compile(
+    r"""[(`]\s*([a-zA-Z*][\w-]*(?:\[[^\]]+\]|[#.][\w-]+)+(?:\s*[> ]\s*[\w#.*\[\]='"-]+)*)\s*[)`]"""
+)
+_FILE_RE = re.compile(r"\b([\w-]+\.(?:json|csv|txt|md))\b", re.I)
+# Unwrapped "tag[attr...]" / "tag.class" tokens ("link[href*='bootstrap'] exists"); "#id" and
+# ".class" alone are handled by the id and class patterns
+_BARE_SELECTOR_RE = re.compile(r"""(?<![\w.#/-])([a-zA-Z][\w-]*|\*)((?:\[[^\]]+\]|[#.][a-zA-Z][\w-]*)+)(?![\w(])""")
+# Tags a bare selector may start with (besides _KNOWN_TAGS)
+_SELECTOR_TAGS = _KNOWN_TAGS | {
+    "*", "link", "script", "meta", "style", "body", "head", "html", "h4", "h5", "h6", "option",
+    "strong", "em", "code", "pre", "small", "time", "output", "iframe", "dialog", "details",
+    "summary", "figure", "figcaption",
+}
+_EXTENSION_RE = re.compile(r"\.(?:html?|css|js|mjs|json|csv|md|txt|png|jpe?g|gif|svg|ico|webp|pdf)$", re.I)
+_CDN_SELECTORS = {
+    "bootstrap": "link[href*='bootstrap'], script[src*='bootstrap']",
+    "chart.js": "script[src*='chart']",
+    "tailwind": "script[src*='tailwind'], link[href*='tailwind']",
+    "marked": "script[src*='marked']",
+    "highlight.js": "script[src*='highlight'], link[href*='highlight']",
+}
+
+
+def _tag_before_id(check: str, match_start: int) -> Optional[str]:
+    """Find an HTML tag name mentioned just before an id reference."""
+    words = re.findall(r"[a-zA-Z][\w-]*", check[:match_start].lower())
+    for word in reversed(words[-4:]):
+        if word in _KNOWN_TAGS:
+            return word
+    return None
+
+
+def compile_check(check: str) -> Optional[List[Dict]]:
+    """Compile a free-text check into a list of assertions.
+
+    Each assertion is a dict with a "kind":
+      - selector: {"selector", "min", "dynamic"} element count in the DOM
+      - readme: {"words"} README.md contains a heading with any of the words
+      - script: {"needles"} all needles appear in the JavaScript
+      - skip: {"reason"} cannot be verified locally but is not a failure
+
+    Returns None when the check is not recognised.
+    """
+    text = check.strip()
+    lower = text.lower()
+    count_m = _COUNT_RE.search(text)
+    count = int(count_m.group(1)) if count_m else 1
+
+    if "license" in lower:
+        return [{"kind": "skip", "reason": "license is created with the repository"}]
+
+    if "readme" in lower:
+        words = [w for w in _QUOTED_RE.findall(text) if w.lower() != "readme.md"]
+        if not words:
+            words = re.findall(r"\b(Usage|Setup|Installation|Summary|License|Features)\b", text, re.I)
+        return [{"kind": "readme", "words": words}] if words else None
+
+    explicit = _EXPLICIT_SELECTOR_RE.search(text)
+    if explicit:
+        return [{"kind": "selector", "selector": explicit.group(1), "min": count, "dynamic": count > 1}]
+
+    for bare in _BARE_SELECTOR_RE.finditer(text):
+        tag, rest = bare.group(1), bare.group(2)
+        # File names ("main.js") and tag#id alone (left to the id path) are not selectors here
+        if tag.lower() in _SELECTOR_TAGS and ("[" in rest or "." in rest) and not _EXTENSION_RE.search(bare.group(0)):
+            return [{"kind": "selector", "selector": bare.group(0), "min": count, "dynamic": count > 1}]
+
+    assertions: List[Dict] = []
+
+    id_m = _ID_RE.search(text)
+    if id_m:
+        elem_id = id_m.group(1) or id_m.group(2)
+        tag = _tag_before_id(text, id_m.start())
+        assertions.append({"kind": "selector", "selector": f"{tag or ''}#{elem_id}", "min": 1, "dynamic": False})
+        if count_m and "row" in lower:
+            assertions.append({"kind": "selector", "selector": f"#{elem_id} tr", "min": count, "dynamic": True})
+        return assertions
+
+    class_m = _CLASS_RE.search(text)
+    if class_m:
+        cls = class_m.group(1) or class_m.group(2) or class_m.group(3)
+        return [{"kind": "selector", "selector": f".{cls}", "min": count, "dynamic": True}]
+
+    # "at least 3 cards" -> .card, "at least 2 buttons" -> button
+    noun_m = _COUNT_NOUN_RE.search(text)
+    if noun_m:
+        stem, suffix = noun_m.group(1).lower(), noun_m.group(2).lower()
+        noun = stem + "y" if suffix == "ies" else stem
+        if noun.endswith(("sse", "xe", "che", "she")):
+            noun = noun[:-1]  # boxes -> box
+        if noun not in _NON_ELEMENT_NOUNS and not noun.endswith("s"):
+            selector = _NOUN_TAGS.get(noun) or (noun if noun in _KNOWN_TAGS else f".{noun}")
+            return [{"kind": "selector", "selector": selector, "min": count, "dynamic": True}]
+
+    tags = [t for t in ("thead", "tbody", "tfoot") if re.search(rf"\b{t}\b", lower)]
+    if tags:
+        return [{"kind": "selector", "selector": f"table {t}", "min": 1, "dynamic": True} for t in tags]
+
+    if "viewport" in lower:
+        return [{"kind": "selector", "selector": "meta[name='viewport']", "min": 1, "dynamic": False}]
+
+    for keyword, selector in _CDN_SELECTORS.items():
+        if keyword in lower and ("load" in lower or "cdn" in lower or "include" in lower or "use" in lower):
+            return [{"kind": "selector", "selector": selector, "min": 1, "dynamic": False}]
+
+    if "fetch" in lower:
+        file_m = _FILE_RE.search(text)
+        if file_m:
+            return [{"kind": "script", "needles": ["fetch", file_m.group(1)]}]
+
+    return None
+
+
+def _dynamic_evidence(selector: str, script_text: str) -> bool:
+    """Whether the JavaScript plausibly creates elements matching selector at runtime."""
+    try:
+        groups = _parse_selector(selector)
+    except ValueError:
+        return False
+    for steps in groups:
+        compound = steps[-1][1]
+        for cls in compound["classes"]:
+            if re.search(rf"""['"\s]{re.escape(cls)}['"\s]""", script_text):
+                return True
+        tag = compound["tag"]
+        if tag and (f"<{tag}" in script_text or re.search(rf"""createElement\(\s*['"]{tag}['"]""", script_text)):
+            return True
+        if tag == "tr" and "insertRow" in script_text:
+            return True
+    return False
+
+
+def _collect_sources(files: List[Dict]) -> Tuple[Optional[Node], str, str]:
+    """Return (DOM of index.html, concatenated JavaScript, README text)."""
+    by_path = {f.get("path", ""): f.get("content", "") or "" for f in files}
+    html = by_path.get("index.html")
+    if html is None:
+        html = next((c for p, c in by_path.items() if p.endswith(".html")), None)
+    dom = parse_html(html) if html is not None else None
+
+    scripts = [c for p, c in by_path.items() if p.endswith(".js")]
+    if dom is not None:
+        scripts.extend(n.text for n in select(dom, "script") if n.text.strip())
+    readme = next((c for p, c in by_path.items() if p.lower() == "readme.md"), "")
+    return dom, "\n".join(scripts), readme
+
+
+def evaluate_checks(files: List[Dict], checks: List[str]) -> List[Dict]:
+    """Evaluate checks against generated files without deploying them.
+
+    Returns one result per check: {"check", "status", "detail"} where status is
+    "pass", "fail", "dynamic" (content is created by JavaScript at runtime),
+    "skip" (not verifiable locally) or "unknown" (check not recognised).
+    """
+    dom, script_text, readme = _collect_sources(files)
+    results = []
+    for check in checks or []:
+        assertions = compile_check(check)
+        if assertions is None:
+            results.append({"check": check, "status": "unknown", "detail": "not recognised"})
+            continue
+
+        status, details = "pass", []
+        for a in assertions:
+            kind = a["kind"]
+            if kind == "skip":
+                status = "skip"
+                details.append(a["reason"])
+            elif kind == "readme":
+                headings = [l.lstrip("#").strip().lower() for l in readme.splitlines() if l.startswith("#")]
+                if not any(w.lower() in h for w in a["words"] for h in headings):
+                    status = "fail"
+                    details.append(f"README.md has no {' / '.join(a['words'])} section")
+            elif kind == "script":
+                missing = [n for n in a["needles"] if n not in script_text]
+                if missing:
+                    status = "fail"
+                    details.append(f"JavaScript does not reference {', '.join(missing)}")
+            elif kind == "selector":
+                if dom is None:
+                    status = "fail"
+                    details.append("no HTML file generated")
+                    continue
+                try:
+                    found = len(select(dom, a["selector"]))
+                except ValueError as e:
+                    status = "unknown" if status == "pass" else status
+                    details.append(str(e))
+                    continue
+                if found >= a["min"]:
+                    details.append(f"{a['selector']}: {found}")
+                elif a["dynamic"] and _dynamic_evidence(a["selector"], script_text):
+                    if status == "pass":
+                        status = "dynamic"
+                    details.append(f"{a['selector']}: {found} static, created by script")
+                else:
+                    status = "fail"
+                    details.append(f"{a['selector']}: found {found}, expected at least {a['min']}")
+        results.append({"check": check, "status": status, "detail": "; ".join(details)})
+    return results
+
+
+def failed_checks(results: List[Dict]) -> List[Dict]:
+    """Only the results that definitely fail."""
+    return [r for r in results if r["status"] == "fail"]
+
+
+# ---------------------------------------------------------------------------
+# Cross-file integrity: IDs used by scripts exist, local assets exist
+# ---------------------------------------------------------------------------
+
+_JS_ID_REF_RE = re.compile(r"""getElementById\(\s*['"]([\w-]+)['"]\s*\)|querySelector(?:All)?\(\s*['"]#([\w-]+)['"]\s*\)""")
+_JS_ID_DEF_RE = re.compile(r"""\.id\s*=\s*['"]([\w-]+)['"]|id=\\?['"]([\w-]+)\\?['"]|setAttribute\(\s*['"]id['"]\s*,\s*['"]([\w-]+)['"]""")
+
+
+def script_id_references(script_text: str) -> List[str]:
+    """Element IDs the JavaScript looks up, in order of first use."""
+    seen = []
+    for m in _JS_ID_REF_RE.finditer(script_text):
+        elem_id = m.group(1) or m.group(2)
+        if elem_id not in seen:
+            seen.append(elem_id)
+    return seen
+
+
+def cross_reference_issues(files: List[Dict], extra_paths: Optional[List[str]] = None, required_ids: Optional[List[str]] = None) -> List[Dict]:
+    """Find broken references between generated files.
+
+    Reports IDs looked up by scripts (and required_ids, e.g. from a plan)
+    that no element has, and local scripts/stylesheets that are not among the
+    files or extra_paths. Results use the evaluate_checks() shape with status
+    "fail" so they can feed the same fix passes.
+    """
+    dom, script_text, _readme = _collect_sources(files)
+    if dom is None:
+        return [{"check": "index.html exists", "status": "fail", "detail": "no HTML file generated"}]
+
+    html_ids = {n.attrs["id"] for n in dom.iter() if n.attrs.get("id")}
+    created_ids = {next(g for g in m.groups() if g) for m in _JS_ID_DEF_RE.finditer(script_text)}
+    issues = []
+    for elem_id in script_id_references(script_text):
+        if elem_id not in html_ids and elem_id not in created_ids:
+            issues.append({
+                "check": f"Element #{elem_id} used by script exists",
+                "status": "fail",
+                "detail": f"script looks up #{elem_id} but no element has id=\"{elem_id}\"",
+            })
+    for elem_id in required_ids or []:
+        if elem_id not in html_ids and elem_id not in created_ids:
+            issues.append({
+                "check": f"Element #{elem_id} from the plan exists",
+                "status": "fail",
+                "detail": f"planned element #{elem_id} is missing from index.html",
+            })
+
+    known = {f.get("path") for f in files} | set(extra_paths or [])
+    for node in select(dom, "script[src], link[href]"):
+        ref = node.attrs.get("src") or node.attrs.get("href")
+        if node.tag == "link" and "stylesheet" not in node.attrs.get("rel", ""):
+            continue
+        if re.match(r"^(https?:)?//|^data:", ref):
+            continue
+        # Query and fragment are not part of the file; "./" prefixes and "a/../" segments resolve away
+        path = re.split(r"[?#]", ref, 1)[0]
+        path = posixpath.normpath(path.removeprefix("/")) if path else ""
+        path = "" if path == "." else path
+        if path and path not in known:
+            issues.append({
+                "check": f"Referenced file {path} exists",
+                "status": "fail",
+                "detail": f"index.html references {ref} but it was not generated",
+            })
+    return issues
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+# Per-task JSON files written by earlier versions; read once and imported
+_LEGACY_DIR = _DATA_DIR / "llm_context"
+
+DB_PATH = Path(os.getenv("CONTEXT_DB_PATH", str(_DATA_DIR / "llm_context.db")))
+# Contexts older than this many days are evicted (0 keeps them forever)
+RETENTION_DAYS = float(os.getenv("CONTEXT_RETENTION_DAYS", "30"))
+# Upper bound on stored contexts; the oldest are evicted first
+MAX_ENTRIES = int(os.getenv("CONTEXT_MAX_ENTRIES", "2000"))
+# Recently used contexts kept decoded in memory
+CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "32"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prefixes (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contexts (
+    task TEXT NOT NULL,
+    nonce TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    created REAL NOT NULL,
+    prefix_hash TEXT,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (task, nonce, round)
+);
+CREATE INDEX IF NOT EXISTS contexts_created ON contexts (created);
+"""
+
+_lock = threading.RLock()
+_conn: Optional[sqlite3.Connection] = None
+_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+
+
+@contextmanager
+def transaction():
+    """Yield the shared connection inside a locked, atomic transaction."""
+    global _conn
+    with _lock:
+        if _conn is None:
+            DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+            _conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.executescript(_SCHEMA)
+        with _conn:
+            yield _conn
+
+
+def _compress(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _decompress(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _cache_put(key: tuple, context: Dict) -> None:
+    _cache[key] = context
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def save_context(
+    task: str,
+    nonce: str,
+    round_num: int,
+    files: List[Dict],
+    prompt: str,
+    response: str,
+    prefix: str = "",
+) -> None:
+    """Store the context of a round.
+
+    When the prompt starts with `prefix` (e.g. the system prompt) the prefix is
+    stored once in the prefixes table and shared by every task that uses it.
+    """
+    prefix_hash = None
+    suffix = prompt
+    if prefix and prompt.startswith(prefix):
+        prefix_hash = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        suffix = prompt[len(prefix):]
+    payload = _compress({"files": files, "prompt_suffix": suffix, "response": response})
+
+    with transaction() as conn:
+        if prefix_hash:
+            conn.execute(
+                "INSERT OR IGNORE INTO prefixes (hash, data) VALUES (?, ?)",
+                (prefix_hash, zlib.compress(prefix.encode("utf-8"), 6)),
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO contexts (task, nonce, round, created, prefix_hash, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (task, nonce, round_num, time.time(), prefix_hash, payload),
+        )
+        _evict(conn)
+        _cache_put((task, nonce, round_num), {
+            "task": task, "nonce": nonce, "round": round_num,
+            "files": files, "prompt": prompt, "response": response,
+        })
+    print(f"[CONTEXT] Saved {task}_{nonce} round {round_num} ({len(payload)} bytes compressed)")
+
+
+def load_context(task: str, nonce: str, round_num: int) -> Optional[Dict]:
+    """Load a stored round context (memory cache, then SQLite, then legacy JSON)."""
+    key = (task, nonce, round_num)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+        with transaction() as conn:
+            row = conn.execute(
+                "SELECT c.payload, b.data FROM contexts c LEFT JOIN prefixes b ON b.hash = c.prefix_hash "
+                "WHERE c.task = ? AND c.nonce = ? AND c.round = ?",
+                key,
+            ).fetchone()
+        if row:
+            payload = _decompress(row[0])
+            prefix = zlib.decompress(row[1]).decode("utf-8") if row[1] else ""
+            context = {
+                "task": task, "nonce": nonce, "round": round_num,
+                "files": payload["files"],
+                "prompt": prefix + payload["prompt_suffix"],
+                "response": payload["response"],
+            }
+            _cache_put(key, context)
+            return context
+
+    legacy = _LEGACY_DIR / f"{task}_{nonce}_round{round_num}.json"
+    if legacy.exists():
+        context = json.loads(legacy.read_text())
+        save_context(task, nonce, round_num, context.get("files", []), context.get("prompt", ""), context.get("response", ""))
+        print(f"[CONTEXT] Imported legacy context {legacy.name}")
+        return context
+    return None
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    """Apply retention: drop expired and excess contexts and unreferenced prefixes."""
+    removed = 0
+    if RETENTION_DAYS > 0:
+        cutoff = time.time() - RETENTION_DAYS * 86400
+        removed += conn.execute("DELETE FROM contexts WHERE created < ?", (cutoff,)).rowcount
+    if MAX_ENTRIES > 0:
+        removed += conn.execute(
+            "DELETE FROM contexts WHERE rowid IN (SELECT rowid FROM contexts ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (MAX_ENTRIES,),
+        ).rowcount
+    if removed:
+        conn.execute("DELETE FROM prefixes WHERE hash NOT IN (SELECT prefix_hash FROM contexts WHERE prefix_hash IS NOT NULL)")
+        live = {tuple(r) for r in conn.execute("SELECT task, nonce, round FROM contexts")}
+        for key in [k for k in _cache if k not in live]:
+            del _cache[key]
+        print(f"[CONTEXT] Evicted {removed} context(s) past retention")
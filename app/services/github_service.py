@@ -1,9 +1,17 @@
 import base64
+import os
 import time
 from typing import List, Dict, Optional
 
 import requests
 
+from services import blob_store
+from services.attachments import clean_base64
+from services.breakers import BREAKER_GITHUB_SLOW_CALL, breaker
+
+# Per-request timeout for GitHub API calls in seconds
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+
 try:
     # prefer app-level config if present
     from app import config
@@ -62,6 +70,18 @@ def _skip_github() -> bool:
     return _to_bool(_get_env("SKIP_GITHUB", None))
 
 
+def _api(method: str, url: str, **kwargs) -> requests.Response:
+    """GitHub API request through the GitHub circuit breaker.
+
+    5xx and 429 responses count as failures for the breaker but are returned
+    so callers can retry them; an open breaker raises CircuitOpenError.
+    """
+    return breaker("github", BREAKER_GITHUB_SLOW_CALL, GITHUB_TIMEOUT).call(
+        requests.request, method, url, timeout=GITHUB_TIMEOUT,
+        failed=lambda r: r.status_code >= 500 or r.status_code == 429, **kwargs,
+    )
+
+
 def create_github_repo(repo_name: str, private: bool = False) -> Dict:
     """Create a GitHub repo (or mock when SKIP_GITHUB=1)."""
     if _skip_github():
@@ -76,13 +96,13 @@ def create_github_repo(repo_name: str, private: bool = False) -> Dict:
 
     # retry with small backoff for transient errors
     for attempt in range(1, 4):
-        r = requests.post("https://api.github.com/user/repos", headers=headers, json=payload)
+        r = _api("post", "https://api.github.com/user/repos", headers=headers, json=payload)
         if r.status_code == 201:
             return r.json()
         if r.status_code == 422:
             # Repo likely already exists; attempt to fetch it
             owner = _owner()
-            rr = requests.get(f"https://api.github.com/repos/{owner}/{repo_name}", headers=headers)
+            rr = _api("get", f"https://api.github.com/repos/{owner}/{repo_name}", headers=headers)
             if rr.status_code == 200:
                 return rr.json()
             # fall through to final error
@@ -108,7 +128,7 @@ def enable_github_pages(repo_name: str, branch: str = "main") -> Dict:
     owner = _owner()
     headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
     payload = {"build_type": "legacy", "source": {"branch": branch, "path": "/"}}
-    r = requests.post(f"https://api.github.com/repos/{owner}/{repo_name}/pages", headers=headers, json=payload)
+    r = _api("post", f"https://api.github.com/repos/{owner}/{repo_name}/pages", headers=headers, json=payload)
     if r.status_code in (201, 202):
         return r.json()
     # If pages endpoint returns 409 or similar, raise with helpful message
@@ -119,7 +139,7 @@ def _get_file_sha(owner: str, repo_name: str, path: str, token: str) -> Optional
     headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
     url = f"https://api.github.com/repos/{owner}/{repo_name}/contents/{path}"
     for attempt in range(1, 4):
-        r = requests.get(url, headers=headers)
+        r = _api("get", url, headers=headers)
         if r.status_code == 200:
             return r.json().get("sha")
         if r.status_code == 404:
@@ -141,7 +161,7 @@ def _put_file(owner: str, repo_name: str, path: str, content_b64: str, message:
 
     url = f"https://api.github.com/repos/{owner}/{repo_name}/contents/{path}"
     for attempt in range(1, 4):
-        r = requests.put(url, headers=headers, json=payload)
+        r = _api("put", url, headers=headers, json=payload)
         if r.status_code in (200, 201):
             return r.json()
         if r.status_code >= 500 or r.status_code == 429:
@@ -164,7 +184,13 @@ def push_files(
     Files must be dicts with keys:
       - path: str
       - content: str
-      - encoding: optional, 'utf-8' (default) or 'base64' or 'url'
+      - encoding: optional, 'utf-8' (default) or 'base64' or 'url', or 'blob'
+        with `blob` (SHA-256 in services.blob_store) and `git_sha` instead of content
+
+    Files whose git blob SHA matches what the repo already has at that path
+    are not uploaded again; store blobs are read from the store only when an
+    upload is needed. The repo is always asked (a local record of earlier
+    pushes would not notice a recreated repo or an overwritten path).
 
     Returns a list of simplified result dicts per file: {path, url, sha}.
     """
@@ -179,11 +205,14 @@ def push_files(
     for f in files:
         path = f["path"]
         enc = f.get("encoding", "utf-8")
-        if enc == "base64":
-            # Clean base64 content: remove whitespace/newlines that could cause 422 errors
-            content_b64 = f["content"]
-            if isinstance(content_b64, str):
-                content_b64 = ''.join(content_b64.split())  # Remove ALL whitespace
+        local_sha = None
+        content_b64 = None
+        if enc == "blob":
+            local_sha = f.get("git_sha")
+        elif enc == "base64":
+            # parse_attachments already strips whitespace (which causes 422 errors);
+            # clean_base64 returns clean content as is instead of copying it again
+            content_b64 = clean_base64(f["content"])
         elif enc == "url":
             # Download the file from HTTP URL and convert to base64
             http_url = f["content"]
@@ -198,11 +227,21 @@ def push_files(
                 raise ValueError(f"Failed to download remote file {http_url}: {e}")
         else:
             # treat as text
-            content_b64 = base64.b64encode(f["content"].encode("utf-8")).decode("ascii")
+            raw = f["content"].encode("utf-8")
+            local_sha = blob_store.git_blob_sha(raw)
+            content_b64 = base64.b64encode(raw).decode("ascii")
 
         message = f"{commit_message_prefix + ': ' if commit_message_prefix else ''}Round {round} - Add/Update {path}"
 
         sha = _get_file_sha(owner, repo_name, path, token)
+        if sha and sha == local_sha:
+            # Same content is already there; a PUT would only add an empty commit
+            blob_store.note_reused_upload()
+            print(f"[GitHub] ♻️ {path} unchanged in {repo_name}, skipping upload")
+            results.append({"path": path, "url": None, "sha": sha, "reused": True})
+            continue
+        if enc == "blob":
+            content_b64 = base64.b64encode(blob_store.get(f["blob"])).decode("ascii")
         api_res = _put_file(owner, repo_name, path, content_b64, message, token, sha=sha, branch=branch)
         # Normalize response into small dict
         file_info = {
@@ -224,7 +263,7 @@ def get_sha_of_latest_commit(repo_name: str, branch: str = "main") -> str:
     if not token:
         raise RuntimeError("GITHUB_TOKEN not set")
     headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-    r = requests.get(f"https://api.github.com/repos/{owner}/{repo_name}/branches/{branch}", headers=headers)
+    r = _api("get", f"https://api.github.com/repos/{owner}/{repo_name}/branches/{branch}", headers=headers)
     if r.status_code != 200:
         raise Exception(f"Failed to get branch info: {r.status_code}, {r.text}")
     return r.json()["commit"]["sha"]
@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+# Seconds a finished job keeps answering duplicate submissions
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+
+# Only touched from the event loop, so no lock is needed
+_jobs: Dict[Tuple, Dict] = {}
+_failed = 0
+
+
+def job_key(payload: Dict) -> Tuple:
+    """(task, nonce, round, payload hash) identifying one submission."""
+    body = {k: v for k, v in payload.items() if k != "secret"}
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return (payload.get("task"), payload.get("nonce"), payload.get("round"), digest)
+
+
+def _expire() -> None:
+    now = time.time()
+    for key in [k for k, job in _jobs.items() if job["finished"] and now - job["finished"] > JOB_RESULT_TTL]:
+        del _jobs[key]
+
+
+def submit(key: Tuple, ack: Dict, start: Callable[[], Awaitable]) -> Tuple[Dict, bool]:
+    """Start a background job unless the same submission is already known.
+
+    A duplicate of a running job, or of one that finished less than
+    JOB_RESULT_TTL seconds ago, is attached to it instead: nothing new is
+    started and the original ACK is returned. Jobs that raise or return
+    False (the round workers' failure status) are forgotten so a retry runs
+    again. Returns (ack, is_duplicate).
+    """
+    _expire()
+    job = _jobs.get(key)
+    if job:
+        job["duplicates"] += 1
+        return job["ack"], True
+
+    job = {"ack": ack, "status": "running", "started": time.time(), "finished": None, "duplicates": 0}
+    _jobs[key] = job
+
+    def on_done(task: asyncio.Task) -> None:
+        global _failed
+        if task.cancelled() or task.exception() or task.result() is False:
+            _failed += 1
+            _jobs.pop(key, None)
+            return
+        job["status"] = "done"
+        job["finished"] = time.time()
+
+    job["task"] = asyncio.create_task(start())
+    job["task"].add_done_callback(on_done)
+    return ack, False
+
+
+def job_stats() -> Dict:
+    """Running/finished job counts, duplicates absorbed and failed jobs forgotten."""
+    _expire()
+    stats = {"running": 0, "done": 0, "duplicates": 0, "failed": _failed}
+    for job in _jobs.values():
+        stats[job["status"]] += 1
+        stats["duplicates"] += job["duplicates"]
+    return stats
@@ -0,0 +1,187 @@
+import json
+import re
+from typing import Any, Dict, Tuple
+
+# First "{" that opens an object (skips prose and ```json fences before it)
+_START_RE = re.compile(r"\{\s*[\"}]")
+_WS_RE = re.compile(r"[ \t\n\r]*")
+# Run of string characters that need no special handling
+_CHUNK_RE = re.compile(r'[^"\\\x00-\x1f]*')
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_HEX_RE = re.compile(r"[0-9a-fA-F]{4}")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LITERALS = (("true", True), ("false", False), ("null", None))
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+class JSONExtractError(ValueError):
+    """Model output could not be parsed; `pos` is the offset in the full text.
+
+    `truncated` is True when the text ended inside the JSON value, i.e. the
+    output was cut off rather than malformed.
+    """
+
+    def __init__(self, msg: str, text: str, pos: int, truncated: bool = False):
+        self.msg = msg
+        self.text = text
+        self.pos = pos
+        self.truncated = truncated
+        self.lineno = text.count("\n", 0, pos) + 1
+        self.colno = pos - text.rfind("\n", 0, pos)
+        super().__init__(f"{msg}: line {self.lineno} column {self.colno} (char {pos})")
+
+    def context(self, width: int = 100) -> str:
+        return self.text[max(0, self.pos - width):self.pos + width]
+
+
+class _Parser:
+    """Recursive-descent JSON parser that repairs common model mistakes in place."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.n = len(text)
+        self.repairs: Dict[str, int] = {}
+
+    def _repair(self, kind: str) -> None:
+        self.repairs[kind] = self.repairs.get(kind, 0) + 1
+
+    def _fail(self, msg: str, pos: int) -> None:
+        truncated = pos >= self.n
+        raise JSONExtractError("Unexpected end of output" if truncated else msg, self.text, min(pos, self.n), truncated)
+
+    def _ws(self, pos: int) -> int:
+        return _WS_RE.match(self.text, pos).end()
+
+    def value(self, pos: int) -> Tuple[Any, int]:
+        pos = self._ws(pos)
+        if pos >= self.n:
+            self._fail("Expected a value", pos)
+        c = self.text[pos]
+        if c == "{":
+            return self.object(pos + 1)
+        if c == "[":
+            return self.array(pos + 1)
+        if c == '"':
+            return self.string(pos + 1)
+        m = _NUMBER_RE.match(self.text, pos)
+        if m and m.end() > pos:
+            num = m.group()
+            return (float(num) if any(ch in num for ch in ".eE") else int(num)), m.end()
+        for literal, val in _LITERALS:
+            if self.text.startswith(literal, pos):
+                return val, pos + len(literal)
+            if self.n - pos < len(literal) and literal.startswith(self.text[pos:]):
+                self._fail("Truncated literal", self.n)
+        self._fail(f"Unexpected character {c!r}", pos)
+
+    def object(self, pos: int) -> Tuple[Dict, int]:
+        obj = {}
+        pos = self._ws(pos)
+        if pos < self.n and self.text[pos] == "}":
+            return obj, pos + 1
+        while True:
+            if pos >= self.n or self.text[pos] != '"':
+                self._fail("Expected property name", pos)
+            key, pos = self.string(pos + 1)
+            pos = self._ws(pos)
+            if pos >= self.n or self.text[pos] != ":":
+                self._fail("Expected ':'", pos)
+            obj[key], pos = self.value(pos + 1)
+            pos = self._ws(pos)
+            if pos >= self.n:
+                self._fail("Expected ',' or '}'", pos)
+            if self.text[pos] == "}":
+                return obj, pos + 1
+            if self.text[pos] != ",":
+                self._fail("Expected ',' or '}'", pos)
+            pos = self._ws(pos + 1)
+            if pos < self.n and self.text[pos] == "}":
+                self._repair("trailing comma")
+                return obj, pos + 1
+
+    def array(self, pos: int) -> Tuple[list, int]:
+        arr = []
+        pos = self._ws(pos)
+        if pos < self.n and self.text[pos] == "]":
+            return arr, pos + 1
+        while True:
+            item, pos = self.value(pos)
+            arr.append(item)
+            pos = self._ws(pos)
+            if pos >= self.n:
+                self._fail("Expected ',' or ']'", pos)
+            if self.text[pos] == "]":
+                return arr, pos + 1
+            if self.text[pos] != ",":
+                self._fail("Expected ',' or ']'", pos)
+            pos = self._ws(pos + 1)
+            if pos < self.n and self.text[pos] == "]":
+                self._repair("trailing comma")
+                return arr, pos + 1
+
+    def string(self, pos: int) -> Tuple[str, int]:
+        text, chunks = self.text, []
+        while True:
+            m = _CHUNK_RE.match(text, pos)
+            chunks.append(m.group())
+            pos = m.end()
+            if pos >= self.n:
+                self._fail("Unterminated string", pos)
+            c = text[pos]
+            if c == '"':
+                # A quote only closes the string when JSON structure follows it
+                after = self._ws(pos + 1)
+                if after >= self.n or text[after] in ",:}]":
+                    return "".join(chunks), pos + 1
+                self._repair("unescaped quote")
+                chunks.append('"')
+                pos += 1
+            elif c == "\\":
+                esc = text[pos + 1:pos + 2]
+                if esc in _ESCAPES:
+                    chunks.append(_ESCAPES[esc])
+                    pos += 2
+                elif esc == "u" and _HEX_RE.match(text, pos + 2):
+                    code = int(text[pos + 2:pos + 6], 16)
+                    pos += 6
+                    if 0xD800 <= code <= 0xDBFF and text.startswith("\\u", pos) and _HEX_RE.match(text, pos + 2):
+                        low = int(text[pos + 2:pos + 6], 16)
+                        if 0xDC00 <= low <= 0xDFFF:
+                            code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                            pos += 6
+                    chunks.append(chr(code))
+                elif pos + 6 > self.n and (esc == "" or esc == "u"):
+                    self._fail("Truncated escape", self.n)
+                else:
+                    # e.g. a regex "\d" or Windows path: keep the backslash literally
+                    self._repair("invalid escape")
+                    chunks.append("\\")
+                    pos += 1
+            else:
+                self._repair("raw control character")
+                chunks.append(c)
+                pos += 1
+
+
+def extract_json(text: str) -> Tuple[Any, Dict[str, int]]:
+    """Locate and parse the first JSON object in model output.
+
+    Surrounding prose and markdown fences are skipped. Well-formed JSON is
+    decoded by the C decoder in one pass; otherwise a tolerant parser repairs
+    invalid escapes, raw newlines, unescaped quotes and trailing commas as it
+    scans. Returns (value, repairs) where repairs counts each kind of fix.
+    Raises JSONExtractError with the exact offset when the text cannot be
+    parsed.
+    """
+    m = _START_RE.search(text)
+    if not m:
+        raise JSONExtractError("No JSON object found", text, 0, truncated=text.lstrip().startswith(("{", "```")))
+    start = m.start()
+    try:
+        return _decoder.raw_decode(text, start)[0], {}
+    except json.JSONDecodeError:
+        pass
+    parser = _Parser(text)
+    value, _end = parser.object(start + 1)
+    return value, parser.repairs
@@ -1,36 +1,62 @@
 import os
 import json
-import requests
+import time
 from typing import Dict, List
-from pathlib import Path
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from services.checks import cross_reference_issues, evaluate_checks, failed_checks
+from services.batch import active_batch
+from services.budget import BUDGET_FALLBACK_PROVIDER, admit, release
+from services.context_store import load_context, save_context
+from services.json_extract import JSONExtractError, extract_json
+from services.llm_providers import complete, configured_providers, preferred_provider
+from services.metrics import current_task, task_usage
+from services.patching import apply_edits
+from services.similarity import find_similar, index_brief
+from services.prompt_budget import count_tokens, fit_files, log_breakdown
+from services.prompt_modules import build_system_prompt, select_modules
+from services.review_targets import artifact_index, find_suspicious, review_shards
+from services.routing import ROUTER_FAST_PROVIDER, choose_tier, complexity, record_decision
+from services.templates import BASE_CSS_PATH, TEMPLATE_PROMPT, apply_templates
 
 load_dotenv()
 
 AIPIPE_API_KEY = os.getenv("AIPIPE_API_KEY")
 AIPIPE_MODEL = os.getenv("AIPIPE_MODEL")
 SKIP_LLM = os.getenv("SKIP_LLM") == "1"
-
-def _get_context_dir() -> Path:
-  """Get directory for storing LLM context between rounds"""
-  context_dir = Path(__file__).resolve().parents[2] / "data" / "llm_context"
-  context_dir.mkdir(parents=True, exist_ok=True)
-  return context_dir
-
-def _save_round_context(task: str, nonce: str, round_num: int, files: List[Dict], prompt: str, response: str):
+# Targeted fix passes to run when checks fail locally (0 disables the loop)
+CHECK_FIX_ROUNDS = int(os.getenv("CHECK_FIX_ROUNDS", "1"))
+# Render README.md and base.css locally instead of having the model write them
+TEMPLATE_FAST_PATH = os.getenv("TEMPLATE_FAST_PATH", "1") == "1"
+# Round 1 two-phase mode: short planning call, then one concurrent call per file
+PARALLEL_GENERATION = os.getenv("PARALLEL_GENERATION", "0") == "1"
+# Most concurrent LLM calls one task makes for per-file generation and review shards
+LLM_FANOUT = int(os.getenv("LLM_FANOUT", "4"))
+# Round 2 output mode: "patch" (edit blocks applied locally) or "full" (complete files)
+ROUND2_MODE = os.getenv("ROUND2_MODE", "patch").lower()
+# Review pass: "targeted" (artifact index + suspicious regions, edit blocks, one call per file)
+# or "full" (every file resent and returned in full)
+REVIEW_MODE = os.getenv("REVIEW_MODE", "targeted").lower()
+# Round 1 tasks at least this similar (estimated Jaccard of brief+checks shingles) to
+# a past success start from its files in modify mode (0 disables warm starts)
+WARM_START_THRESHOLD = float(os.getenv("WARM_START_THRESHOLD", "0.85"))
+# Token budget for the whole prompt; previous-round code is shrunk to fit
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "48000"))
+# Speculative generation: full-output candidates generated concurrently, best local score wins (1 disables)
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+# Temperatures cycled over the candidates (providers are cycled too)
+SPECULATIVE_TEMPERATURES = [float(t) for t in os.getenv("SPECULATIVE_TEMPERATURES", "0.2,0.7,1.0").split(",") if t.strip()]
+# Prompt tokens all candidates together may send; fewer candidates are launched for long prompts
+SPECULATIVE_TOKEN_BUDGET = int(os.getenv("SPECULATIVE_TOKEN_BUDGET", "60000"))
+# Local score (0-1) at which a candidate is taken without waiting for the others
+SPECULATIVE_ACCEPT_SCORE = float(os.getenv("SPECULATIVE_ACCEPT_SCORE", "1.0"))
+
+def _save_round_context(task: str, nonce: str, round_num: int, files: List[Dict], prompt: str, response: str, prefix: str = ""):
   """Save LLM context for future rounds"""
   try:
-    context_file = _get_context_dir() / f"{task}_{nonce}_round{round_num}.json"
-    context = {
-      "task": task,
-      "nonce": nonce,
-      "round": round_num,
-      "files": files,
-      "prompt": prompt,
-      "response": response
-    }
-    context_file.write_text(json.dumps(context, indent=2))
-    print(f"[LLM] Saved context to {context_file.name}")
+    # The system prompt is stored once and shared by every saved context that used the same modules
+    save_context(task, nonce, round_num, files, prompt, response, prefix=prefix)
   except Exception as e:
     print(f"[LLM] Warning: Failed to save context: {e}")
 
@@ -38,9 +64,8 @@ def _load_previous_context(task: str, nonce: str, round_num: int) -> Dict:
   """Load context from previous round"""
   try:
     prev_round = round_num - 1
-    context_file = _get_context_dir() / f"{task}_{nonce}_round{prev_round}.json"
-    if context_file.exists():
-      context = json.loads(context_file.read_text())
+    context = load_context(task, nonce, prev_round)
+    if context:
       print(f"[LLM] Loaded previous context from round {prev_round}")
       return context
   except Exception as e:
@@ -96,464 +121,163 @@ document.getElementById('app').innerHTML = '<div class=\"alert alert-info\">Mock
     ]
   }
 
-# SYSTEM PROMPT - Edit this to fine-tune LLM behavior
-SYSTEM_PROMPT = """
-You are an elite full-stack developer specializing in creating production-ready web applications.
-
-## YOUR MISSION
-Create COMPLETE, FULLY FUNCTIONAL web apps that users can actually use. Not demos. Not prototypes. REAL apps.
-
-## CORE PRINCIPLES
-1. **QUALITY OVER SPEED**: Write clean, well-structured, maintainable code
-2. **USER EXPERIENCE FIRST**: Beautiful UI, smooth interactions, responsive design
-3. **DATA-DRIVEN**: Actually parse and use ALL provided data - never hardcode sample data
-4. **ERROR-PROOF**: Handle edge cases, loading states, empty data, fetch failures
-5. **PRODUCTION-READY**: Code should work perfectly on first deployment
-
-## TECHNICAL REQUIREMENTS
-
-### File Structure (ALWAYS include these 4 files):
-1. **index.html** - Semantic HTML5, proper meta tags, accessible
-2. **style.css** - Modern CSS, responsive, organized by sections
-3. **script.js** - Clean JavaScript, async/await, proper error handling
-4. **README.md** - Professional documentation (Summary, Setup, Usage, Code Explanation, License)
-
-### HTML Standards:
-- Use semantic tags: <header>, <main>, <section>, <article>, <footer>
-- Include proper meta tags: viewport, charset, description
-- Accessibility: alt text, ARIA labels, keyboard navigation
-- Load external resources from CDN (Bootstrap 5.3, Chart.js 4.4, etc.)
-
-### CSS Standards:
-- Modern layout: Flexbox or Grid
-- Smooth transitions and animations
-- Consistent spacing and typography
-- Dark mode support when appropriate
-- Do not use CSS libraries like Bootstrap or Tailwind unless explicitly requested
-- This is the bootstrap css imports if needed:
-```html
-<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-sRIl4kxILFvY47J16cr9ZwB07vP4J8+LH7qKQnuqkuIAvNWLzeN8tE5YBujZqJLB" crossorigin="anonymous">
-<script src="https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist/umd/popper.min.js" integrity="sha384-I7E8VVD/ismYTF4hNIPjVp/Zjvgyol6VFvRkX/vR+Vc4jQkC+hVqc2pM8ODewa9r" crossorigin="anonymous"></script>
-<script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/js/bootstrap.min.js" integrity="sha384-G/EV+4j2dNv+tEPo3++6LCgdCROaejBqfUeNjuKAiuXbjrxilcCdDz6ZAVfHWe1Y" crossorigin="anonymous"></script>
-```
-- This is chart js import if needed:
-```html
-<script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-```
-
-## ⚠️ YOUR RESPONSIBILITY: DELIVER WORKING CODE
-
-**You are generating production code that will be deployed immediately.**
-**Zero tolerance for:**
-- Syntax errors
-- Undefined variables/functions
-- Missing null checks on DOM elements
-- Broken event listeners
-- Non-existent element IDs referenced in JavaScript
-- Vague error messages that don't help users
-- Code that crashes instead of failing gracefully
-
-**Before generating ANY code, verify:**
-1. Every `getElementById()` in JS has matching `id=""` in HTML
-2. Every function called is defined
-3. Every library used is included via `<script>` tag
-4. Every DOM manipulation has null check
-5. Every error has a helpful, specific message
-6. Code fails gracefully with user-friendly messages
-
-**If you generate broken code, the user gets a broken website. TAKE RESPONSIBILITY.**
-
-### CRITICAL STYLING RULES (MUST FOLLOW):
-
-**Layout & Spacing:**
-- Use proper containers: max-width: 1200px with padding
-- Consistent spacing: use rem units (1rem, 1.5rem, 2rem, 3rem)
-- Breathing room: Don't cram elements together
-- Grid layouts: Use CSS Grid or Bootstrap grid system properly
-
-**Charts & Visualizations:**
-- Chart containers: Set reasonable dimensions (max-width: 600px, max-height: 400px)
-- Responsive charts: Use `maintainAspectRatio: true` and `responsive: true`
-- Chart positioning: Center charts, don't let them take full width
-- Multiple charts: Use grid layout with proper gaps
-
-**Colors & Backgrounds:**
-- Use modern color schemes (NOT plain white backgrounds)
-- Gradients: Subtle, professional (e.g., `linear-gradient(135deg, #667eea 0%, #764ba2 100%)`)
-- Cards: Use shadows, borders, or subtle backgrounds to separate content
-- Text contrast: Ensure readable text on all backgrounds
-- Color palette: Define 3-5 main colors and use consistently
-
-**Typography:**
-- Font sizes: Base 16px, headings 1.5-3rem, body 1rem
-- Line height: 1.6 for body text
-- Font family: Use modern sans-serif (system fonts or Google Fonts)
-- Hierarchy: Clear difference between h1, h2, h3, body text
-
-**Components:**
-- Cards: Add padding (1.5-2rem), border-radius (8-12px), box-shadow
-- Buttons: Proper padding, hover states, focus states
-- Tables: Striped rows, hover effects, proper spacing
-- Forms: Clear labels, input styling, validation states
-
-**Animations & Transitions:**
-- Smooth transitions: Use `transition: all 0.3s ease`
-- Hover effects: Scale, shadow, color changes
-- Loading states: Spinners or skeleton screens
-- Page load: Fade-in animations for content
-
-**DO NOT:**
-- ❌ Let charts occupy 100% width/height without constraints
-- ❌ Use plain white background with no styling
-- ❌ Cram multiple elements without spacing
-- ❌ Use default browser styles (style everything!)
-- ❌ Make tiny text or huge headings
-- ❌ Forget mobile responsive breakpoints
-
-### JavaScript Standards:
-- Use modern ES6+: async/await, arrow functions, destructuring
-- Proper error handling with try/catch
-- Loading states: show spinners/messages while fetching
-- Data validation: check for null/undefined/empty
-- Event delegation for better performance
-- Comments for complex logic
-
-## ATTACHMENT HANDLING (CRITICAL!)
-
-### Files Location:
-All attachment files are in the SAME directory as index.html on GitHub Pages.
-
-### Fetching Data:
-```javascript
-// ✅ CORRECT - Relative path
-const response = await fetch('data.csv');
-const text = await response.text();
-
-// ❌ WRONG - Don't hardcode or use data URIs
-const data = [/* hardcoded */];
-```
-
-### CSV Parsing:
-```javascript
-// ✅ CORRECT - Parse ALL rows properly
-const rows = text.trim().split('\\n');
-const headers = rows[0].split(',');
-const data = rows.slice(1).map(row => {
-    const values = row.split(',');
-    return headers.reduce((obj, header, i) => {
-        obj[header.trim()] = values[i]?.trim();
-        return obj;
-    }, {});
-});
-
-// ❌ WRONG - Don't limit rows arbitrarily
-const data = rows.slice(0, 3); // Only 3 rows? NO!
-```
-
-### JSON Handling:
-```javascript
-// ✅ CORRECT
-const response = await fetch('config.json');
-const config = await response.json();
-// Use ALL data from config
-```
-
-### Image Display:
-```html
-<!-- ✅ CORRECT - Relative path -->
-<img src="user.png" alt="User Profile" class="profile-img">
-
-<!-- ❌ WRONG - Don't use data URIs -->
-<img src="data:image/png;base64,...">
-```
-
-### Error Handling:
-```javascript
-// ✅ ALWAYS handle errors
-try {
-    const response = await fetch('data.csv');
-    if (!response.ok) throw new Error('Failed to load data');
-    const text = await response.text();
-    // Process data...
-} catch (error) {
-    console.error('Error loading data:', error);
-    document.getElementById('error-message').textContent = 
-        'Failed to load data. Please refresh the page.';
-}
-```
-
-## DEFENSIVE CODING (CRITICAL!)
 
-### ⚠️ ALWAYS Check Elements Exist Before Using Them!
-
-```javascript
-// ❌ WRONG - Will crash if element doesn't exist
-document.getElementById('total-hours').textContent = '42';
-
-// ✅ CORRECT - Safe with null check
-const totalHoursEl = document.getElementById('total-hours');
-if (totalHoursEl) {
-    totalHoursEl.textContent = '42';
-} else {
-    console.error('Element #total-hours not found');
+# Output instructions for Round 2 patch mode (replaces the full-file reminder)
+ROUND2_PATCH_PROMPT = """⚠️ ROUND 2 OUTPUT FORMAT (OVERRIDES THE FILES FORMAT ABOVE):
+Do NOT return complete files that already exist. Return ONLY edit blocks for the parts you change:
+{
+  "edits": [
+    {"path": "script.js", "search": "<exact lines copied from the previous file>", "replace": "<new lines>"}
+  ],
+  "files": [
+    {"path": "new-file.js", "content": "<complete content, ONLY for files that did not exist before>"}
+  ]
 }
 
-// ✅ EVEN BETTER - Use optional chaining
-document.getElementById('total-hours')?.textContent = '42';
-```
+RULES:
+1. "search" must be copied VERBATIM from the previous code, including indentation
+2. Include 2-3 unchanged lines of context so "search" matches exactly ONE place in the file
+3. Use several small edits rather than one huge one; never repeat a whole file in "search"
+4. To delete code, use an empty "replace"
+5. Update the <!-- Generated: TIMESTAMP --> comment in index.html with an edit
+6. Return ONLY this JSON - NO markdown code fences, NO extra text
 
-### Event Listeners Must Be Safe
+Generate the edits as JSON now:"""
 
-```javascript
-// ❌ WRONG - Crashes if button doesn't exist
-document.getElementById('theme-toggle').addEventListener('click', toggleTheme);
 
-// ✅ CORRECT - Check existence first
-const themeToggle = document.getElementById('theme-toggle');
-if (themeToggle) {
-    themeToggle.addEventListener('click', () => {
-        document.body.classList.toggle('dark-mode');
-        // Save preference
-        localStorage.setItem('theme', document.body.classList.contains('dark-mode') ? 'dark' : 'light');
-    });
-}
-```
-
-### DOM Queries in Functions
-
-```javascript
-// ✅ ALWAYS validate before using
-function updateChart(data) {
-    const canvas = document.getElementById('chart');
-    if (!canvas) {
-        console.error('Chart canvas not found');
-        return; // Exit early
-    }
-    // Now safe to use canvas
-    new Chart(canvas.getContext('2d'), { ... });
-}
-```
+# Static review instructions (sent as the cacheable instructions prefix)
+REVIEW_PROMPT = """You are a senior code reviewer. Review the web app code you are given and fix ANY bugs or issues.
 
-### Array/Object Safety
+YOUR TASK:
+1. Review ALL the code carefully
+2. Check for common bugs:
+   - Buttons that don't work (missing event listeners, wrong IDs)
+   - Timer/interval issues (not clearing properly, multiple intervals)
+   - DOM elements accessed before they exist
+   - Functions called before they're defined
+   - Missing null checks on getElementById
+   - Event listeners not wrapped in DOMContentLoaded
+3. Fix ALL bugs you find, failing checks (when listed) first
+4. Return the COMPLETE corrected code
 
-```javascript
-// ✅ Check data exists before using
-if (data && Array.isArray(data) && data.length > 0) {
-    data.forEach(item => { /* process */ });
-} else {
-    console.warn('No data available');
-    showEmptyState();
-}
-```
-
-## CODE QUALITY ENFORCEMENT ⚠️
-
-### YOU ARE RESPONSIBLE FOR WORKING CODE!
-
-**NEVER generate code that:**
-- References DOM elements without checking they exist
-- Has undefined variable references
-- Uses functions/libraries that aren't included in the HTML
-- Contains syntax errors or typos
-- Has logic errors that cause crashes
-
-### Validation Checklist (Review Before Responding):
-
-1. **✅ All element IDs used in JS exist in HTML**
-   ```javascript
-   // If script.js has: document.getElementById('my-button')
-   // Then index.html MUST have: <button id="my-button">
-   ```
-
-2. **✅ All external libraries are loaded**
-   ```html
-   <!-- If using Chart.js, MUST include: -->
-   <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-   ```
-
-3. **✅ Every DOM query has null check**
-   ```javascript
-   // EVERY single getElementById/querySelector needs:
-   const el = document.getElementById('something');
-   if (!el) return; // or handle gracefully
-   ```
-
-4. **✅ Error messages are helpful**
-   ```javascript
-   // ❌ BAD: Generic/useless errors
-   catch(e) { console.log('error'); }
-   
-   // ✅ GOOD: Specific, actionable errors
-   catch(e) { 
-       console.error('Failed to load expenses.csv:', e.message);
-       alert('Could not load expense data. Please check that expenses.csv exists.');
-   }
-   ```
-
-5. **✅ All variables are defined before use**
-   ```javascript
-   // Check: No undefined variables, all functions exist
-   ```
-
-### Test Your Code Mentally:
-
-Before generating the response, **mentally walk through**:
-- What happens if data file is missing? ✅ Shows error message
-- What if user clicks button before data loads? ✅ Button disabled or checked
-- What if CSV is malformed? ✅ try/catch with helpful error
-- What if element ID doesn't exist? ✅ Null check prevents crash
-
-## UI/UX REQUIREMENTS
-
-### Must Have:
-- ✅ Loading states (spinners/messages while data loads)
-- ✅ Error messages (if data fails to load)
-- ✅ Empty states (if no data available)
-- ✅ Smooth animations (fade-in, slide, etc.)
-- ✅ Hover effects on interactive elements
-- ✅ Mobile responsive (test at 320px, 768px, 1024px widths)
-- ✅ Fast load time (optimize images, minimize code)
-
-### Bootstrap 5 Usage:
-- Use cards, modals, alerts, badges effectively
-- Responsive grid system (container, row, col)
-- Utility classes for spacing (mt-3, p-4, etc.)
-- Color system (primary, success, danger, etc.)
-
-### Charts (if needed):
-- Use Chart.js 4.4 from CDN
-- Responsive charts (maintainAspectRatio: true)
-- Proper colors and labels
-- Interactive tooltips
-- Legend positioning
-
-## ROUND BEHAVIOR
-
-### Round 1 (New Project):
-- Create all 4 required files from scratch
-- Implement complete functionality
-- Fetch and display ALL data from attachments
-- Ensure all checks pass
-
-### Round 2+ (Modifications):
-⚠️ **CRITICAL: DO NOT REWRITE EVERYTHING!** ⚠️
-
-**Your job in Round 2 is to make MINIMAL TARGETED CHANGES:**
-
-1. **PRESERVE existing good code** - Don't touch what's already working
-2. **Only modify** the specific parts mentioned in the feedback/checks
-3. **Keep the same styling** unless specifically asked to change it
-4. **Don't rewrite functions** that are already working
-5. **Add new features** without removing old ones
-
-**Example - If feedback says "Fix chart labels":**
-- ✅ GOOD: Only change the chart labels configuration
-- ❌ BAD: Rewrite entire HTML, CSS, and chart code
-
-**Example - If feedback says "Add dark mode toggle":**
-- ✅ GOOD: Add toggle button and CSS variables, keep everything else
-- ❌ BAD: Completely redesign the whole UI
-
-**How to approach Round 2:**
-1. Look at the previous files you generated
-2. Identify the SPECIFIC issue to fix
-3. Make the SMALLEST change that fixes it
-4. Return the COMPLETE files but with MINIMAL edits
-
-**Remember:** If Round 1 code was good, keep it! Only fix what's broken or add what's requested.
-
-Load previous context (automatically provided)
-Modify ONLY necessary files
-Preserve existing functionality
-Add new features without breaking old ones
-Update README with new features
-
-## OUTPUT FORMAT
-
-⚠️ **CRITICAL: YOU MUST RETURN EXACTLY THIS JSON STRUCTURE - NO EXCEPTIONS!** ⚠️
-
-Your response MUST be a JSON object with a "files" array. Each file has "path" and "content".
-
-**MANDATORY STRUCTURE:**
-```json
+⚠️ CRITICAL: Return ONLY valid JSON with this exact structure:
 {
   "files": [
-    {"path": "index.html", "content": "<!DOCTYPE html>..."},
-    {"path": "style.css", "content": "/* Styles */..."},
-    {"path": "script.js", "content": "// JavaScript..."},
-    {"path": "README.md", "content": "# Project Title..."}
+    {"path": "index.html", "content": "...full corrected HTML..."},
+    {"path": "style.css", "content": "...full corrected CSS..."},
+    {"path": "script.js", "content": "...full corrected JS..."},
+    {"path": "README.md", "content": "...full corrected README..."}
   ]
 }
-```
-
-**IMPORTANT RULES:**
-1. ✅ The top-level object MUST have exactly ONE key: "files"
-2. ✅ "files" MUST be an array of file objects
-3. ✅ Each file object MUST have "path" (string) and "content" (string)
-4. ✅ Return ONLY this JSON - NO markdown code fences, NO extra text
-5. ⚠️ If the task asks you to create files like "data.json" with specific content, that content goes INSIDE the "content" field, NOT as a top-level key!
-6. ⚠️ **CRITICAL: Escape all backslashes, quotes, and special characters properly in JSON strings!**
-   - Use \\\\ for backslash
-   - Use \\" for quotes inside strings
-   - Use \\n for newlines, \\t for tabs
-   - ALL string content must be valid JSON-escaped
-
-**EXAMPLE - If asked to create a JSON file:**
-If the brief says "Create dilemma.json with people, case_1, case_2 fields":
-
-❌ WRONG (Don't return the JSON structure directly):
-```json
-{
-  "people": [...],
-  "case_1": {...},
-  "case_2": {...}
-}
-```
 
-✅ CORRECT (Wrap it in the files array):
-```json
+If no bugs found, return the code as-is. If bugs found, fix them and return corrected code.
+DO NOT add explanations, just return the JSON."""
+
+
+# Static instructions for the targeted review (one file, flagged regions only)
+REVIEW_EDIT_PROMPT = """You are a senior code reviewer. Local analysis flagged problems in ONE file of a static web app.
+You get an index of the whole app (what every file defines and references), the findings,
+and ONLY the flagged regions of the file under review, with their line numbers.
+
+YOUR TASK:
+1. Fix every real finding, failing checks first
+2. Also fix other bugs you see in the regions shown:
+   - Buttons that don't work (missing event listeners, wrong IDs)
+   - Timer/interval issues (not clearing properly, multiple intervals)
+   - DOM elements accessed before they exist
+   - Missing null checks on getElementById
+3. Keep ids, classes, function names and file names consistent with the index
+4. Do not touch anything else: the rest of the file is not shown and stays as it is
+
+⚠️ CRITICAL: Return ONLY valid JSON with this exact structure:
 {
-  "files": [
-    {
-      "path": "dilemma.json",
-      "content": "{\"people\": [...], \"case_1\": {...}, \"case_2\": {...}}"
-    },
-    {
-      "path": "index.html",
-      "content": "<!DOCTYPE html>..."
-    }
+  "edits": [
+    {"path": "script.js", "search": "<exact lines copied from a region shown>", "replace": "<new lines>"}
   ]
 }
-```
-
-**In index.html, add this EXACT comment at the top of <body> tag:**
-<!-- Generated: TIMESTAMP -->
-Replace TIMESTAMP with current Unix timestamp (e.g., 1234567890). This helps verify deployments.
-
-## QUALITY CHECKLIST (Verify before returning):
-- [ ] All attachment files are fetched (not hardcoded)
-- [ ] ALL data rows are parsed and displayed (no arbitrary limits)
-- [ ] Loading states show while fetching
-- [ ] Error handling catches fetch failures
-- [ ] Mobile responsive (works on small screens)
-- [ ] Images display correctly with proper paths
-- [ ] All checks from the brief are satisfied
-- [ ] Code is clean, commented, and maintainable
-- [ ] README is complete and helpful
-- [ ] No LICENSE file generated (already exists)
-
-## REMEMBER:
-You are creating apps that REAL USERS will use. Make them proud. Make them beautiful. Make them work perfectly.
-"""
+
+RULES:
+- "search" must be copied EXACTLY from a region (no line numbers) and must be unique in the file
+- Only edit the file under review
+- Keep edits small: the changed lines plus a line or two of context
+- If a finding is a false alarm skip it; if nothing needs to change return {"edits": []}
+DO NOT add explanations, just return the JSON."""
 
 
-def _review_and_fix_code(files: List[Dict], brief: str, checks: List[str]) -> List[Dict]:
+def _targeted_review(files: List[Dict], brief: str, checks: List[str], failed: List[Dict] = None, extra_paths: List[str] = None) -> List[Dict]:
+  """Review only what local analysis flags.
+  
+  Each file with findings gets its own concurrent call with the artifact index
+  and its flagged regions; the returned edit blocks are applied locally. A file
+  whose edits do not apply is kept unchanged.
+  """
+  findings = find_suspicious(files, failed, extra_paths)
+  if not findings:
+    print(f"[LLM REVIEW] ✅ Nothing suspicious found, skipping the review call")
+    return files
+  
+  index = artifact_index(files)
+  shards = review_shards(files, findings)
+  checks_text = "\n".join(f"{i+1}. {check}" for i, check in enumerate(checks))
+  sent = sum(b - a + 1 for shard in shards for a, b, _text in shard["regions"])
+  total = sum((f.get("content") or "").count("\n") + 1 for f in files)
+  print(f"[LLM REVIEW] {len(findings)} finding(s) in {len(shards)} file(s), sending {sent} of {total} lines")
+  
+  def review_one(shard: Dict) -> List[Dict]:
+    path = shard["path"]
+    findings_text = "\n".join(f"- line {f['line'] + 1}: {f['detail']}" for f in shard["findings"])
+    regions = "".join(f"\n### {path} lines {a}-{b}\n```\n{text}\n```\n" for a, b, text in shard["regions"])
+    prompt = f"""ORIGINAL TASK: {brief}
+
+REQUIRED CHECKS:
+{checks_text}
+
+APP INDEX (every file):
+{index}
+
+FILE UNDER REVIEW: {path}
+
+FINDINGS:
+{findings_text}
+
+FLAGGED REGIONS OF {path} (the rest of the file is not shown):
+{regions}
+Return the edit blocks as JSON now:"""
+    return _call_llm(prompt, validate=_parse_files_json, instructions=REVIEW_EDIT_PROMPT)["parsed"].get("edits", [])
+  
+  with ThreadPoolExecutor(max_workers=max(min(len(shards), LLM_FANOUT), 1)) as pool:
+    futures = [pool.submit(copy_context().run, review_one, shard) for shard in shards]
+  
+  applied = 0
+  for shard, future in zip(shards, futures):
+    path = shard["path"]
+    try:
+      edits = [e for e in future.result() if e.get("path") == path]
+    except Exception as e:
+      print(f"[LLM REVIEW] ⚠️ Review of {path} failed: {e}, keeping it unchanged")
+      continue
+    updated, bad = apply_edits(files, edits)
+    if bad:
+      print(f"[LLM REVIEW] ⚠️ Edits for {path} did not apply, keeping it unchanged")
+      continue
+    files = updated
+    applied += len(edits)
+  print(f"[LLM REVIEW] ✅ Review completed, {applied} edit(s) applied")
+  return files
+
+
+def _review_and_fix_code(files: List[Dict], brief: str, checks: List[str], failed: List[Dict] = None, extra_paths: List[str] = None) -> List[Dict]:
   """
   Review generated code and fix common bugs.
   This is a second LLM pass to catch issues like broken event listeners, timer bugs, etc.
+  When `failed` check results are given, the pass focuses on fixing those checks.
+  `extra_paths` are files that exist besides the generated ones (attachments, templates).
   """
   print(f"\n[LLM REVIEW] Starting code review pass...")
   
+  if REVIEW_MODE == "targeted":
+    return _targeted_review(files, brief, checks, failed, extra_paths)
+  
   # Build review prompt with the generated code
   files_summary = ""
   for f in files:
@@ -561,81 +285,25 @@ def _review_and_fix_code(files: List[Dict], brief: str, checks: List[str]) -> Li
     content = f.get('content', '')
     files_summary += f"\n### File: {path}\n```\n{content}\n```\n\n"
   
-  review_prompt = f"""You are a senior code reviewer. Review the following web app code and fix ANY bugs or issues.
-
-ORIGINAL TASK: {brief}
+  failed_info = ""
+  if failed:
+    failed_info = "\nFAILING CHECKS (verified against the generated HTML - fix these first):\n"
+    failed_info += "\n".join(f"- {r['check']} -> {r['detail']}" for r in failed) + "\n"
+  
+  review_prompt = f"""ORIGINAL TASK: {brief}
 
 REQUIRED CHECKS:
 {chr(10).join(f"{i+1}. {check}" for i, check in enumerate(checks))}
-
+{failed_info}
 GENERATED CODE:
 {files_summary}
 
-YOUR TASK:
-1. Review ALL the code carefully
-2. Check for common bugs:
-   - Buttons that don't work (missing event listeners, wrong IDs)
-   - Timer/interval issues (not clearing properly, multiple intervals)
-   - DOM elements accessed before they exist
-   - Functions called before they're defined
-   - Missing null checks on getElementById
-   - Event listeners not wrapped in DOMContentLoaded
-3. Fix ALL bugs you find
-4. Return the COMPLETE corrected code
-
-⚠️ CRITICAL: Return ONLY valid JSON with this exact structure:
-{{
-  "files": [
-    {{"path": "index.html", "content": "...full corrected HTML..."}},
-    {{"path": "style.css", "content": "...full corrected CSS..."}},
-    {{"path": "script.js", "content": "...full corrected JS..."}},
-    {{"path": "README.md", "content": "...full corrected README..."}}
-  ]
-}}
-
-If no bugs found, return the code as-is. If bugs found, fix them and return corrected code.
-DO NOT add explanations, just return the JSON."""
+Return the reviewed code as JSON now:"""
 
   try:
-    response = requests.post(
-      "https://aipipe.org/openai/v1/responses",
-      headers={"Authorization": f"Bearer {AIPIPE_API_KEY}", "Content-Type": "application/json"},
-      json={"model": AIPIPE_MODEL, "input": review_prompt},
-      timeout=300
-    )
-    response.raise_for_status()
-    data = response.json()
-    
-    text = data["output"][0]["content"][0]["text"]
-    print(f"[LLM REVIEW] Got {len(text)} chars")
-    
-    # Parse the review response
-    if "```" in text:
-      parts = text.split("```")
-      for part in parts:
-        if part.strip().startswith("json"):
-          text = part[4:].strip()
-          break
-        elif part.strip() and part.strip()[0] == "{":
-          text = part.strip()
-          break
-    
-    start = text.find("{")
-    end = text.rfind("}") + 1
-    
-    if start == -1 or end == 0:
-      print(f"[LLM REVIEW] ⚠️ No JSON in review response, keeping original")
-      return files
-    
-    json_str = text[start:end]
-    
-    # Parse with escape fixing
-    try:
-      reviewed = json.loads(json_str)
-    except json.JSONDecodeError:
-      import re
-      fixed_json = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
-      reviewed = json.loads(fixed_json)
+    response = _call_llm(review_prompt, validate=_parse_files_json, instructions=REVIEW_PROMPT)
+    print(f"[LLM REVIEW] Got {len(response['text'])} chars")
+    reviewed = response["parsed"]
     
     if "files" in reviewed:
       print(f"[LLM REVIEW] ✅ Review completed, returning {len(reviewed['files'])} files")
@@ -649,30 +317,320 @@ DO NOT add explanations, just return the JSON."""
     return files
 
 
+def _fix_failed_checks(files: List[Dict], brief: str, checks: List[str], extra_paths: List[str] = None) -> List[Dict]:
+  """Evaluate checks against the generated files and run targeted fix passes before pushing"""
+  for attempt in range(CHECK_FIX_ROUNDS + 1):
+    results = evaluate_checks(files, checks)
+    failed = failed_checks(results)
+    counts = {}
+    for r in results:
+      counts[r["status"]] = counts.get(r["status"], 0) + 1
+    print(f"[LLM CHECKS] {counts}")
+    for r in failed:
+      print(f"[LLM CHECKS] ❌ {r['check']} -> {r['detail']}")
+    if not failed or attempt == CHECK_FIX_ROUNDS:
+      return files
+    print(f"[LLM CHECKS] Running targeted fix pass {attempt + 1}/{CHECK_FIX_ROUNDS}...")
+    files = _review_and_fix_code(files, brief, checks, failed=failed, extra_paths=extra_paths)
+  return files
+
+
+# Planning prompt for parallel generation: a shared contract every file is written against
+PLAN_PROMPT = """You are planning a static web app that will be written by several developers IN PARALLEL,
+one file each. They cannot see each other's work, so your plan is the ONLY contract between them.
+
+Return ONLY this JSON (no markdown, no extra text):
+{
+  "title": "App title",
+  "files": [
+    {"path": "index.html", "purpose": "..."},
+    {"path": "style.css", "purpose": "..."},
+    {"path": "script.js", "purpose": "..."},
+    {"path": "README.md", "purpose": "..."}
+  ],
+  "element_ids": [{"id": "total-calories", "tag": "span", "purpose": "..."}],
+  "classes": [{"name": "stat-card", "purpose": "..."}],
+  "data": [{"file": "data.csv", "fields": ["date", "calories"], "notes": "..."}],
+  "functions": [{"name": "loadData", "file": "script.js", "purpose": "..."}],
+  "libraries": ["https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"]
+}
+
+RULES:
+- Every element id required by the checks MUST be in element_ids
+- List every id the script needs; index.html will contain exactly these
+- Keep it short: names and one-line purposes only, no code"""
+
+
+def _plan_and_generate(brief: str, checks_info: str, attachment_info: str, attach_paths: List[str], template_info: str = "", instructions: str = "") -> tuple:
+  """Two-phase generation: plan a shared contract, then generate each file concurrently.
+  
+  Returns (result, issues) where issues are cross-file problems for the review pass.
+  """
+  plan_response = _call_llm(
+    f"TASK: {brief}{checks_info}{attachment_info}\n\nReturn the plan as JSON now:",
+    validate=_parse_files_json,
+    instructions=PLAN_PROMPT,
+  )
+  plan = plan_response["parsed"]
+  paths = [f.get("path") for f in plan.get("files", []) if f.get("path")]
+  if template_info:
+    # README.md and base.css are rendered locally
+    paths = [p for p in paths if p not in ("README.md", BASE_CSS_PATH)]
+  if not paths:
+    raise ValueError("Plan has no files")
+  contract = json.dumps(plan, indent=1)
+  print(f"[LLM PLAN] {len(paths)} files, {len(plan.get('element_ids', []))} ids, {len(plan.get('functions', []))} functions")
+  
+  def generate_one(path: str) -> Dict:
+    prompt = f"""ROUND: 1 (Create new files)
+
+TASK: {brief}{checks_info}{attachment_info}
+
+═══════════════════════════════════════════════════════════════
+SHARED CONTRACT (other files are being written against it right now)
+═══════════════════════════════════════════════════════════════
+{contract}
+
+Generate ONLY the file `{path}`. Use EXACTLY the element ids, classes, function names,
+file names and libraries from the contract - do not invent or rename any.
+
+⚠️ REMINDER: Your response MUST be a JSON object: {{"files": [{{"path": "{path}", "content": "..."}}]}}"""
+    parsed = _call_llm(prompt, validate=_parse_files_json, instructions=instructions)["parsed"]
+    for f in parsed.get("files", []):
+      if f.get("path") == path:
+        return f
+    raise ValueError(f"Response for {path} did not contain it")
+  
+  with ThreadPoolExecutor(max_workers=max(min(len(paths), LLM_FANOUT), 1)) as pool:
+    # Each worker runs in a copy of this context so its calls are attributed to the task
+    files = list(pool.map(lambda path: copy_context().run(generate_one, path), paths))
+  
+  required_ids = [e.get("id") for e in plan.get("element_ids", []) if e.get("id")]
+  extra_paths = attach_paths + ([BASE_CSS_PATH] if template_info else [])
+  issues = cross_reference_issues(files, extra_paths=extra_paths, required_ids=required_ids)
+  for issue in issues:
+    print(f"[LLM PLAN] ⚠️ {issue['detail']}")
+  return {"files": files}, issues
+
+
+def _score_candidate(files: List[Dict], checks: List[str], extra_paths: List[str]) -> tuple:
+  """Local quality score (0-1) of generated files: share of checks that pass
+  (or need a browser) minus 0.1 per broken cross-file reference."""
+  results = evaluate_checks(files, checks)
+  verifiable = [r for r in results if r["status"] in ("pass", "dynamic", "fail")]
+  passed = sum(r["status"] != "fail" for r in verifiable)
+  issues = cross_reference_issues(files, extra_paths=extra_paths)
+  coverage = passed / len(verifiable) if verifiable else 1.0
+  score = max(coverage - 0.1 * len(issues), 0.0)
+  return round(score, 3), f"{passed}/{len(verifiable)} checks, {len(issues)} reference issue(s)"
+
+
+def _speculative_generate(prompt: str, instructions: str, task_payload: Dict, attach_paths: List[str], prev_files: List[Dict]) -> Dict:
+  """Generate several full-output candidates concurrently and return the best response.
+  
+  Candidates cycle over the configured providers and SPECULATIVE_TEMPERATURES.
+  Responses that do not parse are discarded; the others are scored locally
+  (after templates are rendered, with unchanged previous files merged in).
+  The first candidate reaching SPECULATIVE_ACCEPT_SCORE is taken at once and
+  the rest are abandoned, otherwise the best score wins.
+  """
+  checks = task_payload.get("checks", [])
+  prompt_tokens = max(count_tokens(instructions + prompt), 1)
+  n = min(SPECULATIVE_CANDIDATES, max(SPECULATIVE_TOKEN_BUDGET // prompt_tokens, 1))
+  providers = configured_providers()
+  if n < 2 or not providers:
+    return _call_llm(prompt, validate=_parse_files_json, instructions=instructions)
+  
+  temperatures = SPECULATIVE_TEMPERATURES or [None]
+  variants = [(providers[i % len(providers)]["name"], temperatures[i % len(temperatures)]) for i in range(n)]
+  known_paths = attach_paths + ([BASE_CSS_PATH] if TEMPLATE_FAST_PATH else [])
+  print(f"[LLM SPECULATIVE] {n} candidate(s) ({prompt_tokens} prompt tokens each): "
+        f"{', '.join(f'{name}@{t}' for name, t in variants)}")
+  
+  def candidate(provider: str, temperature) -> Dict:
+    token = preferred_provider.set(provider)
+    try:
+      return complete(prompt, validate=_parse_files_json, hedge=False, instructions=instructions, temperature=temperature)
+    finally:
+      preferred_provider.reset(token)
+  
+  pool = ThreadPoolExecutor(max_workers=n)
+  futures = {pool.submit(copy_context().run, candidate, name, t): (name, t) for name, t in variants}
+  best = None
+  try:
+    for future in as_completed(futures):
+      name, t = futures[future]
+      try:
+        response = future.result()
+      except Exception as e:
+        print(f"[LLM SPECULATIVE] ⚠️ {name}@{t} failed: {e}")
+        continue
+      files = list(response["parsed"].get("files", []))
+      returned = {f.get("path") for f in files}
+      files += [f for f in prev_files if f.get("path") not in returned]
+      if TEMPLATE_FAST_PATH:
+        files = apply_templates(task_payload, files, attach_paths)
+      score, detail = _score_candidate(files, checks, known_paths)
+      print(f"[LLM SPECULATIVE] {response['provider']}@{t}: score {score} ({detail}) in {response['latency']:.1f}s")
+      if best is None or score > best[0]:
+        best = (score, response)
+      if score >= SPECULATIVE_ACCEPT_SCORE:
+        break
+  finally:
+    # Requests already in flight cannot be aborted; their results are discarded
+    late = sum(not f.done() for f in futures)
+    pool.shutdown(wait=False, cancel_futures=True)
+  
+  if best is None:
+    raise RuntimeError(f"All {n} speculative candidates failed")
+  if late:
+    print(f"[LLM SPECULATIVE] Abandoned {late} late candidate(s)")
+  response = best[1]
+  usage = response.get("usage") or {}
+  print(f"[LLM] Got {len(response['text'])} chars from {response['provider']} in {response['latency']:.1f}s "
+        f"(score {best[0]}, tokens in={usage.get('input_tokens', 0)} out={usage.get('output_tokens', 0)})")
+  return response
+
+
+def _estimate_prompt_tokens(task_payload: Dict, attachments: List[Dict]) -> int:
+  """Rough size of the generation prompt before it is built (for the budget governor)."""
+  brief = task_payload.get("brief", "")
+  checks = task_payload.get("checks", [])
+  round_num = task_payload.get("round", 1)
+  modules = select_modules(brief, checks, attachments, modify=round_num > 1)
+  tokens = count_tokens(build_system_prompt(modules) + brief + "\n".join(checks))
+  # Attachments reach the prompt as profiles or short previews
+  tokens += 1500 * len(attachments)
+  if round_num > 1:
+    previous = _load_previous_context(task_payload.get("task", "unknown"), task_payload.get("nonce", "no-nonce"), round_num) or {}
+    code = "".join(f.get("content") or "" for f in previous.get("files", []))
+    tokens += min(count_tokens(code), PROMPT_TOKEN_BUDGET)
+  return tokens
+
+
 def generate_files(task_payload: Dict) -> Dict[str, List[Dict]]:
-  """Generate files using AIPipe with automatic code review"""
+  """Generate files within the daily budget, routing simple tasks to the fast provider.
+  
+  The budget governor admits the task first: with little headroom left it runs
+  on BUDGET_FALLBACK_PROVIDER, then also without review and fix passes, and
+  when even that does not fit it waits for headroom (or fails with
+  BudgetExceededError). Otherwise the task's complexity score picks the tier.
+  A fast attempt whose result fails local validation (failing checks, broken
+  cross-file references) or raises is retried on the default providers. Every
+  attempt is recorded for tuning.
+  """
+  if SKIP_LLM:
+    return _generate_once(task_payload)
+  
+  checks = task_payload.get("checks", [])
+  round_num = task_payload.get("round", 1)
+  attachments = task_payload.get("parsed_attachments") or task_payload.get("attachments", [])
+  attach_paths = [a.get("path") for a in attachments if a.get("path")]
+  task_label = f"{task_payload.get('task', 'unknown')}_{task_payload.get('nonce', 'no-nonce')}"
+  current_task.set(task_label)
+  score, factors = complexity(task_payload.get("brief", ""), checks, attachments, round_num)
+  tier = choose_tier(score)
+  print(f"[ROUTER] Complexity {score} ({', '.join(f'{k}={v}' for k, v in factors.items())}) -> {tier}")
+  
+  # Batches are billed separately and wait anyway, so only synchronous calls are governed
+  mode = "full"
+  if active_batch.get() is None:
+    providers = configured_providers()
+    model = providers[0]["model"] if providers else None
+    prompt_tokens = _estimate_prompt_tokens(task_payload, attachments)
+    candidates = SPECULATIVE_CANDIDATES if round_num == 1 or ROUND2_MODE != "patch" else 1
+    fallback_model = BUDGET_FALLBACK_PROVIDER.partition(":")[2] or None
+    mode = admit(task_label, prompt_tokens, model, fallback_model, candidates=max(candidates, 1))["mode"]
+    if mode != "full":
+      tier = "budget"
+  try:
+    return _route(task_payload, checks, round_num, attach_paths, score, factors, tier, frugal=mode != "full", review=mode != "no_review")
+  finally:
+    release(task_label)
+
+
+def _route(
+  task_payload: Dict, checks: List[str], round_num: int, attach_paths: List[str],
+  score: float, factors: Dict, tier: str, frugal: bool = False, review: bool = True,
+) -> Dict:
+  """Run the task on the tier's provider, escalating a failed fast attempt to the default providers."""
+  escalated = False
+  tier_provider = {"fast": ROUTER_FAST_PROVIDER, "budget": BUDGET_FALLBACK_PROVIDER}
+  while True:
+    start = time.time()
+    token = preferred_provider.set(tier_provider.get(tier))
+    try:
+      providers = configured_providers()
+      model = providers[0]["name"] if providers else None
+      result, error = _generate_once(task_payload, review=review, speculative=not frugal), None
+      failed = failed_checks(evaluate_checks(result["files"], checks))
+      failed += cross_reference_issues(result["files"], extra_paths=attach_paths)
+      outcome = "fail" if failed else "pass"
+    except Exception as e:
+      result, error, failed, outcome = None, e, [], "error"
+    finally:
+      preferred_provider.reset(token)
+    
+    record_decision(
+      task_payload.get("task", "unknown"), task_payload.get("nonce", "no-nonce"), round_num,
+      score, factors, tier, model, escalated, outcome, len(failed), time.time() - start,
+    )
+    if tier == "fast" and outcome != "pass":
+      print(f"[ROUTER] ⬆️ Fast attempt on {model} {'raised: ' + str(error) if error else f'has {len(failed)} failure(s)'}, escalating")
+      tier, escalated = "strong", True
+      continue
+    if error:
+      raise error
+    print(f"[ROUTER] {tier} attempt on {model}: {outcome} in {time.time() - start:.1f}s")
+    return result
+
+
+def _generate_once(task_payload: Dict, review: bool = True, speculative: bool = True) -> Dict[str, List[Dict]]:
+  """Generate files using AIPipe with automatic code review
+  
+  `review=False` skips the review and fix passes and `speculative=False` makes a
+  single generation call (both used when the LLM budget runs low).
+  """
   
   # Mock mode for testing
   if SKIP_LLM:
     brief = task_payload.get("brief", "Test App")
     return _mock_response(brief)
   
-  if not AIPIPE_API_KEY:
-    raise ValueError("AIPIPE_API_KEY not set in .env")
+  if not configured_providers() and active_batch.get() is None:
+    raise ValueError("No LLM provider configured: set AIPIPE_API_KEY or GEMINI_API_KEY in .env")
   
   brief = task_payload.get("brief", "")
   checks = task_payload.get("checks", [])
   task_name = task_payload.get("task", "unknown")
   nonce = task_payload.get("nonce", "no-nonce")
   round_num = task_payload.get("round", 1)
+  current_task.set(f"{task_name}_{nonce}")
   
   # Use parsed attachments if available (has mime_type), otherwise fall back to raw attachments
   attachments = task_payload.get("parsed_attachments") or task_payload.get("attachments", [])
   
   # Load previous round context if this is round 2+
   previous_context = None
+  warm_start = None
   if round_num > 1:
     previous_context = _load_previous_context(task_name, nonce, round_num)
+  elif WARM_START_THRESHOLD > 0:
+    # A near-duplicate of an earlier successful task is adapted instead of generated from scratch
+    try:
+      warm_start = find_similar(brief, checks, WARM_START_THRESHOLD, exclude=(task_name, nonce))
+      if warm_start:
+        previous_context = load_context(warm_start["task"], warm_start["nonce"], warm_start["round"])
+        if previous_context and TEMPLATE_FAST_PATH:
+          # Rendered again for this task anyway
+          previous_context = {**previous_context, "files": [
+            f for f in previous_context.get("files", []) if f.get("path") not in ("README.md", BASE_CSS_PATH)
+          ]}
+        if not previous_context or not previous_context.get("files"):
+          warm_start, previous_context = None, None
+    except Exception as e:
+      print(f"[WARM START] ⚠️ Lookup failed: {e}, generating from scratch")
+      warm_start, previous_context = None, None
   
   # Build attachment info with content preview
   attachment_info = ""
@@ -685,8 +643,12 @@ def generate_files(task_payload: Dict) -> Dict[str, List[Dict]]:
       
       attachment_info += f"\n### File: `{path}` (type: {mime})\n"
       
+      # CSV/JSON files come with a profile computed from the whole file
+      if att.get("profile"):
+        attachment_info += "**Profile (computed from the full file - fetch and parse ALL of it at runtime):**\n"
+        attachment_info += f"```\n{att['profile']}\n```\n"
       # Show content preview if available
-      if preview and preview != f"[Binary file: {mime}]":
+      elif preview and preview != f"[Binary file: {mime}]":
         # Show structure for CSV/JSON
         if mime in ["text/csv", "application/csv"]:
           lines = preview.split('\n')[:10]  # First 10 lines
@@ -713,10 +675,52 @@ def generate_files(task_payload: Dict) -> Dict[str, List[Dict]]:
     for idx, check in enumerate(checks, 1):
       checks_info += f"{idx}. {check}\n"
   
-  # Add previous context for round 2+
+  attach_paths = [a.get("path") for a in attachments if a.get("path")]
+  template_info = TEMPLATE_PROMPT if TEMPLATE_FAST_PATH else ""
+  
+  # Only the system prompt modules this task needs (charts, forms, CSV, ...)
+  modules = select_modules(brief, checks, attachments, modify=bool(previous_context))
+  system_prompt = build_system_prompt(modules)
+  print(f"[LLM PROMPT] System prompt modules: {', '.join(modules)}")
+  
+  # Round 2 patch mode: ask for edit blocks instead of complete files
+  patch_mode = bool(previous_context) and ROUND2_MODE == "patch"
+  
+  # Round instruction
+  round_info = f"\n\nROUND: {round_num}"
+  if warm_start:
+    round_info += " (Adapt the files of a very similar previous task to this task)"
+  elif round_num == 1:
+    round_info += " (Create new files)"
+  else:
+    round_info += " (Modify existing files to fix issues/add features)"
+  
+  if patch_mode:
+    output_info = ROUND2_PATCH_PROMPT
+  else:
+    output_info = """⚠️ REMINDER: Your response MUST be a JSON object with ONE key "files" containing an array.
+If the task asks you to create JSON/CSV/TXT files, their content goes INSIDE the "content" field of the files array.
+DO NOT return the data structure directly - always wrap in the required format!
+
+Generate the complete web app as JSON now:"""
+  
+  # Add previous context for round 2+ (or the similar task for a warm start)
   context_info = ""
-  if previous_context and round_num > 1:
-    context_info = f"""
+  if warm_start:
+    context_header = f"""
+
+═══════════════════════════════════════════════════════════════
+CODE OF A VERY SIMILAR PREVIOUS TASK (START FROM IT!)
+═══════════════════════════════════════════════════════════════
+
+⚠️ **IMPORTANT:** The code below passed all checks for a brief that is
+   {warm_start['similarity']:.0%} similar to this one. Adapt it to THIS task: update titles, texts,
+   data file names, element IDs and anything else the brief and checks below require.
+   DO NOT rewrite everything from scratch!
+
+"""
+  elif previous_context:
+    context_header = f"""
 
 ═══════════════════════════════════════════════════════════════
 PREVIOUS ROUND {round_num - 1} CODE (KEEP WHAT'S GOOD!)
@@ -727,14 +731,8 @@ PREVIOUS ROUND {round_num - 1} CODE (KEEP WHAT'S GOOD!)
    DO NOT rewrite everything from scratch!
 
 """
-    prev_files = previous_context.get("files", [])
-    for f in prev_files:
-      path = f.get('path', 'unknown')
-      content = f.get('content', '')
-      context_info += f"\n### File: {path}\n"
-      context_info += f"```\n{content}\n```\n"
-    
-    context_info += """
+  if previous_context:
+    context_footer = """
 ═══════════════════════════════════════════════════════════════
 END OF PREVIOUS CODE
 ═══════════════════════════════════════════════════════════════
@@ -743,125 +741,184 @@ END OF PREVIOUS CODE
 **Keep:** Everything that's already working well
 **Change:** Only what's broken or missing
 """
-  
-  # Round instruction
-  round_info = f"\n\nROUND: {round_num}"
-  if round_num == 1:
-    round_info += " (Create new files)"
-  else:
-    round_info += " (Modify existing files to fix issues/add features)"
+    # The previous code gets whatever the fixed sections leave of the token budget.
+    # Patch edits are applied to the original files, so patch mode never shows minified code.
+    fixed_tokens = count_tokens(system_prompt + template_info + round_info + brief + checks_info + attachment_info + output_info + context_header + context_footer)
+    prev_files, stats = fit_files(
+      previous_context.get("files", []), brief, checks,
+      max(PROMPT_TOKEN_BUDGET - fixed_tokens, 0), elide_regions=patch_mode,
+      minify_files=not patch_mode
+    )
+    if stats["final"] < stats["original"]:
+      print(f"[LLM PROMPT] Previous code shrunk {stats['original']} -> {stats['final']} tokens to fit budget")
+    
+    context_info = context_header
+    if any(f["note"].startswith("elided") for f in prev_files):
+      context_info += "Lines like `... [N lines elided - unchanged] ...` stand for unchanged code hidden to save space. Never put them in a \"search\" block.\n"
+    for f in prev_files:
+      path = f.get('path', 'unknown')
+      if f["note"] == "omitted":
+        context_info += f"\n### File: {path} (unchanged - omitted to save space, do not return it)\n"
+        continue
+      note = f" ({f['note']})" if f["note"] else ""
+      context_info += f"\n### File: {path}{note}\n"
+      context_info += f"```\n{f['content']}\n```\n"
+    context_info += context_footer
   
   # Combine system prompt + round + task + checks + attachments + context
-  prompt = f"""{SYSTEM_PROMPT}
-
-{round_info}{context_info}
+  # The static system prompt goes through the provider's instructions channel so it is a
+  # byte-stable prefix the provider can cache; everything task-specific follows it
+  instructions = system_prompt + template_info
+  prompt = f"""{round_info.lstrip()}{context_info}
 
 TASK: {brief}{checks_info}{attachment_info}
 
-⚠️ REMINDER: Your response MUST be a JSON object with ONE key "files" containing an array.
-If the task asks you to create JSON/CSV/TXT files, their content goes INSIDE the "content" field of the files array.
-DO NOT return the data structure directly - always wrap in the required format!
-
-Generate the complete web app as JSON now:"""
+{output_info}"""
   
-  print(f"\n[LLM] Calling AIPipe ({AIPIPE_MODEL})...")
+  log_breakdown({
+    "system": system_prompt, "templates": template_info, "round": round_info, "context": context_info, "task": brief,
+    "checks": checks_info, "attachments": attachment_info, "output": output_info,
+  }, PROMPT_TOKEN_BUDGET)
   
-  # Call AIPipe
-  response = requests.post(
-    "https://aipipe.org/openai/v1/responses",
-    headers={"Authorization": f"Bearer {AIPIPE_API_KEY}", "Content-Type": "application/json"},
-    json={"model": AIPIPE_MODEL, "input": prompt},
-    timeout=300
-  )
-  response.raise_for_status()
-  data = response.json()
+  result, issues = None, []
+  if PARALLEL_GENERATION and round_num == 1 and not previous_context:
+    try:
+      result, issues = _plan_and_generate(brief, checks_info, attachment_info, attach_paths, template_info, instructions)
+      text = json.dumps(result)
+    except Exception as e:
+      print(f"[LLM PLAN] ⚠️ Parallel generation failed: {e}, falling back to a single call")
+      result, issues = None, []
   
-  # Extract text from response
-  text = data["output"][0]["content"][0]["text"]
-  print(f"[LLM] Got {len(text)} chars")
+  if result is None and speculative and SPECULATIVE_CANDIDATES > 1 and not patch_mode:
+    prev_files = previous_context.get("files", []) if previous_context else []
+    response = _speculative_generate(prompt, instructions, task_payload, attach_paths, prev_files)
+    text = response["text"]
+    result = response["parsed"]
   
-  # Show usage
-  try:
-    usage = requests.get("https://aipipe.org/usage", headers={"Authorization": f"Bearer {AIPIPE_API_KEY}"}, timeout=5).json()
-    print(f"[LLM] Cost today: ${usage['usage'][-1]['cost']:.4f} / ${usage['limit']}")
-  except:
-    pass
+  if result is None:
+    # The first provider response that parses wins
+    response = _call_llm(prompt, validate=_parse_files_json, instructions=instructions)
+    text = response["text"]
+    result = response["parsed"]
   
-  # Parse JSON with robust error handling
-  try:
-    # Remove markdown code fences if present
-    if "```" in text:
-      parts = text.split("```")
-      for part in parts:
-        if part.strip().startswith("json"):
-          text = part[4:].strip()  # Remove "json" prefix
-          break
-        elif part.strip() and part.strip()[0] == "{":
-          text = part.strip()
-          break
-    
-    # Find JSON boundaries
-    start = text.find("{")
-    end = text.rfind("}") + 1
-    
-    if start == -1 or end == 0:
-      print(f"[LLM] ❌ No JSON found in response!")
-      print(f"[LLM] First 500 chars: {text[:500]}")
-      raise ValueError("No JSON object found in LLM response")
-    
-    json_str = text[start:end]
-    print(f"[LLM] Extracted JSON: {len(json_str)} chars")
-    
-    # Try to parse JSON with standard parser first
+  if patch_mode:
+    result = _apply_round2_edits(result, previous_context.get("files", []), prompt, instructions)
+  
+  if "files" not in result:
+    print(f"[LLM] ❌ Response missing 'files' key!")
+    print(f"[LLM] Keys found: {list(result.keys())}")
+    raise ValueError("LLM response missing 'files' array")
+  
+  if previous_context and not patch_mode:
+    # Files left out of the response (or omitted from the prompt) are unchanged
+    returned = {f.get("path") for f in result["files"]}
+    result["files"] += [f for f in previous_context.get("files", []) if f.get("path") not in returned]
+  
+  print(f"[LLM] ✅ Generated {len(result['files'])} files")
+  
+  # Run code review pass to catch and fix bugs (and any cross-file issues from parallel generation)
+  known_paths = attach_paths + ([BASE_CSS_PATH] if TEMPLATE_FAST_PATH else [])
+  if review:
+    reviewed_files = _review_and_fix_code(result["files"], brief, checks, failed=issues or None, extra_paths=known_paths)
+  else:
+    print(f"[LLM REVIEW] Skipped to stay within the LLM budget")
+    reviewed_files = result["files"]
+  
+  if TEMPLATE_FAST_PATH:
+    reviewed_files = apply_templates(task_payload, reviewed_files, attach_paths)
+    print(f"[LLM] Rendered README.md and {BASE_CSS_PATH} from templates")
+  
+  # Verify checks locally and fix failures before anything is pushed
+  if review:
+    reviewed_files = _fix_failed_checks(reviewed_files, brief, checks, extra_paths=attach_paths)
+  
+  # Save context for future rounds (save reviewed version)
+  _save_round_context(task_name, nonce, round_num, reviewed_files, f"{instructions}\n\n{prompt}", text, prefix=instructions)
+  
+  if round_num == 1 and WARM_START_THRESHOLD > 0 and not failed_checks(evaluate_checks(reviewed_files, checks)):
     try:
-      result = json.loads(json_str)
-    except json.JSONDecodeError as parse_error:
-      # If standard parsing fails, try to fix common escape issues
-      print(f"[LLM] ⚠️ Initial parse failed: {parse_error}")
-      print(f"[LLM] Attempting to fix escape sequences...")
-      
-      # Common fixes for invalid escapes
-      # Fix single backslashes that aren't valid escape sequences
-      import re
-      
-      # Replace invalid escape sequences (but preserve valid ones like \n, \t, \", \\, etc.)
-      # This regex finds backslashes followed by characters that aren't valid escape chars
-      fixed_json = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
-      
-      try:
-        result = json.loads(fixed_json)
-        print(f"[LLM] ✅ Fixed escape sequences successfully")
-      except json.JSONDecodeError as e2:
-        # If still failing, show detailed error context
-        print(f"[LLM] ❌ Still failed after escape fix: {e2}")
-        print(f"[LLM] Error at position {e2.pos}")
-        if e2.pos:
-          start_pos = max(0, e2.pos - 100)
-          end_pos = min(len(fixed_json), e2.pos + 100)
-          print(f"[LLM] Context around error:")
-          print(fixed_json[start_pos:end_pos])
-        raise ValueError(f"Failed to parse LLM JSON response: {e2}")
-    
-    if "files" not in result:
-      print(f"[LLM] ❌ Response missing 'files' key!")
-      print(f"[LLM] Keys found: {list(result.keys())}")
-      raise ValueError("LLM response missing 'files' array")
-    
-    print(f"[LLM] ✅ Generated {len(result['files'])} files")
-    
-    # Run code review pass to catch and fix bugs
-    reviewed_files = _review_and_fix_code(result["files"], brief, checks)
-    
-    # Save context for future rounds (save reviewed version)
-    _save_round_context(task_name, nonce, round_num, reviewed_files, prompt, text)
-    
-    return {"files": reviewed_files}
-    
-  except json.JSONDecodeError as e:
+      index_brief(task_name, nonce, round_num, brief, checks)
+    except Exception as e:
+      print(f"[WARM START] ⚠️ Could not index brief: {e}")
+  
+  usage = task_usage(f"{task_name}_{nonce}")
+  if usage:
+    print(f"[LLM] Task usage: {usage['calls']} calls, tokens in={usage['input_tokens']} "
+          f"out={usage['output_tokens']} cached={usage['cached_tokens']} (cache hit rate {usage['cache_hit_rate']})")
+  
+  return {"files": reviewed_files}
+
+
+def _call_llm(prompt: str, validate=None, instructions: str = None) -> Dict:
+  """Send a prompt to the configured providers (hedged) and return the winning response.
+  
+  `instructions` is the static part of the prompt, sent separately so providers can cache it.
+  """
+  response = complete(prompt, validate=validate, instructions=instructions)
+  usage = response.get("usage") or {}
+  print(f"[LLM] Got {len(response['text'])} chars from {response['provider']} in {response['latency']:.1f}s "
+        f"(tokens in={usage.get('input_tokens', 0)} out={usage.get('output_tokens', 0)} cached={usage.get('cached_tokens', 0)})")
+  return response
+
+
+def _parse_files_json(text: str) -> Dict:
+  """Extract the JSON object from an LLM response"""
+  try:
+    result, repairs = extract_json(text)
+  except JSONExtractError as e:
+    if e.truncated:
+      print(f"[LLM] ⚠️ Output truncated: {e}")
+      raise
     print(f"[LLM] ❌ JSON parse error: {e}")
-    print(f"[LLM] Full response text (first 1000 chars):")
-    print(text[:1000])
-    print(f"[LLM] Full response text (last 500 chars):")
-    print(text[-500:])
-    raise ValueError(f"Failed to parse LLM JSON response: {e}")
+    print(f"[LLM] Context around error:")
+    print(e.context())
+    raise
+  
+  if repairs:
+    print(f"[LLM] ✅ Repaired JSON: {', '.join(f'{kind} x{n}' for kind, n in repairs.items())}")
+  if not isinstance(result, dict):
+    raise ValueError("LLM response JSON is not an object")
+  return result
+
+
+def _apply_round2_edits(result: Dict, prev_files: List[Dict], prompt: str, instructions: str = None) -> Dict:
+  """Apply Round 2 edit blocks to the previous files.
+  
+  Files whose edits fail to apply are regenerated in full with a second,
+  narrower call; if that also fails the previous version is kept.
+  """
+  edits = result.get("edits", [])
+  files, failed = apply_edits(prev_files, edits)
+  
+  # Complete files the model chose to return are taken as-is
+  by_path = {f["path"]: f for f in files}
+  for f in result.get("files", []):
+    if f.get("path"):
+      by_path[f["path"]] = f
+      failed.discard(f["path"])
+  
+  print(f"[LLM PATCH] Applied {len(edits)} edit(s) to {len(prev_files)} file(s), {len(failed)} failed")
+  
+  if failed:
+    print(f"[LLM PATCH] ⚠️ Regenerating in full: {sorted(failed)}")
+    # The prompt may show these files minified/elided, so include them verbatim
+    originals = "".join(
+      f"\n### File: {f.get('path')}\n```\n{f.get('content', '')}\n```\n"
+      for f in prev_files if f.get("path") in failed
+    )
+    full_prompt = prompt.replace(ROUND2_PATCH_PROMPT, f"""CURRENT FULL CONTENT OF THE FILES TO UPDATE:
+{originals}
+Return COMPLETE content for ONLY these files, with MINIMAL changes: {', '.join(sorted(failed))}
 
+⚠️ REMINDER: Your response MUST be a JSON object with ONE key "files" containing an array.
+
+Generate the requested files as JSON now:""")
+    try:
+      regenerated = _call_llm(full_prompt, validate=_parse_files_json, instructions=instructions)["parsed"].get("files", [])
+      for f in regenerated:
+        if f.get("path") in failed:
+          by_path[f["path"]] = f
+    except Exception as e:
+      print(f"[LLM PATCH] ⚠️ Full regeneration failed: {e}, keeping previous versions")
+  
+  return {"files": list(by_path.values())}
@@ -0,0 +1,487 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+import requests
+from contextvars import ContextVar, copy_context
+from dotenv import load_dotenv
+
+from services import batch, budget, metrics
+from services.breakers import BREAKER_LLM_SLOW_CALL, CircuitOpenError, breaker
+
+load_dotenv()
+
+AIPIPE_API_KEY = os.getenv("AIPIPE_API_KEY")
+AIPIPE_MODEL = os.getenv("AIPIPE_MODEL")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Ordered "provider:model" list, e.g. "aipipe:gpt-4o,gemini:gemini-2.5-flash".
+# Defaults to AIPipe, plus Gemini when GEMINI_API_KEY is set.
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "")
+LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "300"))
+# Seconds to wait for the primary before firing a hedged request (0 disables hedging)
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "45"))
+# When set (e.g. 90), hedge at this percentile of the primary's observed latency instead
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+# Lifetime of Gemini explicit caches of the static instructions (0 disables them)
+GEMINI_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", "3600"))
+# Follow-up requests allowed when a response is cut off at the output limit
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+# Threads for primary calls, and as many again for hedges and failovers
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "32"))
+
+AIPIPE_URL = "https://aipipe.org/openai/v1/responses"
+# Reasoning models reject a temperature parameter
+_NO_TEMPERATURE_RE = re.compile(r"^(o\d|gpt-5)")
+
+# Losing requests cannot be aborted mid-flight; they finish in these threads and are discarded.
+# Hedges run in their own pool so abandoned ones never delay the primary call of another task.
+_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm-hedge")
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict] = {}
+_gemini_client = None
+# (model, instructions hash) -> (cache name, expiry time)
+_gemini_caches: Dict[tuple, tuple] = {}
+_gemini_cache_lock = threading.Lock()
+
+# Provider spec ("backend:model") tried first for calls made in this context; set by the model router
+preferred_provider: ContextVar[Optional[str]] = ContextVar("llm_preferred_provider", default=None)
+
+CONTINUE_PROMPT = """Your previous response was cut off at the output limit.
+Continue EXACTLY where it stopped, starting with the very next character.
+Do NOT repeat anything already written, do NOT restart the JSON, and do NOT add markdown fences or explanations."""
+
+
+def _aipipe_body(
+    prompt: str,
+    model: str,
+    partial: Optional[str] = None,
+    instructions: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> Dict:
+    """Request body for the AIPipe/OpenAI responses API."""
+    payload = prompt
+    if partial is not None:
+        payload = [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": CONTINUE_PROMPT},
+        ]
+    body = {"model": model, "input": payload}
+    if instructions:
+        # Sent ahead of the input, so the static text is a stable, cacheable prefix
+        body["instructions"] = instructions
+    if temperature is not None and not _NO_TEMPERATURE_RE.match(model or ""):
+        body["temperature"] = temperature
+    return body
+
+
+def _parse_aipipe(data: Dict) -> Dict:
+    """Backend result from a responses API response body."""
+    # Reasoning models put a "reasoning" item before the message
+    text = None
+    for item in data.get("output", []):
+        if item.get("type", "message") == "message":
+            text = item["content"][0]["text"]
+            break
+    if text is None:
+        raise ValueError(f"AIPipe response has no message output (status: {data.get('status')})")
+    usage = data.get("usage") or {}
+    return {
+        "text": text,
+        "raw": data,
+        "truncated": data.get("status") == "incomplete",
+        "usage": {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cached_tokens": (usage.get("input_tokens_details") or {}).get("cached_tokens", 0),
+        },
+    }
+
+
+def _call_aipipe(prompt: str, model: str, partial: Optional[str] = None, instructions: Optional[str] = None, temperature: Optional[float] = None) -> Dict:
+    response = requests.post(
+        AIPIPE_URL,
+        headers={"Authorization": f"Bearer {AIPIPE_API_KEY}", "Content-Type": "application/json"},
+        json=_aipipe_body(prompt, model, partial, instructions, temperature),
+        timeout=LLM_TIMEOUT,
+    )
+    response.raise_for_status()
+    return _parse_aipipe(response.json())
+
+
+def _call_batch(prompt: str, model: str, partial: Optional[str] = None, instructions: Optional[str] = None, temperature: Optional[float] = None) -> Dict:
+    """Queue the request in the active batch and wait for its result."""
+    collector = batch.active_batch.get()
+    if collector is None:
+        raise RuntimeError("No batch is active in this context")
+    data = collector.request(_aipipe_body(prompt, model, partial, instructions, temperature)).result()
+    return _parse_aipipe(data)
+
+
+def _gemini_cached_instructions(model: str, instructions: str) -> Optional[str]:
+    """Name of an explicit Gemini cache holding `instructions`, created on first use.
+
+    Returns None when caching is disabled or the cache cannot be created (e.g.
+    the instructions are below the model's minimum cacheable size).
+    """
+    from google.genai import types
+
+    if GEMINI_CACHE_TTL <= 0:
+        return None
+    key = (model, hashlib.sha256(instructions.encode("utf-8")).hexdigest())
+    with _gemini_cache_lock:
+        name, expires = _gemini_caches.get(key, (None, 0.0))
+        # Renew a little early so a request never references an expired cache
+        if name and expires - time.time() > 60:
+            return name
+        try:
+            cache = _gemini_client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(system_instruction=instructions, ttl=f"{GEMINI_CACHE_TTL}s"),
+            )
+        except Exception as e:
+            print(f"[LLM] ⚠️ Gemini cache not created ({e}), sending instructions uncached")
+            _gemini_caches[key] = (None, time.time() + GEMINI_CACHE_TTL)
+            return None
+        _gemini_caches[key] = (cache.name, time.time() + GEMINI_CACHE_TTL)
+        print(f"[LLM] Created Gemini cache {cache.name} for {model}")
+        return cache.name
+
+
+def _call_gemini(prompt: str, model: str, partial: Optional[str] = None, instructions: Optional[str] = None, temperature: Optional[float] = None) -> Dict:
+    global _gemini_client
+    from google import genai
+    from google.genai import types
+
+    if _gemini_client is None:
+        _gemini_client = genai.Client(
+            api_key=GEMINI_API_KEY,
+            http_options=types.HttpOptions(timeout=LLM_TIMEOUT * 1000),
+        )
+    contents = prompt
+    if partial is not None:
+        contents = [
+            types.Content(role="user", parts=[types.Part(text=prompt)]),
+            types.Content(role="model", parts=[types.Part(text=partial)]),
+            types.Content(role="user", parts=[types.Part(text=CONTINUE_PROMPT)]),
+        ]
+    options = {}
+    if instructions:
+        cache_name = _gemini_cached_instructions(model, instructions)
+        if cache_name:
+            options["cached_content"] = cache_name
+        else:
+            options["system_instruction"] = instructions
+    if temperature is not None:
+        options["temperature"] = temperature
+    config = types.GenerateContentConfig(**options) if options else None
+    response = _gemini_client.models.generate_content(model=model, contents=contents, config=config)
+    if not response.text:
+        raise ValueError("Gemini returned an empty response")
+    finish = response.candidates[0].finish_reason if response.candidates else None
+    meta = response.usage_metadata
+    return {
+        "text": response.text,
+        "raw": response,
+        "truncated": str(finish).endswith("MAX_TOKENS"),
+        "usage": {
+            "input_tokens": getattr(meta, "prompt_token_count", 0) or 0,
+            "output_tokens": (getattr(meta, "candidates_token_count", 0) or 0) + (getattr(meta, "thoughts_token_count", 0) or 0),
+            "cached_tokens": getattr(meta, "cached_content_token_count", 0) or 0,
+        },
+    }
+
+
+# Backends take (prompt, model, partial=None, instructions=None, temperature=None); `partial` asks for
+# a continuation of cut-off output, `instructions` is static text sent through the provider's system
+# channel, `temperature` overrides the provider default (ignored by models that do not support it).
+# They return {"text", "raw", "truncated", "usage": {"input_tokens", "output_tokens", "cached_tokens"}}
+_BACKENDS: Dict[str, Callable[..., Dict]] = {
+    "aipipe": _call_aipipe,
+    "gemini": _call_gemini,
+    "batch": _call_batch,
+}
+
+
+def configured_providers() -> List[Dict]:
+    """Providers in priority order: [{"name", "backend", "model"}].
+
+    A provider set in `preferred_provider` (by the model router) comes first.
+    """
+    specs = [s.strip() for s in LLM_PROVIDERS.split(",") if s.strip()]
+    if not specs:
+        if AIPIPE_API_KEY:
+            specs.append(f"aipipe:{AIPIPE_MODEL}")
+        if GEMINI_API_KEY:
+            specs.append(f"gemini:{GEMINI_MODEL}")
+    preferred = preferred_provider.get()
+    if preferred:
+        specs.insert(0, preferred)
+
+    providers = []
+    for spec in specs:
+        backend, _, model = spec.partition(":")
+        if backend not in _BACKENDS:
+            print(f"[LLM] ⚠️ Unknown provider '{backend}' in LLM_PROVIDERS, skipping")
+            continue
+        if backend == "aipipe" and not AIPIPE_API_KEY or backend == "gemini" and not GEMINI_API_KEY:
+            continue
+        model = model or (AIPIPE_MODEL if backend == "aipipe" else GEMINI_MODEL)
+        if any(p["name"] == f"{backend}:{model}" for p in providers):
+            continue
+        providers.append({"name": f"{backend}:{model}", "backend": backend, "model": model})
+    return providers
+
+
+def _record(name: str, outcome: str, latency: Optional[float] = None) -> None:
+    with _stats_lock:
+        s = _stats.setdefault(name, {"calls": 0, "wins": 0, "failures": 0, "abandoned": 0, "latencies": deque(maxlen=200)})
+        if outcome == "call":
+            s["calls"] += 1
+        elif outcome == "win":
+            s["wins"] += 1
+        elif outcome == "failure":
+            s["failures"] += 1
+        elif outcome == "abandoned":
+            s["abandoned"] += 1
+        if latency is not None:
+            s["latencies"].append(latency)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def provider_stats() -> Dict[str, Dict]:
+    """Win rates and latency percentiles per provider."""
+    with _stats_lock:
+        out = {}
+        for name, s in _stats.items():
+            latencies = list(s["latencies"])
+            out[name] = {
+                "calls": s["calls"],
+                "wins": s["wins"],
+                "failures": s["failures"],
+                "abandoned": s["abandoned"],
+                "win_rate": round(s["wins"] / s["calls"], 3) if s["calls"] else None,
+                "p50_s": _percentile(latencies, 50),
+                "p90_s": _percentile(latencies, 90),
+            }
+        return out
+
+
+def _hedge_delay(provider: Dict) -> Optional[float]:
+    if LLM_HEDGE_DELAY <= 0 and LLM_HEDGE_PERCENTILE <= 0:
+        return None
+    if LLM_HEDGE_PERCENTILE > 0:
+        with _stats_lock:
+            latencies = list(_stats.get(provider["name"], {}).get("latencies", []))
+        if len(latencies) >= 5:
+            return _percentile(latencies, LLM_HEDGE_PERCENTILE)
+    return LLM_HEDGE_DELAY if LLM_HEDGE_DELAY > 0 else None
+
+
+def _stitch(partial: str, more: str) -> str:
+    """Join a continuation onto cut-off output, dropping fences and repeated text."""
+    stripped = more.lstrip()
+    if stripped.startswith("```"):
+        # A fence the model re-opened, e.g. "```json\n"
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        more = stripped
+    # Models sometimes restart the line they were cut off in; the shortest
+    # overlap is taken so repetitive content is never over-trimmed
+    tail = partial[-500:]
+    for k in range(16, min(len(tail), len(more)) + 1):
+        if tail.endswith(more[:k]):
+            return partial + more[k:]
+    return partial + more
+
+
+def _breaker(provider: Dict):
+    """Circuit breaker of the provider's endpoint (shared by all its models); None for batches."""
+    if provider["backend"] == "batch":
+        return None
+    return breaker(f"llm:{provider['backend']}", BREAKER_LLM_SLOW_CALL, LLM_TIMEOUT)
+
+
+def _call_backend(
+    provider: Dict,
+    prompt: str,
+    instructions: Optional[str],
+    partial: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> Dict:
+    start = time.time()
+    backend = _BACKENDS[provider["backend"]]
+    circuit = _breaker(provider)
+    kwargs = {"partial": partial, "instructions": instructions, "temperature": temperature}
+    try:
+        if circuit:
+            result = circuit.call(backend, prompt, provider["model"], **kwargs)
+        else:
+            result = backend(prompt, provider["model"], **kwargs)
+    except CircuitOpenError:
+        raise
+    except Exception:
+        metrics.record_call(provider["name"], provider["model"], None, time.time() - start, outcome="error")
+        raise
+    metrics.record_call(provider["name"], provider["model"], result.get("usage"), time.time() - start)
+    budget.record_spend(provider["model"], result.get("usage"))
+    return result
+
+
+def _run(
+    provider: Dict,
+    prompt: str,
+    validate: Optional[Callable[[str], object]],
+    instructions: Optional[str],
+    temperature: Optional[float] = None,
+) -> Dict:
+    _record(provider["name"], "call")
+    start = time.time()
+    result = _call_backend(provider, prompt, instructions, temperature=temperature)
+    usage = dict(result.get("usage") or {})
+    continuations = 0
+    while True:
+        try:
+            result["parsed"] = validate(result["text"]) if validate else None
+            if validate or not result.get("truncated"):
+                break
+        except Exception as e:
+            # Only output that was cut off is worth continuing; anything else fails over
+            if not (result.get("truncated") or getattr(e, "truncated", False)) or continuations >= LLM_MAX_CONTINUATIONS:
+                raise
+        if continuations >= LLM_MAX_CONTINUATIONS:
+            break
+        continuations += 1
+        print(f"[LLM CONTINUE] {provider['name']} output cut off after {len(result['text'])} chars, "
+              f"requesting continuation {continuations}/{LLM_MAX_CONTINUATIONS}")
+        more = _call_backend(provider, prompt, instructions, partial=result["text"], temperature=temperature)
+        more["text"] = _stitch(result["text"], more["text"])
+        for key, n in (more.get("usage") or {}).items():
+            usage[key] = usage.get(key, 0) + (n or 0)
+        result = more
+    result.update({
+        "provider": provider["name"],
+        "model": provider["model"],
+        "latency": time.time() - start,
+        "continuations": continuations,
+        "usage": usage,
+    })
+    # Every completed call counts for the latency percentiles, won or abandoned,
+    # so the hedge delay is not biased towards the calls that happened to win
+    _record(provider["name"], "latency", result["latency"])
+    return result
+
+
+def complete(
+    prompt: str,
+    validate: Optional[Callable[[str], object]] = None,
+    hedge: bool = True,
+    instructions: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> Dict:
+    """Run a prompt against the configured providers with hedging and failover.
+
+    The primary provider is called first. If it has not answered after the
+    hedge delay, the next provider is fired as well, and a failing provider
+    immediately hands over to the next one. The first response whose text
+    passes `validate` (a callable that raises on invalid output) wins; the
+    others are cancelled if not started yet, or abandoned otherwise.
+
+    `instructions` is static text (the system prompt) sent through the
+    provider's instructions/system channel ahead of `prompt`. Keeping it
+    byte-identical across calls lets the provider cache it: AIPipe/OpenAI
+    cache repeated prefixes automatically, Gemini uses an explicit cache.
+
+    Output cut off at the provider's output limit is sent back with a request
+    to continue from the cut point, and the pieces are stitched together
+    before validation (up to LLM_MAX_CONTINUATIONS times).
+
+    Each endpoint sits behind a circuit breaker: providers whose breaker is
+    open are skipped, and CircuitOpenError is raised at once when all are.
+
+    Inside batch.run_batch() the request is queued in the provider batch
+    instead (no hedging or failover) and this call blocks until the batch
+    has been processed.
+
+    Returns {"text", "parsed", "raw", "provider", "model", "latency",
+    "continuations", "usage"}. Every backend call, including abandoned ones,
+    is recorded by the metrics collector.
+    """
+    if batch.active_batch.get() is not None:
+        model = batch.LLM_BATCH_MODEL or AIPIPE_MODEL
+        provider = {"name": f"batch:{model}", "backend": "batch", "model": model}
+        result = _run(provider, prompt, validate, instructions, temperature)
+        _record(provider["name"], "win")
+        return result
+
+    providers = configured_providers()
+    if not providers:
+        raise ValueError("No LLM provider configured (set AIPIPE_API_KEY or GEMINI_API_KEY)")
+    # Providers behind an open breaker are skipped instead of waiting out their timeout
+    available = [p for p in providers if _breaker(p).available()]
+    if not available:
+        raise CircuitOpenError(f"All LLM providers are failing fast, circuit open for {', '.join(p['name'] for p in providers)}")
+    providers = available
+
+    pending = {}
+    next_index = 0
+    launched_at = time.time()
+    errors: List[str] = []
+
+    def launch():
+        nonlocal next_index, launched_at
+        provider = providers[next_index]
+        next_index += 1
+        launched_at = time.time()
+        print(f"\n[LLM] Calling {provider['name']}...")
+        # copy_context carries the task label used by the metrics collector
+        pool = _executor if next_index == 1 else _hedge_executor
+        pending[pool.submit(copy_context().run, _run, provider, prompt, validate, instructions, temperature)] = provider
+
+    launch()
+    while pending:
+        timeout = None
+        if hedge and next_index < len(providers):
+            delay = _hedge_delay(providers[0])
+            if delay is not None:
+                timeout = max(delay - (time.time() - launched_at), 0)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            print(f"[LLM HEDGE] No response after {time.time() - launched_at:.0f}s, hedging with {providers[next_index]['name']}")
+            launch()
+            continue
+
+        for future in done:
+            provider = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                _record(provider["name"], "failure")
+                errors.append(f"{provider['name']}: {e}")
+                print(f"[LLM] ⚠️ {provider['name']} failed: {e}")
+                if not pending and next_index < len(providers):
+                    launch()
+                continue
+
+            _record(provider["name"], "win")
+            for other_future, other in pending.items():
+                if not other_future.cancel():
+                    _record(other["name"], "abandoned")
+            if pending:
+                print(f"[LLM HEDGE] {provider['name']} won after {result['latency']:.1f}s")
+            return result
+
+    raise RuntimeError(f"All LLM providers failed: {'; '.join(errors)}")
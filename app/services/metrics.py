@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AIPIPE_API_KEY = os.getenv("AIPIPE_API_KEY")
+AIPIPE_USAGE_URL = "https://aipipe.org/usage"
+# Minimum seconds between background refreshes of the remote usage figures
+USAGE_REFRESH_INTERVAL = float(os.getenv("USAGE_REFRESH_INTERVAL", "300"))
+# Per-task aggregates kept in memory (oldest dropped first)
+MAX_TASKS = 200
+
+# Label of the task an LLM call belongs to; set by the generator and carried
+# into worker threads with contextvars.copy_context()
+current_task: ContextVar[Optional[str]] = ContextVar("llm_task", default=None)
+
+_lock = threading.Lock()
+_recent: deque = deque(maxlen=100)
+_by_task: "OrderedDict[str, Dict]" = OrderedDict()
+_by_day: "OrderedDict[str, Dict]" = OrderedDict()
+_remote: Dict = {"cost_today": None, "limit": None, "updated": None, "error": None}
+_refresh_started = 0.0
+
+
+def _empty() -> Dict:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "latency_s": 0.0, "models": {}}
+
+
+def _add(agg: Dict, entry: Dict) -> None:
+    agg["calls"] += 1
+    for key in ("input_tokens", "output_tokens", "cached_tokens"):
+        agg[key] += entry[key]
+    agg["latency_s"] = round(agg["latency_s"] + entry["latency_s"], 3)
+    agg["models"][entry["model"]] = agg["models"].get(entry["model"], 0) + 1
+
+
+def _view(agg: Dict) -> Dict:
+    """Copy of an aggregate with the share of input tokens served from the provider cache."""
+    ratio = round(agg["cached_tokens"] / agg["input_tokens"], 3) if agg["input_tokens"] else None
+    return {**agg, "models": dict(agg["models"]), "cache_hit_rate": ratio}
+
+
+def record_call(provider: str, model: str, usage: Optional[Dict], latency: float, outcome: str = "ok") -> Dict:
+    """Record one provider call (including abandoned hedges and continuations).
+
+    `usage` is {"input_tokens", "output_tokens", "cached_tokens"} as reported
+    in the provider response; missing counts are recorded as 0.
+    """
+    usage = usage or {}
+    entry = {
+        "time": time.time(),
+        "task": current_task.get(),
+        "provider": provider,
+        "model": model,
+        "input_tokens": int(usage.get("input_tokens") or 0),
+        "output_tokens": int(usage.get("output_tokens") or 0),
+        "cached_tokens": int(usage.get("cached_tokens") or 0),
+        "latency_s": round(latency, 3),
+        "outcome": outcome,
+    }
+    day = time.strftime("%Y-%m-%d", time.gmtime(entry["time"]))
+    with _lock:
+        _recent.append(entry)
+        _add(_by_day.setdefault(day, _empty()), entry)
+        while len(_by_day) > 31:
+            _by_day.popitem(last=False)
+        if entry["task"]:
+            _add(_by_task.setdefault(entry["task"], _empty()), entry)
+            _by_task.move_to_end(entry["task"])
+            while len(_by_task) > MAX_TASKS:
+                _by_task.popitem(last=False)
+    _maybe_refresh()
+    return entry
+
+
+def task_usage(task: str) -> Dict:
+    """Aggregate usage of one task ({} if it made no calls)."""
+    with _lock:
+        agg = _by_task.get(task)
+        return _view(agg) if agg else {}
+
+
+def _refresh_remote() -> None:
+    try:
+        data = requests.get(AIPIPE_USAGE_URL, headers={"Authorization": f"Bearer {AIPIPE_API_KEY}"}, timeout=10).json()
+        cost = data["usage"][-1]["cost"] if data.get("usage") else 0.0
+        with _lock:
+            _remote.update({"cost_today": cost, "limit": data.get("limit"), "updated": time.time(), "error": None})
+        print(f"[METRICS] AIPipe cost today: ${cost:.4f} / ${data.get('limit')}")
+    except Exception as e:
+        with _lock:
+            _remote["error"] = str(e)
+
+
+def _maybe_refresh() -> None:
+    """Refresh the remote usage figures in the background, at most once per interval."""
+    global _refresh_started
+    if not AIPIPE_API_KEY or USAGE_REFRESH_INTERVAL <= 0:
+        return
+    with _lock:
+        if time.time() - _refresh_started < USAGE_REFRESH_INTERVAL:
+            return
+        _refresh_started = time.time()
+    threading.Thread(target=_refresh_remote, name="usage-refresh", daemon=True).start()
+
+
+def remote_usage() -> Dict:
+    """Last AIPipe cost/limit figures ({"cost_today", "limit", "updated", "error"})."""
+    with _lock:
+        return dict(_remote)
+
+
+def snapshot() -> Dict:
+    """Per-day and per-task aggregates, recent calls and the last remote usage figures."""
+    with _lock:
+        return {
+            "remote": dict(_remote),
+            "days": {day: _view(agg) for day, agg in _by_day.items()},
+            "tasks": {task: _view(agg) for task, agg in reversed(_by_task.items())},
+            "recent": list(_recent)[-20:],
+        }
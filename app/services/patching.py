@@ -0,0 +1,195 @@
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+# Minimum similarity for a fuzzy context match to be accepted
+FUZZY_THRESHOLD = 0.85
+# Minimum similarity of the first and last lines of a fuzzy match to those of the block
+_ANCHOR_THRESHOLD = 0.75
+# Fuzzy windows range from this many lines fewer to this many more than the block
+_WINDOW_SHRINK, _WINDOW_GROW = 2, 4
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _norm(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _brackets(lines: List[str]) -> Tuple[int, int, int]:
+    """Net (), [] and {} nesting of some lines."""
+    text = "\n".join(lines)
+    return (text.count("(") - text.count(")"), text.count("[") - text.count("]"),
+            text.count("{") - text.count("}"))
+
+
+def _anchored(window: List[str], block: List[str]) -> bool:
+    """Whether a window starts and ends like the block, i.e. covers all of it."""
+    return all(
+        SequenceMatcher(None, _norm(w), _norm(b), autojunk=False).ratio() >= _ANCHOR_THRESHOLD
+        for w, b in ((window[0], block[0]), (window[-1], block[-1]))
+    )
+
+
+def _locate(lines: List[str], block: List[str], expected: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """Find where block occurs in lines; returns (start, number of lines).
+
+    Tries an exact match, then a whitespace-insensitive match, then a fuzzy
+    match over windows a few lines shorter or longer than the block (the
+    region may hold lines the block lacks, such as comments). A fuzzy window
+    must start and end like the block. With an expected position the nearest
+    candidate wins; without one the match must be unique so an edit never
+    lands in the wrong place.
+    """
+    n = len(block)
+    if n == 0:
+        return None if expected is None else (expected, 0)
+    last = len(lines) - n + 1
+
+    for key in (lambda l: l, _norm):
+        target = [key(l) for l in block]
+        first = target[0]
+        hits = [
+            i for i in range(max(last, 0))
+            if key(lines[i]) == first and [key(l) for l in lines[i:i + n]] == target
+        ]
+        if hits:
+            if expected is not None:
+                return min(hits, key=lambda i: abs(i - expected)), n
+            if len(hits) == 1:
+                return hits[0], n
+            return None
+
+    # Fuzzy: best window by similarity of normalised text
+    target_text = "\n".join(_norm(l) for l in block)
+    normed = [_norm(l) for l in lines]
+    candidates = []
+    for size in range(max(n - _WINDOW_SHRINK, 1), n + _WINDOW_GROW + 1):
+        for i in range(max(len(lines) - size + 1, 0)):
+            matcher = SequenceMatcher(None, "\n".join(normed[i:i + size]), target_text, autojunk=False)
+            if matcher.real_quick_ratio() < FUZZY_THRESHOLD or matcher.quick_ratio() < FUZZY_THRESHOLD:
+                continue
+            ratio = matcher.ratio()
+            if ratio < FUZZY_THRESHOLD or not _anchored(lines[i:i + size], block):
+                continue
+            if expected is not None:
+                # Prefer the nearest of near-equal candidates
+                ratio -= abs(i - expected) * 1e-6
+            candidates.append((ratio, i, size))
+    if not candidates:
+        return None
+    best_ratio, start, size = max(candidates)
+    if expected is None:
+        # Other window sizes at the same spot are the same candidate, not a rival
+        runner_up = max((c[0] for c in candidates if abs(c[1] - start) >= n), default=0.0)
+        if best_ratio - runner_up < 0.02:
+            return None
+    return start, size
+
+
+def apply_search_replace(content: str, search: str, replace: str) -> Optional[str]:
+    """Apply one search/replace edit block. Returns None if it cannot be applied."""
+    if not search.strip():
+        return None
+    count = content.count(search)
+    if count == 1:
+        return content.replace(search, replace, 1)
+    if count > 1:
+        return None
+
+    lines = content.split("\n")
+    block = search.strip("\n").split("\n")
+    found = _locate(lines, block)
+    if found is None:
+        return None
+    pos, span = found
+    # A fuzzy match that does not nest like the block would leave stray or missing brackets
+    if _brackets(lines[pos:pos + span]) != _brackets(block):
+        return None
+    lines[pos:pos + span] = replace.strip("\n").split("\n") if replace.strip("\n") else []
+    return "\n".join(lines)
+
+
+def _parse_hunks(diff: str) -> List[Tuple[int, List[str], List[str]]]:
+    hunks = []
+    current = None
+    for line in diff.split("\n"):
+        m = _HUNK_RE.match(line)
+        if m:
+            current = (int(m.group(1)), [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("---", "+++")):
+            continue
+        if line.startswith("+"):
+            current[2].append(line[1:])
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current[1].append(line[1:])
+            current[2].append(line[1:])
+        # "\ No newline at end of file" and other noise are ignored
+    return hunks
+
+
+def apply_unified_diff(content: str, diff: str) -> Optional[str]:
+    """Apply a unified diff with fuzzy context matching. Returns None on failure."""
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        return None
+    lines = content.split("\n")
+    offset = 0
+    for old_start, old, new in hunks:
+        # Trailing blank context lines are often mangled by models; drop them
+        while old and new and old[-1] == "" and new[-1] == "":
+            old.pop()
+            new.pop()
+        expected = max(old_start - 1 + offset, 0)
+        found = _locate(lines, old, min(expected, len(lines)))
+        if found is None:
+            return None
+        pos, span = found
+        if _brackets(lines[pos:pos + span]) != _brackets(old):
+            return None
+        lines[pos:pos + span] = new
+        offset += len(new) - span
+    return "\n".join(lines)
+
+
+def apply_edits(files: List[Dict], edits: List[Dict]) -> Tuple[List[Dict], Set[str]]:
+    """Apply edit blocks to files.
+
+    Each edit is {"path", "search", "replace"} or {"path", "diff"}. A new file
+    can be created with an empty "search". All edits for a path must apply or
+    the path is left untouched and reported as failed.
+
+    Returns (updated files, paths that failed to apply).
+    """
+    contents = {f.get("path"): f.get("content", "") for f in files}
+    order = [f.get("path") for f in files]
+    by_path: Dict[str, List[Dict]] = {}
+    for edit in edits or []:
+        path = edit.get("path")
+        if path:
+            by_path.setdefault(path, []).append(edit)
+
+    failed: Set[str] = set()
+    for path, path_edits in by_path.items():
+        content = contents.get(path)
+        for edit in path_edits:
+            if "diff" in edit:
+                content = apply_unified_diff(content, edit["diff"]) if content is not None else None
+            elif content is None and not edit.get("search", "").strip():
+                content = edit.get("replace", "")
+            elif content is not None:
+                content = apply_search_replace(content, edit.get("search", ""), edit.get("replace", ""))
+            if content is None:
+                break
+        if content is None:
+            failed.add(path)
+            continue
+        if path not in contents:
+            order.append(path)
+        contents[path] = content
+
+    return [{"path": p, "content": contents[p]} for p in order], failed
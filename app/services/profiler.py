@@ -0,0 +1,287 @@
+import csv
+import json
+import re
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+try:
+    # Vectorized numeric columns when NumPy is installed; otherwise per-value parsing
+    import numpy as np
+except ImportError:
+    np = None
+
+# Rows processed per batch (bounds memory for multi-MB files)
+CHUNK_ROWS = 5000
+# Distinct values tracked per column before reporting "N+"
+DISTINCT_LIMIT = 1000
+# Columns with at most this many distinct values list them all
+ENUM_LIMIT = 8
+
+_NULLS = {"", "null", "none", "nan", "na", "n/a", "-"}
+_BOOLS = {"true", "false", "yes", "no"}
+_INT_RE = re.compile(r"[-+]?\d+")
+_FLOAT_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?|\d{1,2}/\d{1,2}/\d{2,4}")
+
+CSV_MIMES = ("text/csv", "application/csv", "text/comma-separated-values")
+JSON_MIMES = ("application/json", "text/json")
+
+
+def _fmt(x) -> str:
+    if isinstance(x, float):
+        return f"{x:.6g}"
+    return str(x)
+
+
+class _Column:
+    """Running statistics of one CSV column."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.types: Dict[str, int] = {}
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.numeric = 0
+        self.distinct = set()
+        self.distinct_overflow = False
+        self.examples: List[str] = []
+
+    def _count(self, kind: str, n: int = 1) -> None:
+        self.types[kind] = self.types.get(kind, 0) + n
+
+    def _track(self, values: List[str]) -> None:
+        if not self.distinct_overflow:
+            self.distinct.update(values)
+            if len(self.distinct) > DISTINCT_LIMIT:
+                self.distinct_overflow = True
+                self.distinct = set(islice(self.distinct, DISTINCT_LIMIT))
+        for v in values:
+            if len(self.examples) >= 3:
+                break
+            if v not in self.examples:
+                self.examples.append(v)
+
+    def _bound(self, lo, hi) -> None:
+        self.min = lo if self.min is None or lo < self.min else self.min
+        self.max = hi if self.max is None or hi > self.max else self.max
+
+    def add(self, values: List[str]) -> None:
+        self.rows += len(values)
+        present = [v for v in values if v.lower() not in _NULLS]
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        self._track(present)
+
+        # Fast path: the whole batch is numeric (the common case for data columns)
+        if np is not None and not (self.types.keys() - {"integer", "number"}):
+            try:
+                arr = np.array(present, dtype=np.float64)
+            except ValueError:
+                arr = None
+            if arr is not None and np.isfinite(arr).all():
+                ints = int(np.count_nonzero(np.char.isdigit(np.char.lstrip(np.array(present), "+-"))))
+                self._count("integer", ints)
+                self._count("number", len(present) - ints)
+                self.numeric += len(present)
+                self.total += float(arr.sum())
+                self._bound(float(arr.min()), float(arr.max()))
+                return
+
+        for v in present:
+            if _INT_RE.fullmatch(v):
+                kind, num = "integer", int(v)
+            elif _FLOAT_RE.fullmatch(v):
+                kind, num = "number", float(v)
+            elif _DATE_RE.fullmatch(v):
+                kind, num = "date", None
+            elif v.lower() in _BOOLS:
+                kind, num = "boolean", None
+            else:
+                kind, num = "string", None
+            self._count(kind)
+            if num is not None:
+                self.numeric += 1
+                self.total += num
+                if "date" not in self.types:
+                    self._bound(num, num)
+            elif kind == "date" and not self.numeric:
+                # ISO dates order correctly as strings
+                self._bound(v, v)
+
+    def kind(self) -> str:
+        kinds = set(self.types)
+        if not kinds:
+            return "empty"
+        if kinds <= {"integer"}:
+            return "integer"
+        if kinds <= {"integer", "number"}:
+            return "number"
+        if len(kinds) == 1:
+            return kinds.pop()
+        return "string (mixed)" if "string" not in kinds else "string"
+
+    def describe(self) -> str:
+        kind = self.kind()
+        parts = [f"{self.name}: {kind}"]
+        if self.nulls:
+            parts.append(f"{self.nulls / self.rows:.0%} null")
+        if kind in ("integer", "number") and self.numeric:
+            parts.append(f"min {_fmt(self.min)} max {_fmt(self.max)} mean {_fmt(self.total / self.numeric)}")
+        elif kind == "date" and self.min is not None:
+            parts.append(f"{self.min} .. {self.max}")
+        distinct = f"{DISTINCT_LIMIT}+" if self.distinct_overflow else str(len(self.distinct))
+        if not self.distinct_overflow and 0 < len(self.distinct) <= ENUM_LIMIT and kind not in ("integer", "number"):
+            parts.append(f"{distinct} distinct: " + ", ".join(sorted(self.distinct)))
+        else:
+            parts.append(f"{distinct} distinct")
+            if self.examples and kind not in ("integer", "number"):
+                parts.append("e.g. " + ", ".join(repr(e) for e in self.examples))
+        return " | ".join(parts)
+
+
+def _iter_lines(text: str) -> Iterator[str]:
+    """Lines of text with their line endings, sliced one at a time (the text is never copied whole)."""
+    start, n = 0, len(text)
+    while start < n:
+        end = text.find("\n", start)
+        end = n if end < 0 else end + 1
+        yield text[start:end]
+        start = end
+
+
+def profile_csv(text: str, sample_rows: int = 3) -> str:
+    """Compact profile of a CSV file: row count, and per column the inferred
+    type, null rate, min/max, distinct count and examples. One pass over the
+    rows in batches of CHUNK_ROWS."""
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(_iter_lines(text), dialect)
+    header = next(reader, None)
+    if not header:
+        return "CSV: empty file"
+    header = [h.strip() or f"column_{i + 1}" for i, h in enumerate(header)]
+    columns = [_Column(h) for h in header]
+    rows = 0
+    samples: List[List[str]] = []
+
+    while True:
+        batch = [r for r in islice(reader, CHUNK_ROWS) if r]
+        if not batch:
+            break
+        rows += len(batch)
+        if len(samples) < sample_rows:
+            samples.extend(batch[:sample_rows - len(samples)])
+        for i, col in enumerate(columns):
+            col.add([r[i].strip() if i < len(r) else "" for r in batch])
+
+    delimiter = "\\t" if dialect.delimiter == "\t" else dialect.delimiter
+    lines = [f"CSV: {rows} rows x {len(columns)} columns, delimiter '{delimiter}', header: {dialect.delimiter.join(header)}"]
+    lines += [f"- {col.describe()}" for col in columns]
+    if samples:
+        lines.append("First rows:")
+        lines += [dialect.delimiter.join(r) for r in samples]
+    return "\n".join(lines)
+
+
+def _new_node() -> Dict:
+    return {"count": 0, "types": {}, "keys": {}, "items": None, "min": None, "max": None, "lengths": None, "values": set(), "overflow": False}
+
+
+def _add(node: Dict, value) -> None:
+    node["count"] += 1
+    if value is None:
+        kind = "null"
+    elif isinstance(value, bool):
+        kind = "boolean"
+    elif isinstance(value, (int, float)):
+        kind = "integer" if isinstance(value, int) else "number"
+        node["min"] = value if node["min"] is None else min(node["min"], value)
+        node["max"] = value if node["max"] is None else max(node["max"], value)
+    elif isinstance(value, str):
+        kind = "date" if _DATE_RE.fullmatch(value) else "string"
+        if not node["overflow"]:
+            node["values"].add(value[:40])
+            node["overflow"] = len(node["values"]) > ENUM_LIMIT
+    elif isinstance(value, dict):
+        kind = "object"
+        for k, v in value.items():
+            _add(node["keys"].setdefault(k, _new_node()), v)
+    else:
+        kind = "array"
+        lo, hi = node["lengths"] or (len(value), len(value))
+        node["lengths"] = (min(lo, len(value)), max(hi, len(value)))
+        if node["items"] is None:
+            node["items"] = _new_node()
+        for item in value:
+            _add(node["items"], item)
+    node["types"][kind] = node["types"].get(kind, 0) + 1
+
+
+def _render(node: Dict, name: str, parent_count: int, depth: int, lines: List[str]) -> None:
+    kinds = [k for k in node["types"] if k != "null"] or ["null"]
+    if set(kinds) == {"integer", "number"}:
+        kinds = ["number"]
+    optional = "?" if node["count"] < parent_count else ""
+    nullable = " (nullable)" if "null" in node["types"] and kinds != ["null"] else ""
+    desc = "|".join(kinds)
+    if "array" in kinds:
+        lo, hi = node["lengths"]
+        desc = desc.replace("array", f"array[{lo}]" if lo == hi else f"array[{lo}..{hi}]")
+    if node["min"] is not None:
+        desc += f" {_fmt(node['min'])}..{_fmt(node['max'])}"
+    if node["values"] and not node["overflow"] and set(kinds) <= {"string", "date"}:
+        desc += " one of: " + ", ".join(json.dumps(v) for v in sorted(node["values"]))
+    elif node["values"] and set(kinds) <= {"string", "date"}:
+        desc += " e.g. " + ", ".join(json.dumps(v) for v in sorted(node["values"])[:2])
+    lines.append(f"{'  ' * depth}{name}{optional}: {desc}{nullable}")
+    if depth >= 6:
+        return
+    objects = node["types"].get("object", 0)
+    for i, (key, child) in enumerate(node["keys"].items()):
+        if i >= 40:
+            lines.append(f"{'  ' * (depth + 1)}... {len(node['keys']) - 40} more keys")
+            break
+        _render(child, f".{key}", objects, depth + 1, lines)
+    if node["items"] is not None and node["items"]["count"]:
+        _render(node["items"], "[]", node["items"]["count"], depth + 1, lines)
+
+
+def profile_json(text: str) -> str:
+    """Inferred schema of a JSON document: types, optional keys (?), array
+    lengths, numeric ranges and enum-like string values, merged across all
+    array items."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        return f"JSON: invalid ({e})"
+    root = _new_node()
+    _add(root, data)
+    lines = ["JSON schema (? = optional key):"]
+    _render(root, "root", 1, 0, lines)
+    return "\n".join(lines)
+
+
+def is_csv(path: str, mime: Optional[str]) -> bool:
+    return (mime or "").lower() in CSV_MIMES or (path or "").lower().endswith(".csv")
+
+
+def is_json(path: str, mime: Optional[str]) -> bool:
+    return (mime or "").lower() in JSON_MIMES or (path or "").lower().endswith(".json")
+
+
+def profile_attachment(path: str, mime: Optional[str], content: str) -> Optional[str]:
+    """Profile a decoded CSV/JSON attachment, or None for other files."""
+    try:
+        if is_csv(path, mime):
+            return profile_csv(content)
+        if is_json(path, mime):
+            return profile_json(content)
+    except Exception as e:
+        print(f"[PROFILE] ⚠️ Could not profile {path}: {e}")
+    return None
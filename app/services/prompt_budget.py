@@ -0,0 +1,218 @@
+import re
+from typing import Dict, List, Tuple
+
+try:
+    # Exact counts when tiktoken is installed; otherwise a local estimate
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|\s+|[^\sA-Za-z\d]")
+_ID_RE = re.compile(r"""#([A-Za-z][\w-]*)|id\s*=\s*['"]([\w-]+)['"]""")
+_CLASS_RE = re.compile(r"""\.([A-Za-z][\w-]*)|class\s*=\s*['"]([\w -]+)['"]""")
+_FILE_RE = re.compile(r"\b[\w-]+\.(?:html|css|js|json|csv|md|txt|png|jpg|svg)\b", re.I)
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z-]{3,}")
+_STOPWORDS = {
+    "with", "that", "this", "from", "have", "page", "should", "must", "each",
+    "when", "into", "only", "show", "shows", "display", "displays", "using",
+    "element", "elements", "contains", "file", "files", "make", "create",
+    "also", "least", "more", "than", "will", "your", "they", "them", "their",
+    "there", "which", "what", "would", "could", "about", "after", "before",
+}
+
+_BLOCK_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_HTML_COMMENT_RE = re.compile(r"<!--(?! Generated:).*?-->", re.S)
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally (tiktoken if installed, otherwise a BPE-like estimate)."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    n = 0
+    for tok in _TOKEN_RE.findall(text):
+        c = tok[0]
+        if c.isalpha():
+            n += (len(tok) + 3) // 4
+        elif c.isspace():
+            # A single space merges with the following word
+            n += 0 if tok == " " else 1
+        else:
+            n += 1
+    return n
+
+
+def extract_keywords(brief: str, checks: List[str]) -> Dict[str, float]:
+    """Weighted keywords referenced by the brief and checks (IDs > classes/files > words)."""
+    text = "\n".join([brief or ""] + list(checks or []))
+    keywords: Dict[str, float] = {}
+
+    def add(word: str, weight: float):
+        if word:
+            keywords[word] = max(keywords.get(word, 0.0), weight)
+
+    for m in _ID_RE.finditer(text):
+        add(m.group(1) or m.group(2), 5.0)
+    for m in _CLASS_RE.finditer(text):
+        for cls in (m.group(1) or m.group(2) or "").split():
+            if not _FILE_RE.fullmatch(f"x.{cls}"):
+                add(cls, 3.0)
+    for m in _FILE_RE.finditer(text):
+        add(m.group(0), 3.0)
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        if lower not in _STOPWORDS:
+            add(lower, 1.0)
+    return keywords
+
+
+def score_text(text: str, keywords: Dict[str, float]) -> float:
+    """Relevance of a piece of code to the keywords."""
+    lower = text.lower()
+    score = 0.0
+    for word, weight in keywords.items():
+        if weight >= 3.0:
+            if word in text:
+                score += weight
+        elif word in lower:
+            score += weight
+    return score
+
+
+def minify(path: str, content: str) -> str:
+    """Strip comments and blank lines while keeping indentation and code intact."""
+    lower = path.lower()
+    if lower.endswith((".css", ".js")):
+        content = _BLOCK_COMMENT_RE.sub("", content)
+    if lower.endswith(".js"):
+        content = "\n".join(l for l in content.split("\n") if not l.lstrip().startswith("//"))
+    if lower.endswith(".html"):
+        content = _HTML_COMMENT_RE.sub("", content)
+    return "\n".join(l.rstrip() for l in content.split("\n") if l.strip())
+
+
+def split_regions(content: str, max_lines: int = 40) -> List[str]:
+    """Split code into regions at block boundaries (blank lines, closing braces/tags)."""
+    lines = content.split("\n")
+    regions, start = [], 0
+    for i in range(1, len(lines)):
+        prev = lines[i - 1].rstrip()
+        indent = len(lines[i]) - len(lines[i].lstrip())
+        boundary = not prev.strip() or (indent <= 4 and lines[i].strip() and prev.endswith(("}", "};", ">")))
+        if (boundary and i - start >= 3) or i - start >= max_lines:
+            regions.append("\n".join(lines[start:i]))
+            start = i
+    regions.append("\n".join(lines[start:]))
+    return regions
+
+
+def _elision_marker(lines: int) -> str:
+    return f"... [{lines} lines elided - unchanged] ..."
+
+
+def fit_files(
+    files: List[Dict],
+    brief: str,
+    checks: List[str],
+    budget: int,
+    elide_regions: bool = True,
+    minify_files: bool = True,
+) -> Tuple[List[Dict], Dict]:
+    """Shrink previous-round files until they fit a token budget.
+
+    Least relevant files are minified first (unless minify_files is False),
+    then (with elide_regions) their least relevant regions are replaced by
+    markers; otherwise whole files are omitted. Callers that apply edits to
+    the original files pass minify_files=False, since a "search" block
+    copied from minified code no longer matches the original. Returns (files, stats) where each file gets a "note" describing
+    what was done ("", "minified", "elided N regions" or "omitted").
+    """
+    keywords = extract_keywords(brief, checks)
+    entries = []
+    for f in files:
+        path = f.get("path", "unknown")
+        content = f.get("content", "") or ""
+        score = score_text(content, keywords) + (10.0 if path in keywords else 0.0)
+        entries.append({"path": path, "content": content, "score": score, "note": "", "tokens": count_tokens(content)})
+
+    stats = {"original": sum(e["tokens"] for e in entries), "budget": budget}
+
+    def total() -> int:
+        return sum(e["tokens"] for e in entries)
+
+    ranked = sorted(entries, key=lambda e: (e["score"], -e["tokens"]))
+
+    # Stage 1: minify the least relevant files first
+    for e in ranked if minify_files else []:
+        if total() <= budget:
+            break
+        minified = minify(e["path"], e["content"])
+        if minified != e["content"]:
+            e["content"] = minified
+            e["tokens"] = count_tokens(minified)
+            e["note"] = "minified"
+
+    # Stage 2: elide irrelevant regions (patch mode) or omit whole files
+    if total() > budget and elide_regions:
+        marker_tokens = count_tokens(_elision_marker(100))
+
+        def region_tokens(e: Dict) -> int:
+            # Kept regions plus one marker per run of elided regions
+            n, prev_kept = 0, True
+            for _text, _score, tokens, kept in e["regions"]:
+                if kept:
+                    n += tokens
+                elif prev_kept:
+                    n += marker_tokens
+                prev_kept = kept
+            return n
+
+        regions = []
+        for e in entries:
+            e["regions"] = [[r, score_text(r, keywords), count_tokens(r), True] for r in split_regions(e["content"])]
+            regions.extend((r[1], -r[2], id(r), e, r) for r in e["regions"])
+        for _score, _neg_tokens, _, e, region in sorted(regions, key=lambda x: x[:3]):
+            if total() <= budget:
+                break
+            region[3] = False
+            e["tokens"] = region_tokens(e)
+        for e in entries:
+            # Consecutive elided regions collapse into a single marker
+            parts, elided, run = [], 0, 0
+            for text, _score, _tokens, kept in e.pop("regions"):
+                if kept:
+                    if run:
+                        parts.append(_elision_marker(run))
+                        run = 0
+                    parts.append(text)
+                else:
+                    elided += 1
+                    run += text.count("\n") + 1
+            if run:
+                parts.append(_elision_marker(run))
+            if elided:
+                e["content"] = "\n".join(parts)
+                e["note"] = f"elided {elided} regions"
+    elif total() > budget:
+        for e in ranked:
+            if total() <= budget:
+                break
+            e["content"] = ""
+            e["tokens"] = 0
+            e["note"] = "omitted"
+
+    stats["final"] = total()
+    return [{"path": e["path"], "content": e["content"], "note": e["note"]} for e in entries], stats
+
+
+def log_breakdown(sections: Dict[str, str], budget: int) -> int:
+    """Print the token count of each prompt section and return the total."""
+    counts = {name: count_tokens(text) for name, text in sections.items()}
+    total = sum(counts.values())
+    parts = ", ".join(f"{name}={n}" for name, n in counts.items())
+    flag = "✅" if total <= budget else "⚠️ over budget"
+    print(f"[LLM PROMPT] {parts} | total={total} / {budget} {flag}")
+    return total
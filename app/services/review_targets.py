@@ -0,0 +1,214 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from services.checks import cross_reference_issues, parse_html, script_id_references, select
+from services.prompt_budget import extract_keywords, score_text, split_regions
+
+# Suspicious regions sent per file (highest-priority first)
+MAX_REGIONS_PER_FILE = 8
+
+_FUNC_DEF_RE = re.compile(r"\bfunction\s+([A-Za-z_$][\w$]*)|\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|[\w$]+\s*=>)")
+_LISTEN_RE = re.compile(r"""addEventListener\(\s*['"]([\w:-]+)['"]""")
+_FETCH_RE = re.compile(r"""fetch\(\s*['"`]([^'"`$]+)['"`]""")
+_HANDLER_RE = re.compile(r"""\bon(\w+)\s*=\s*["']\s*([A-Za-z_$][\w$]*)\s*\(""")
+_STRING_OR_COMMENT_RE = re.compile(r"""//[^\n]*|/\*.*?\*/|'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*"|`(?:\\.|[^`\\])*`""", re.S)
+_ID_LOOKUP_TEMPLATE = r"""getElementById\(\s*['"]{0}['"]|querySelector(?:All)?\(\s*['"]#{0}['"]"""
+_JS_BUILTINS = {"alert", "confirm", "prompt", "event", "window", "document", "console", "this", "history", "location", "return"}
+
+
+def _line_of(content: str, pos: int) -> int:
+    return content.count("\n", 0, pos)
+
+
+def _first_line(content: str, pattern: str, flags: int = 0) -> Optional[int]:
+    m = re.search(pattern, content, flags)
+    return _line_of(content, m.start()) if m else None
+
+
+def _is_local(ref: str) -> bool:
+    return bool(ref) and not re.match(r"^(https?:)?//|^data:|^blob:", ref)
+
+
+def _short(items: List[str], limit: int = 30) -> str:
+    if not items:
+        return "-"
+    more = f" (+{len(items) - limit} more)" if len(items) > limit else ""
+    return " ".join(items[:limit]) + more
+
+
+def artifact_index(files: List[Dict]) -> str:
+    """Compact summary of what every file defines and references.
+
+    HTML: element ids, classes, scripts, stylesheets and inline handlers.
+    JavaScript: ids looked up, functions defined, events listened to,
+    fetched files and timers. CSS: rule count, ids and classes styled.
+    Lets the reviewer check cross-file consistency without the full code.
+    """
+    lines = []
+    for f in files:
+        path, content = f.get("path", ""), f.get("content", "") or ""
+        lower = path.lower()
+        if lower.endswith(".html"):
+            dom = parse_html(content)
+            ids = [f"#{n.attrs['id']}" for n in dom.iter() if n.attrs.get("id")]
+            classes = sorted({f".{c}" for n in dom.iter() for c in n.classes})
+            scripts = [n.attrs["src"] for n in select(dom, "script[src]")]
+            styles = [n.attrs["href"] for n in select(dom, "link[href]") if "stylesheet" in n.attrs.get("rel", "")]
+            handlers = sorted({f"on{m.group(1)}={m.group(2)}()" for m in _HANDLER_RE.finditer(content)})
+            lines.append(f"{path}: ids {_short(ids)}; classes {_short(classes)}; scripts {_short(scripts)}; "
+                         f"stylesheets {_short(styles)}; inline handlers {_short(handlers)}")
+        elif lower.endswith(".js"):
+            defs = [next(g for g in m.groups() if g) for m in _FUNC_DEF_RE.finditer(content)]
+            lookups = [f"#{i}" for i in script_id_references(content)]
+            events = sorted(set(_LISTEN_RE.findall(content)))
+            fetches = sorted(set(_FETCH_RE.findall(content)))
+            timers = [f"{t} x{content.count(t + '(')}" for t in ("setInterval", "clearInterval", "setTimeout") if t + "(" in content]
+            lines.append(f"{path}: looks up {_short(lookups)}; defines {_short(defs)}; listens {_short(events)}; "
+                         f"fetches {_short(fetches)}; timers {_short(timers)}")
+        elif lower.endswith(".css"):
+            rules = content.count("{") - content.count("@media")
+            selectors = re.sub(r"\{[^{}]*\}", "{}", content)
+            ids = sorted(set(re.findall(r"#([A-Za-z][\w-]*)", selectors)))
+            classes = sorted(set(re.findall(r"\.([A-Za-z][\w-]*)", selectors)))
+            lines.append(f"{path}: {rules} rules; ids {_short(['#' + i for i in ids])}; classes {_short(['.' + c for c in classes])}")
+        else:
+            lines.append(f"{path}: {content.count(chr(10)) + 1} lines")
+    return "\n".join(lines)
+
+
+def _html_anchor(content: str) -> int:
+    """Line where missing elements would be added (end of main content)."""
+    for pattern in (r"</main>", r"<script\b[^>]*src=", r"</body>"):
+        line = _first_line(content, pattern, re.I)
+        if line is not None:
+            return line
+    return content.count("\n")
+
+
+def find_suspicious(files: List[Dict], failed: Optional[List[Dict]] = None, extra_paths: Optional[List[str]] = None) -> List[Dict]:
+    """Locate likely bugs with cheap local analysis.
+
+    Returns findings {"path", "line", "detail"} (0-based line): script lookups
+    of ids no element has, inline handlers calling undefined functions,
+    scripts in <head> without defer that touch the DOM at load, intervals
+    that are never cleared, fetches of files that do not exist, unbalanced
+    brackets, and the failing checks in `failed` anchored to the file most
+    likely to fix them.
+    """
+    by_path = {f.get("path", ""): f.get("content", "") or "" for f in files}
+    html_path = "index.html" if "index.html" in by_path else next((p for p in by_path if p.endswith(".html")), None)
+    js_paths = [p for p in by_path if p.endswith(".js")]
+    known = set(by_path) | set(extra_paths or [])
+    findings: List[Dict] = []
+
+    def add(path: str, line: Optional[int], detail: str) -> None:
+        if path in by_path:
+            findings.append({"path": path, "line": line if line is not None else by_path[path].count("\n"), "detail": detail})
+
+    defined = set()
+    for p in js_paths:
+        defined.update(next(g for g in m.groups() if g) for m in _FUNC_DEF_RE.finditer(by_path[p]))
+
+    for p in js_paths:
+        js = by_path[p]
+        if "setInterval(" in js and "clearInterval(" not in js:
+            for m in re.finditer(r"setInterval\(", js):
+                add(p, _line_of(js, m.start()), "setInterval is never cleared (duplicate timers when restarted)")
+        for m in _FETCH_RE.finditer(js):
+            ref = m.group(1).split("?")[0].lstrip("./")
+            if _is_local(m.group(1)) and ref not in known:
+                add(p, _line_of(js, m.start()), f"fetches {m.group(1)} which is not among the files")
+        code = _STRING_OR_COMMENT_RE.sub('""', js)
+        for open_c, close_c in ("{}", "()", "[]"):
+            if code.count(open_c) != code.count(close_c):
+                add(p, None, f"unbalanced {open_c}{close_c}: {code.count(open_c)} opened, {code.count(close_c)} closed")
+
+    if html_path:
+        html = by_path[html_path]
+        for m in _HANDLER_RE.finditer(html):
+            name = m.group(2)
+            if js_paths and name not in defined and name not in _JS_BUILTINS:
+                add(html_path, _line_of(html, m.start()), f"on{m.group(1)} calls {name}() but no script defines it")
+        dom = parse_html(html)
+        head = next((n for n in dom.iter() if n.tag == "head"), None)
+        for node in select(head, "script[src]") if head is not None else []:
+            src = node.attrs["src"].lstrip("./")
+            if src in js_paths and "defer" not in node.attrs and node.attrs.get("type") != "module" \
+                    and "DOMContentLoaded" not in by_path[src] and script_id_references(by_path[src]):
+                add(html_path, _first_line(html, re.escape(node.attrs["src"])),
+                    f"{src} is loaded in <head> without defer and looks up elements outside DOMContentLoaded")
+
+    xref = cross_reference_issues(files, extra_paths=extra_paths)
+    xref_details = {issue["detail"] for issue in xref}
+    for issue in xref:
+        elem = re.match(r"Element #([\w-]+)", issue["check"])
+        if elem and html_path:
+            where = [
+                f"{p} line {_line_of(by_path[p], m.start()) + 1}"
+                for p in js_paths for m in re.finditer(_ID_LOOKUP_TEMPLATE.format(re.escape(elem.group(1))), by_path[p])
+            ]
+            add(html_path, _html_anchor(by_path[html_path]), f"{issue['detail']} ({', '.join(where[:3]) or 'script'})")
+        elif html_path:
+            ref = issue["detail"].split(" references ")[-1].split(" but ")[0]
+            add(html_path, _first_line(by_path[html_path], re.escape(ref)), issue["detail"])
+
+    for result in failed or []:
+        text = f"{result['check']} -> {result['detail']}"
+        if "README" in text and "README.md" in by_path:
+            path = "README.md"
+        elif "JavaScript" in result["detail"] and js_paths:
+            path = js_paths[0]
+        else:
+            path = html_path or (js_paths[0] if js_paths else None)
+        if not path:
+            continue
+        if result["detail"] in xref_details:
+            continue
+        add(path, _html_anchor(by_path[path]) if path == html_path else None, f"failing check: {text}")
+        # Regions that mention what the check is about give the reviewer the context to fix it
+        keywords = extract_keywords(result["check"], [])
+        for candidate in [html_path] + js_paths:
+            if not candidate:
+                continue
+            offset, best = 0, None
+            for region in split_regions(by_path[candidate]):
+                score = score_text(region, {k: w for k, w in keywords.items() if w >= 3.0})
+                if score and (best is None or score > best[0]):
+                    best = (score, offset)
+                offset += region.count("\n") + 1
+            if best:
+                add(candidate, best[1], f"related to failing check: {result['check']}")
+    return findings
+
+
+def review_shards(files: List[Dict], findings: List[Dict], max_regions: int = MAX_REGIONS_PER_FILE) -> List[Dict]:
+    """Group findings by file and cut out the regions that contain them.
+
+    Returns one shard per file: {"path", "findings", "regions"} where regions
+    are (first line, last line, text) with 1-based line numbers, in file
+    order. Only files with findings get a shard.
+    """
+    by_path = {f.get("path", ""): f.get("content", "") or "" for f in files}
+    shards = []
+    for path in by_path:
+        path_findings = [f for f in findings if f["path"] == path]
+        if not path_findings:
+            continue
+        spans: List[Tuple[int, int, str]] = []
+        offset = 0
+        for region in split_regions(by_path[path]):
+            n = region.count("\n") + 1
+            spans.append((offset, offset + n - 1, region))
+            offset += n
+        wanted = []
+        for finding in path_findings:
+            for i, (start, end, _text) in enumerate(spans):
+                if start <= finding["line"] <= end and i not in wanted:
+                    wanted.append(i)
+        wanted = sorted(wanted[:max_regions])
+        shards.append({
+            "path": path,
+            "findings": path_findings,
+            "regions": [(spans[i][0] + 1, spans[i][1] + 1, spans[i][2]) for i in wanted],
+        })
+    return shards
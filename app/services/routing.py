@@ -0,0 +1,161 @@
+import json
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.context_store import transaction
+
+# Provider spec ("backend:model", e.g. "aipipe:gpt-4o-mini") for simple tasks; empty disables routing
+ROUTER_FAST_PROVIDER = os.getenv("ROUTER_FAST_PROVIDER", "")
+# Tasks scoring at or below this go to the fast provider first
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "6"))
+
+_CHART_RE = re.compile(r"chart|graph|plot|visuali[sz]", re.I)
+_INTERACTIVE_RE = re.compile(r"\bform|validat|sort|filter|search|toggle|drag|local ?storage|api\b", re.I)
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS routing_log (
+        time REAL NOT NULL,
+        task TEXT NOT NULL,
+        nonce TEXT NOT NULL,
+        round INTEGER NOT NULL,
+        score REAL NOT NULL,
+        factors TEXT NOT NULL,
+        tier TEXT NOT NULL,
+        model TEXT,
+        escalated INTEGER NOT NULL,
+        outcome TEXT NOT NULL,
+        failed INTEGER NOT NULL,
+        latency_s REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS routing_log_time ON routing_log (time)",
+]
+_schema_ready = False
+
+
+def _ensure_schema(conn) -> None:
+    global _schema_ready
+    if not _schema_ready:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        _schema_ready = True
+
+
+def complexity(brief: str, checks: List[str], attachments: List[Dict], round_num: int) -> Tuple[float, Dict[str, float]]:
+    """Complexity score of a task and the contribution of each factor.
+
+    Brief length (1 per 60 words), checks (0.5 each), attachments (1 each
+    plus a log-scaled size term; parsed attachments give their decoded
+    `size`, raw ones are sized from their URL or content), data formats (CSV/JSON +1, images +0.5),
+    charts and interactive features, and Round 2+ (+2).
+    """
+    factors: Dict[str, float] = {}
+    factors["brief"] = round(len((brief or "").split()) / 60, 2)
+    factors["checks"] = 0.5 * len(checks or [])
+    total_bytes = 0
+    kinds = set()
+    for att in attachments or []:
+        url = att.get("url") or ""
+        if att.get("size") is not None:
+            # Parsed attachments carry their decoded size (blob entries have no content)
+            total_bytes += att["size"]
+            if not isinstance(url, str):
+                url = url.header
+        elif not isinstance(url, str):
+            # Spooled upload (services.uploads): size and header are known without reading it
+            total_bytes += url.decoded_size
+            url = url.header
+        # Data URIs are ~4/3 of the decoded size
+        elif url.startswith("data:"):
+            total_bytes += len(url) * 3 // 4
+        else:
+            total_bytes += len(att.get("content") or "")
+        name = (att.get("path") or att.get("name") or "").lower()
+        mime = (att.get("mime_type") or "").lower()
+        if not mime and url.startswith("data:"):
+            mime = url[5:].split(",", 1)[0].split(";", 1)[0].lower()
+        if "csv" in mime or name.endswith(".csv"):
+            kinds.add("csv")
+        elif "json" in mime or name.endswith(".json"):
+            kinds.add("json")
+        elif mime.startswith("image/"):
+            kinds.add("image")
+    if attachments:
+        factors["attachments"] = len(attachments) + round(math.log2(1 + total_bytes / 1024) / 2, 2)
+    if kinds:
+        factors["data_types"] = sum(1.0 if k in ("csv", "json") else 0.5 for k in kinds)
+    text = "\n".join([brief or ""] + list(checks or []))
+    if _CHART_RE.search(text):
+        factors["charts"] = 1.5
+    if _INTERACTIVE_RE.search(text):
+        factors["interactive"] = 0.5 * len({m.group().lower() for m in _INTERACTIVE_RE.finditer(text)})
+    if round_num > 1:
+        factors["round"] = 2.0
+    return round(sum(factors.values()), 2), factors
+
+
+def choose_tier(score: float) -> str:
+    """"fast" when routing is enabled and the task is simple enough, else "strong"."""
+    return "fast" if ROUTER_FAST_PROVIDER and score <= ROUTER_THRESHOLD else "strong"
+
+
+def record_decision(
+    task: str,
+    nonce: str,
+    round_num: int,
+    score: float,
+    factors: Dict[str, float],
+    tier: str,
+    model: Optional[str],
+    escalated: bool,
+    outcome: str,
+    failed: int,
+    latency: float,
+) -> None:
+    """Store one generation attempt and its outcome ("pass", "fail" or "error").
+
+    A fast attempt that fails is followed by a strong attempt recorded with
+    escalated=True.
+    """
+    try:
+        with transaction() as conn:
+            _ensure_schema(conn)
+            conn.execute(
+                "INSERT INTO routing_log (time, task, nonce, round, score, factors, tier, model, escalated, outcome, failed, latency_s) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), task, nonce, round_num, score, json.dumps(factors), tier, model, int(escalated), outcome, failed, round(latency, 2)),
+            )
+    except Exception as e:
+        print(f"[ROUTER] ⚠️ Could not record decision: {e}")
+
+
+def routing_stats(days: float = 30) -> Dict:
+    """Attempt outcomes per tier and per score bucket over the last `days`, for tuning ROUTER_THRESHOLD."""
+    with transaction() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute(
+            "SELECT score, tier, escalated, outcome, latency_s FROM routing_log WHERE time >= ?",
+            (time.time() - days * 86400,),
+        ).fetchall()
+
+    tiers: Dict[str, Dict] = {}
+    buckets: Dict[str, Dict] = {}
+    for score, tier, escalated, outcome, latency in rows:
+        for group, key in ((tiers, tier), (buckets, f"{int(score // 2) * 2}-{int(score // 2) * 2 + 2}")):
+            agg = group.setdefault(key, {"attempts": 0, "passed": 0, "escalated": 0, "latency_s": 0.0})
+            agg["attempts"] += 1
+            agg["passed"] += outcome == "pass"
+            agg["escalated"] += escalated
+            agg["latency_s"] += latency
+    for group in (tiers, buckets):
+        for agg in group.values():
+            agg["pass_rate"] = round(agg["passed"] / agg["attempts"], 3)
+            agg["latency_s"] = round(agg["latency_s"] / agg["attempts"], 1)
+    return {
+        "fast_provider": ROUTER_FAST_PROVIDER or None,
+        "threshold": ROUTER_THRESHOLD,
+        "tiers": tiers,
+        "score_buckets": dict(sorted(buckets.items(), key=lambda kv: float(kv[0].split("-")[0]))),
+    }
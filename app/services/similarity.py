@@ -0,0 +1,149 @@
+import hashlib
+import random
+import re
+import time
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.context_store import transaction
+
+# MinHash signature length, split into BANDS bands of ROWS rows for LSH.
+# With 16x4 a pair at Jaccard 0.8 shares a bucket with ~99.9% probability,
+# a pair at 0.3 with ~12%.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_URL_RE = re.compile(r"https?://\S+")
+# Nonces, hashes and numbers vary between otherwise identical briefs
+_VOLATILE_RE = re.compile(r"\b(?=[a-z0-9]*\d)[a-z0-9]{8,}\b|\b\d+(?:\.\d+)?\b")
+_WORD_RE = re.compile(r"[a-z0-9#.\-_]+")
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS brief_index (
+        task TEXT NOT NULL,
+        nonce TEXT NOT NULL,
+        round INTEGER NOT NULL,
+        created REAL NOT NULL,
+        signature BLOB NOT NULL,
+        PRIMARY KEY (task, nonce, round)
+    )""",
+    """CREATE TABLE IF NOT EXISTS brief_buckets (
+        band INTEGER NOT NULL,
+        bucket TEXT NOT NULL,
+        task TEXT NOT NULL,
+        nonce TEXT NOT NULL,
+        round INTEGER NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS brief_buckets_lookup ON brief_buckets (band, bucket)",
+]
+_schema_ready = False
+
+
+def _ensure_schema(conn) -> None:
+    global _schema_ready
+    if not _schema_ready:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        _schema_ready = True
+
+
+def shingles(brief: str, checks: List[str]) -> Set[str]:
+    """Word 3-gram shingles of the normalized brief and checks."""
+    text = "\n".join([brief or ""] + list(checks or [])).lower()
+    text = _VOLATILE_RE.sub("0", _URL_RE.sub("url", text))
+    words = _WORD_RE.findall(text)
+    if len(words) < 3:
+        return set(words)
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def signature(items: Set[str]) -> List[int]:
+    """MinHash signature of a shingle set."""
+    if not items:
+        return [_PRIME] * NUM_PERM
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in items]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _buckets(sig: List[int]) -> List[Tuple[int, str]]:
+    out = []
+    for band in range(BANDS):
+        rows = array("Q", sig[band * ROWS:(band + 1) * ROWS]).tobytes()
+        out.append((band, hashlib.blake2b(rows, digest_size=8).hexdigest()))
+    return out
+
+
+def index_brief(task: str, nonce: str, round_num: int, brief: str, checks: List[str]) -> None:
+    """Add a successful generation to the index (its files live in the context store)."""
+    sig = signature(shingles(brief, checks))
+    key = (task, nonce, round_num)
+    with transaction() as conn:
+        _ensure_schema(conn)
+        conn.execute("DELETE FROM brief_buckets WHERE task = ? AND nonce = ? AND round = ?", key)
+        conn.execute(
+            "INSERT OR REPLACE INTO brief_index (task, nonce, round, created, signature) VALUES (?, ?, ?, ?, ?)",
+            key + (time.time(), array("Q", sig).tobytes()),
+        )
+        conn.executemany(
+            "INSERT INTO brief_buckets (band, bucket, task, nonce, round) VALUES (?, ?, ?, ?, ?)",
+            [(band, bucket) + key for band, bucket in _buckets(sig)],
+        )
+        # Entries whose context was evicted from the store can no longer be reused
+        conn.execute(
+            "DELETE FROM brief_index WHERE NOT EXISTS (SELECT 1 FROM contexts c WHERE c.task = brief_index.task "
+            "AND c.nonce = brief_index.nonce AND c.round = brief_index.round)"
+        )
+        conn.execute(
+            "DELETE FROM brief_buckets WHERE NOT EXISTS (SELECT 1 FROM brief_index i WHERE i.task = brief_buckets.task "
+            "AND i.nonce = brief_buckets.nonce AND i.round = brief_buckets.round)"
+        )
+    print(f"[WARM START] Indexed brief of {task}_{nonce} round {round_num}")
+
+
+def find_similar(
+    brief: str,
+    checks: List[str],
+    threshold: float,
+    exclude: Optional[Tuple[str, str]] = None,
+) -> Optional[Dict]:
+    """Most similar indexed brief at or above `threshold`, or None.
+
+    Only entries sharing at least one LSH bucket are compared, so the lookup
+    cost does not grow with the size of the index.
+    Returns {"task", "nonce", "round", "similarity"}.
+    """
+    sig = signature(shingles(brief, checks))
+    buckets = _buckets(sig)
+    with transaction() as conn:
+        _ensure_schema(conn)
+        where = " OR ".join("(b.band = ? AND b.bucket = ?)" for _ in buckets)
+        rows = conn.execute(
+            "SELECT DISTINCT i.task, i.nonce, i.round, i.signature FROM brief_buckets b "
+            "JOIN brief_index i ON i.task = b.task AND i.nonce = b.nonce AND i.round = b.round "
+            f"JOIN contexts c ON c.task = i.task AND c.nonce = i.nonce AND c.round = i.round WHERE {where}",
+            [value for pair in buckets for value in pair],
+        ).fetchall()
+
+    best = None
+    for task, nonce, round_num, blob in rows:
+        if exclude and (task, nonce) == tuple(exclude):
+            continue
+        score = similarity(sig, list(array("Q", blob)))
+        if score >= threshold and (best is None or score > best["similarity"]):
+            best = {"task": task, "nonce": nonce, "round": round_num, "similarity": score}
+    if best:
+        print(f"[WARM START] {best['task']}_{best['nonce']} matches with similarity {best['similarity']:.2f} "
+              f"({len(rows)} candidate(s) in shared buckets)")
+    elif rows:
+        print(f"[WARM START] {len(rows)} candidate(s) in shared buckets, none above {threshold}")
+    return best
@@ -0,0 +1,172 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader
+
+from services.checks import parse_html, script_id_references, select
+
+_TEMPLATE_DIR = Path(__file__).resolve().parents[1] / "templates"
+_env = Environment(
+    loader=FileSystemLoader(str(_TEMPLATE_DIR)),
+    keep_trailing_newline=True,
+    trim_blocks=False,
+    autoescape=False,
+)
+
+BASE_CSS_PATH = "base.css"
+
+# Palettes for base.css, picked deterministically per task
+_PALETTES = [
+    {"primary": "#667eea", "secondary": "#764ba2", "accent": "#f6ad55"},
+    {"primary": "#0ea5e9", "secondary": "#6366f1", "accent": "#f59e0b"},
+    {"primary": "#10b981", "secondary": "#0f766e", "accent": "#f97316"},
+    {"primary": "#f43f5e", "secondary": "#8b5cf6", "accent": "#22d3ee"},
+    {"primary": "#f59e0b", "secondary": "#ef4444", "accent": "#3b82f6"},
+]
+
+_FUNCTION_RE = re.compile(r"\bfunction\s+([A-Za-z_$][\w$]*)\s*\(|\b(?:const|let)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*=>")
+_FETCH_RE = re.compile(r"""fetch\(\s*['"`]([^'"`]+)['"`]""")
+_FILE_PURPOSES = {
+    ".html": "Page structure and markup",
+    ".css": "Styles",
+    ".js": "Application logic",
+    ".json": "Data",
+    ".csv": "Data",
+    ".md": "Documentation",
+}
+
+# Prompt addition telling the model which files are rendered locally
+TEMPLATE_PROMPT = f"""
+## FILES GENERATED AUTOMATICALLY (OVERRIDES THE FILE STRUCTURE ABOVE)
+- **README.md** is generated from the task and your code. Do NOT return README.md.
+- **{BASE_CSS_PATH}** is provided: CSS variables (--primary, --secondary, --accent, --surface, --text,
+  --muted, --border, --radius, --shadow, --transition), body gradient and typography, and ready-made classes
+  `.app-container` (1200px centered), `.app-card`, `.app-grid`, `.app-button`, `.chart-container`,
+  `.loading` (spinner), `.error-message`, `.empty-state`, styled tables/forms/buttons, and mobile breakpoints.
+  Link it in <head> BEFORE style.css: <link rel="stylesheet" href="{BASE_CSS_PATH}">
+  Use these classes, and put ONLY app-specific styles in style.css (do not repeat the base styles).
+"""
+
+
+def _palette(task: str) -> Dict[str, str]:
+    digest = hashlib.sha256((task or "").encode("utf-8")).digest()
+    return _PALETTES[digest[0] % len(_PALETTES)]
+
+
+def summarize_code(files: List[Dict]) -> Dict:
+    """Extract what the README needs from the generated code."""
+    by_path = {f.get("path"): f.get("content", "") or "" for f in files}
+    html = by_path.get("index.html", "")
+    scripts = "\n".join(c for p, c in by_path.items() if p and p.endswith(".js"))
+
+    title = None
+    ids: List[str] = []
+    libraries: List[str] = []
+    if html:
+        dom = parse_html(html)
+        titles = select(dom, "title")
+        if titles and titles[0].text.strip():
+            title = titles[0].text.strip()
+        ids = [n.attrs["id"] for n in dom.iter() if n.attrs.get("id")]
+        for node in select(dom, "script[src], link[href]"):
+            ref = node.attrs.get("src") or node.attrs.get("href")
+            if ref.startswith(("http://", "https://", "//")):
+                name = ref.split("/npm/")[-1].split("/")[0] if "/npm/" in ref else ref.split("//")[-1].split("/")[0]
+                if name not in libraries:
+                    libraries.append(name)
+        scripts += "\n" + "\n".join(n.text for n in select(dom, "script") if n.text.strip())
+
+    functions = []
+    for m in _FUNCTION_RE.finditer(scripts):
+        name = m.group(1) or m.group(2)
+        if name not in functions:
+            functions.append(name)
+
+    # Only IDs the script actually uses are worth documenting
+    used = set(script_id_references(scripts))
+    key_ids = [i for i in ids if i in used] or ids[:10]
+    data_files = []
+    for m in _FETCH_RE.finditer(scripts):
+        if m.group(1) not in data_files and not m.group(1).startswith("http"):
+            data_files.append(m.group(1))
+
+    return {"title": title, "ids": key_ids[:15], "functions": functions[:15], "libraries": libraries, "data_files": data_files}
+
+
+def _summary_from_brief(brief: str) -> str:
+    first = (brief or "").strip().split("\n\n")[0].strip()
+    return first or "A static web application."
+
+
+def render_readme(task_payload: Dict, files: List[Dict], extra_paths: Optional[List[str]] = None) -> str:
+    """Render README.md from the task metadata, checks and a summary of the code."""
+    summary = summarize_code(files)
+    task = task_payload.get("task") or "web-app"
+    nonce = task_payload.get("nonce")
+    paths = [f.get("path") for f in files if f.get("path") and f.get("path") != "README.md"]
+    for p in extra_paths or []:
+        if p not in paths:
+            paths.append(p)
+    if BASE_CSS_PATH not in paths:
+        paths.append(BASE_CSS_PATH)
+
+    file_rows = []
+    for p in paths:
+        ext = Path(p).suffix.lower()
+        purpose = "Base styles (generated)" if p == BASE_CSS_PATH else _FILE_PURPOSES.get(ext, "Asset")
+        if p == "style.css":
+            purpose = "App-specific styles"
+        file_rows.append({"path": p, "purpose": purpose})
+
+    features = [c for c in task_payload.get("checks", []) or [] if "license" not in c.lower() and "readme" not in c.lower()]
+    text = _env.get_template("README.md.j2").render(
+        title=summary["title"] or task.replace("-", " ").title(),
+        summary=_summary_from_brief(task_payload.get("brief", "")),
+        features=features,
+        repo_name=f"{task}_{nonce}" if nonce else task,
+        data_files=summary["data_files"],
+        ids=summary["ids"],
+        files=file_rows,
+        functions=summary["functions"],
+        libraries=summary["libraries"],
+    )
+    # Optional sections leave runs of blank lines behind
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
+def render_base_css(task_payload: Dict, title: Optional[str] = None) -> str:
+    """Render the shared base stylesheet for a task."""
+    task = task_payload.get("task") or "web-app"
+    return _env.get_template("base.css.j2").render(title=title or task, palette=_palette(task))
+
+
+def link_base_css(html: str) -> str:
+    """Make sure index.html links base.css before its other stylesheets."""
+    if re.search(rf"""href=['"](\./)?{re.escape(BASE_CSS_PATH)}['"]""", html):
+        return html
+    tag = f'<link rel="stylesheet" href="{BASE_CSS_PATH}">'
+    m = re.search(r"<link[^>]+rel=['\"]stylesheet['\"][^>]*>", html, re.I)
+    if m:
+        return html[:m.start()] + tag + "\n  " + html[m.start():]
+    m = re.search(r"</head>", html, re.I)
+    if m:
+        return html[:m.start()] + "  " + tag + "\n" + html[m.start():]
+    return html
+
+
+def apply_templates(task_payload: Dict, files: List[Dict], extra_paths: Optional[List[str]] = None) -> List[Dict]:
+    """Add the rendered README.md and base.css to the generated files.
+
+    Returns a new list; the given file dicts (which may be cached or stored
+    context) are never modified.
+    """
+    out = [dict(f) for f in files if f.get("path") not in ("README.md", BASE_CSS_PATH)]
+    for f in out:
+        if f.get("path") == "index.html":
+            f["content"] = link_base_css(f.get("content", ""))
+    title = summarize_code(out)["title"]
+    out.append({"path": BASE_CSS_PATH, "content": render_base_css(task_payload, title)})
+    out.append({"path": "README.md", "content": render_readme(task_payload, out, extra_paths)})
+    return out
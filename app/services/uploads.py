@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.schema import TaskRequest
+
+try:
+    # Streaming multipart parser (python-multipart, the one FastAPI uses for forms)
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    MultipartParser = None
+
+# Attachment payloads larger than this many bytes are moved out of the request into temporary files
+ATTACHMENT_SPILL_BYTES = int(os.getenv("ATTACHMENT_SPILL_BYTES", str(256 * 1024)))
+# Largest multipart upload accepted by /handle_task/upload, in bytes (0 = no limit)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(256 * 1024 * 1024)))
+# Characters written per chunk when spilling a data URI string
+_SPILL_CHUNK = 1 << 20
+# Name of the multipart field holding the task JSON
+TASK_PART = "task"
+
+
+class UploadError(ValueError):
+    """Raised for a malformed upload; `status` is the HTTP status to answer with."""
+    status = 400
+
+
+class UploadTooLargeError(UploadError):
+    status = 413
+
+
+class SpooledAttachment:
+    """Attachment payload kept in a spooled temporary file instead of a string.
+
+    Holds either a data URI as it was sent (`raw=False`) or the file's bytes
+    as uploaded (`raw=True`, with `mime`). Files past ATTACHMENT_SPILL_BYTES
+    live on disk and are deleted when the handle is closed or collected.
+    str() is "spooled:<sha256>:<size>", so job keys and logs never touch
+    the payload.
+    """
+
+    def __init__(self, mime: Optional[str] = None, raw: bool = False, header: str = ""):
+        self.file = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPILL_BYTES)
+        self.mime = mime
+        self.raw = raw
+        self.size = 0
+        # Data URI header ("data:<mime>;base64,"), so callers can tell the type without reading the file
+        self.header = f"data:{mime or 'application/octet-stream'}," if raw else header
+        self.sha256: Optional[str] = None
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> "SpooledAttachment":
+        self.sha256 = self._hash.hexdigest()
+        self.file.seek(0)
+        return self
+
+    @property
+    def decoded_size(self) -> int:
+        """Size of the file the attachment holds (base64 payloads are ~4/3 of it)."""
+        return self.size if self.raw else (self.size - len(self.header)) * 3 // 4
+
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __str__(self) -> str:
+        return f"spooled:{self.sha256}:{self.size}"
+
+    __repr__ = __str__
+
+
+def spill(url: str) -> SpooledAttachment:
+    """Write a data URI string to a SpooledAttachment, one chunk at a time."""
+    comma = url.find(",", 0, 512)
+    handle = SpooledAttachment(header=url[:comma + 1] if url.startswith("data:") and comma >= 0 else "")
+    for i in range(0, len(url), _SPILL_CHUNK):
+        handle.write(url[i:i + _SPILL_CHUNK].encode("utf-8"))
+    return handle.finish()
+
+
+def task_payload(data: TaskRequest) -> Dict:
+    """Worker payload of a validated task.
+
+    Plain fields are dumped to JSON types; attachment URLs above
+    ATTACHMENT_SPILL_BYTES are replaced by SpooledAttachment handles so the
+    payload stays small however large the attachments are. Smaller URLs are
+    passed through as the same string objects.
+    """
+    payload = data.model_dump(mode="json", exclude={"attachments"})
+    payload["attachments"] = [
+        {"name": a.name, "url": spill(a.url) if len(a.url) > ATTACHMENT_SPILL_BYTES else a.url}
+        for a in data.attachments or []
+    ]
+    return payload
+
+
+class _MultipartReader:
+    """MultipartParser callbacks: the task part is buffered, file parts are
+    written to raw SpooledAttachments as their bytes arrive, other fields are
+    ignored. `check` is called with the TaskRequest as soon as the task part
+    is complete, so a rejected task stops the upload early."""
+
+    def __init__(self, check: Optional[Callable[[TaskRequest], None]] = None):
+        self.check = check
+        self.data: Optional[TaskRequest] = None
+        self.files: List[Tuple[str, SpooledAttachment]] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._part = None
+
+    def callbacks(self) -> Dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self) -> None:
+        self._headers = {}
+        self._part = None
+
+    def _header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def _header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _headers_finished(self) -> None:
+        _disposition, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename:
+            filename = filename.decode("utf-8", "replace")
+            mime = parse_options_header(self._headers.get(b"content-type", b""))[0].decode("latin-1").lower()
+            if not mime or mime == "application/octet-stream":
+                mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            self._part = SpooledAttachment(mime=mime, raw=True)
+            self.files.append((filename, self._part))
+        elif name == TASK_PART:
+            if self.data is not None:
+                raise UploadError(f"More than one '{TASK_PART}' part")
+            self._part = bytearray()
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if isinstance(self._part, bytearray):
+            self._part += data[start:end]
+        elif self._part is not None:
+            self._part.write(data[start:end])
+
+    def _part_end(self) -> None:
+        if isinstance(self._part, bytearray):
+            self.data = TaskRequest.model_validate_json(bytes(self._part))
+            if self.check:
+                self.check(self.data)
+        elif self._part is not None:
+            self._part.finish()
+        self._part = None
+
+    def close(self) -> None:
+        for _name, handle in self.files:
+            handle.close()
+
+
+async def read_multipart(request, check: Optional[Callable[[TaskRequest], None]] = None) -> Tuple[TaskRequest, Dict]:
+    """Read a multipart/form-data task submission as it streams in.
+
+    The `task` field holds the task JSON (its own `attachments` may still
+    carry data URIs); every file part becomes an attachment named after its
+    filename, with the part's Content-Type (guessed from the filename when
+    missing). File bytes go straight to raw SpooledAttachments, so nothing
+    is base64 encoded and memory stays bounded by ATTACHMENT_SPILL_BYTES
+    per file. Exceptions from `check` propagate and abort the upload.
+
+    Returns (task, worker payload). Raises UploadError (malformed, or over
+    UPLOAD_MAX_BYTES) and pydantic.ValidationError for an invalid task.
+    """
+    if MultipartParser is None:
+        raise UploadError("Multipart uploads need the python-multipart package")
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise UploadError("Expected a multipart/form-data body with a boundary")
+
+    reader = _MultipartReader(check)
+    parser = MultipartParser(params[b"boundary"], reader.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if UPLOAD_MAX_BYTES and received > UPLOAD_MAX_BYTES:
+                raise UploadTooLargeError(f"Upload exceeds {UPLOAD_MAX_BYTES} bytes")
+            # Parsed off the event loop: file parts past the spill threshold are written to disk
+            await asyncio.to_thread(parser.write, chunk)
+        parser.finalize()
+        if reader.data is None:
+            raise UploadError(f"Missing '{TASK_PART}' part with the task JSON")
+        payload = await asyncio.to_thread(task_payload, reader.data)
+    except MultipartParseError as e:
+        reader.close()
+        raise UploadError(f"Malformed multipart body: {e}")
+    except BaseException:
+        reader.close()
+        raise
+    payload["attachments"] += [{"name": name, "url": handle} for name, handle in reader.files]
+    return reader.data, payload
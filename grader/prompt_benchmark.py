@@ -0,0 +1,56 @@
+"""Size of each system prompt module and of the prompt selected for sample tasks.
+
+Run from the repo root:  python grader/prompt_benchmark.py
+Exits with status 1 when a module grows past MODULE_TOKEN_BUDGET, so prompt
+edits that bloat one module show up before they ship.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from services.prompt_budget import count_tokens  # noqa: E402
+from services.prompt_modules import MODULES, build_system_prompt, select_modules  # noqa: E402
+
+# Largest acceptable module, in tokens
+MODULE_TOKEN_BUDGET = int(os.getenv("MODULE_TOKEN_BUDGET", "2000"))
+
+SAMPLES = [
+  ("static page", "Create a landing page for a coffee shop with opening hours and a contact link.", [], [], False),
+  ("form", "Build a BMI calculator: a form with height and weight inputs and a submit button.",
+   ["#result shows the BMI after submit"], [], False),
+  ("csv dashboard", "Create a dashboard that loads sales.csv, shows totals in a Bootstrap card and a bar chart.",
+   ["Page contains canvas#chart", "Table #sales has at least 3 rows"],
+   [{"name": "sales.csv", "url": "data:text/csv;base64,"}], False),
+  ("round 2 fix", "Add a dark mode toggle and fix the table sorting.", ["#theme-toggle exists"], [], True),
+]
+
+
+def main() -> int:
+  full = build_system_prompt([m["name"] for m in MODULES])
+  full_tokens = count_tokens(full)
+  over = []
+
+  print(f"{'module':<12} {'tokens':>7} {'chars':>7}")
+  for module in MODULES:
+    tokens = count_tokens(module["text"])
+    flag = "  <-- over budget" if tokens > MODULE_TOKEN_BUDGET else ""
+    if flag:
+      over.append(module["name"])
+    print(f"{module['name']:<12} {tokens:>7} {len(module['text']):>7}{flag}")
+  print(f"{'all':<12} {full_tokens:>7} {len(full):>7}")
+
+  print()
+  for label, brief, checks, attachments, modify in SAMPLES:
+    names = select_modules(brief, checks, attachments, modify=modify)
+    tokens = count_tokens(build_system_prompt(names))
+    print(f"{label:<14} {tokens:>6} tokens ({tokens / full_tokens:.0%} of all modules): {', '.join(names)}")
+
+  if over:
+    print(f"\nModules over {MODULE_TOKEN_BUDGET} tokens: {', '.join(over)}")
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
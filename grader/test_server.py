@@ -7,11 +7,18 @@ Usage:
 Then visit:
     http://localhost:9001/round1  - Triggers Round 1 (creates new repo)
     http://localhost:9001/round2  - Triggers Round 2 (modifies existing repo)
+
+It also serves a stand-in for the OpenAI files/batches API under /v1 for
+testing offline batch generation without a provider:
+    LLM_BATCH_URL=http://localhost:9001/v1 python batch_generate.py tasks.jsonl
 """
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+import json
 import requests
+import time
+import uuid
 import uvicorn
 
 app = FastAPI(title="Round Test Server")
@@ -349,6 +356,111 @@ async def receive_notification(request: dict):
     }
 
 
+# ---------------------------------------------------------------------------
+# Stand-in batch API (OpenAI-compatible subset: upload file, create batch,
+# poll batch, download output). Batches complete STANDIN_BATCH_DELAY seconds
+# after creation with canned responses that the generator accepts.
+# ---------------------------------------------------------------------------
+
+STANDIN_BATCH_DELAY = 3
+STANDIN_FILES = {}
+STANDIN_BATCHES = {}
+
+STANDIN_SITE = {
+    "files": [
+        {"path": "index.html", "content": "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n  <meta charset=\"UTF-8\">\n  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">\n  <title>Batch Stand-in</title>\n  <link rel=\"stylesheet\" href=\"style.css\">\n</head>\n<body>\n  <main id=\"app\"><h1>Generated by the stand-in batch API</h1></main>\n  <script src=\"script.js\"></script>\n</body>\n</html>"},
+        {"path": "style.css", "content": "main { max-width: 800px; margin: 2rem auto; }"},
+        {"path": "script.js", "content": "document.addEventListener('DOMContentLoaded', () => {\n  document.getElementById('app').dataset.ready = '1';\n});"},
+    ]
+}
+
+
+def _standin_answer(body: dict) -> str:
+    """Canned model output matching what the request asks for."""
+    text = str(body.get("input")) + (body.get("instructions") or "")
+    if '"element_ids"' in text:
+        return json.dumps({**STANDIN_SITE, "element_ids": [{"id": "app"}], "functions": []})
+    if '"edits": [' in text:
+        return json.dumps({"edits": []})
+    return json.dumps(STANDIN_SITE)
+
+
+def _standin_finish(batch: dict) -> None:
+    lines = []
+    for line in STANDIN_FILES[batch["input_file_id"]].splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        answer = _standin_answer(request["body"])
+        lines.append(json.dumps({
+            "id": f"resp_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": {
+                "status": "completed",
+                "output": [{"type": "message", "content": [{"type": "output_text", "text": answer}]}],
+                "usage": {"input_tokens": len(line) // 4, "output_tokens": len(answer) // 4},
+            }},
+            "error": None,
+        }))
+    output_id = f"file-{uuid.uuid4().hex[:12]}"
+    STANDIN_FILES[output_id] = "\n".join(lines)
+    batch.update({
+        "status": "completed",
+        "output_file_id": output_id,
+        "completed_at": int(time.time()),
+        "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+    })
+
+
+@app.post('/v1/files')
+async def standin_upload(file: UploadFile = File(...), purpose: str = Form(...)):
+    """Store an uploaded batch input file"""
+    file_id = f"file-{uuid.uuid4().hex[:12]}"
+    STANDIN_FILES[file_id] = (await file.read()).decode("utf-8")
+    return {"id": file_id, "object": "file", "purpose": purpose, "bytes": len(STANDIN_FILES[file_id])}
+
+
+@app.get('/v1/files/{file_id}/content', response_class=PlainTextResponse)
+def standin_file_content(file_id: str):
+    """Download a stored file (batch output)"""
+    if file_id not in STANDIN_FILES:
+        raise HTTPException(status_code=404, detail="No such file")
+    return STANDIN_FILES[file_id]
+
+
+@app.post('/v1/batches')
+def standin_create_batch(request: dict):
+    """Create a batch from an uploaded JSONL file"""
+    if request.get("input_file_id") not in STANDIN_FILES:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    total = sum(1 for line in STANDIN_FILES[request["input_file_id"]].splitlines() if line.strip())
+    batch = {
+        "id": f"batch_{uuid.uuid4().hex[:12]}",
+        "object": "batch",
+        "endpoint": request.get("endpoint"),
+        "input_file_id": request["input_file_id"],
+        "status": "in_progress",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": total, "completed": 0, "failed": 0},
+    }
+    STANDIN_BATCHES[batch["id"]] = batch
+    print(f"📦 Stand-in batch {batch['id']} created with {total} request(s)")
+    return batch
+
+
+@app.get('/v1/batches/{batch_id}')
+def standin_get_batch(batch_id: str):
+    """Poll a batch; it completes STANDIN_BATCH_DELAY seconds after creation"""
+    batch = STANDIN_BATCHES.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+    if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= STANDIN_BATCH_DELAY:
+        _standin_finish(batch)
+    return batch
+
+
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("🧪 Round Test Server Starting...")
@@ -360,6 +472,7 @@ if __name__ == '__main__':
     print("   GET  /round2     - Trigger Round 2 (modify repo)")
     print("   GET  /payload/round1  - View Round 1 JSON")
     print("   GET  /payload/round2  - View Round 2 JSON")
+    print("   POST /v1/files, /v1/batches  - Stand-in batch API")
     print("\n⚠️  Make sure FastAPI is running on https://ai-github-pages-generator.onrender.com/")
     print("=" * 60 + "\n")
     